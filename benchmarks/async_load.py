@@ -0,0 +1,179 @@
+"""Throughput and latency of AsyncResearchPaperOrganiser under concurrent load.
+
+Runs --clients concurrent clients against a synthetic library for --duration
+seconds each, for every number of read connections in --readers. Each
+client issues searches, detail lookups and listings back to back, reading
+a page of results of each as a paginated service would, with one in
+--write-every requests adding a paper::
+
+    python benchmarks/async_load.py --papers 100000 --db /tmp/library.db
+    python benchmarks/async_load.py --readers 1,2,4,8 --clients 64 --json load.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import AsyncIterator, Dict, List
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from synthetic import generate_entries, write_bib  # noqa: E402
+
+from rpo.aio import AsyncResearchPaperOrganiser  # noqa: E402
+from rpo.config import Config  # noqa: E402
+from rpo.rpo import Paper, ResearchPaperOrganiser  # noqa: E402
+
+SEARCHES = [
+    "quantum",
+    "protein folding",
+    "keyword:dft theory",
+    "year:2015",
+    "journal:nature lattice",
+    "density functional",
+]
+# Rows of a listing page
+PAGE = 50
+
+
+def build_library(path: str, papers: int) -> int:
+    exists = os.path.exists(path)
+    organiser = ResearchPaperOrganiser(Config(db_str=path))
+    if not exists:
+        with tempfile.TemporaryDirectory() as tmp:
+            bib = os.path.join(tmp, "library.bib")
+            write_bib(bib, papers)
+            report = organiser.import_bibtex_file(bib)
+        print(f"Built a library of {report.added} papers in {report.elapsed:.0f}s")
+    count = organiser.conn.execute("SELECT MAX(id) FROM papers").fetchone()[0]
+    organiser.close()
+    return count
+
+
+def percentile(timings: List[float], fraction: float) -> float:
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def client(
+    library: AsyncResearchPaperOrganiser,
+    number: int,
+    count: int,
+    deadline: float,
+    write_every: int,
+    entries,
+    latencies: Dict[str, List[float]],
+) -> None:
+    rng = random.Random(number)
+    searches = itertools.cycle(rng.sample(SEARCHES, len(SEARCHES)))
+    for request in itertools.count(1):
+        if time.perf_counter() >= deadline:
+            return
+        if write_every and request % write_every == 0:
+            kind = "add_paper"
+            operation = library.add_paper(next(entries), "new.pdf", [])
+        else:
+            kind = rng.choice(("iter_search", "get_paper_details", "iter_papers"))
+            if kind == "iter_search":
+                operation = _page(library.iter_search(next(searches), limit=PAGE))
+            elif kind == "get_paper_details":
+                operation = library.get_paper_details(rng.randint(1, count))
+            else:
+                operation = _page(library.iter_papers(after=rng.randint(0, count), limit=PAGE))
+        start = time.perf_counter()
+        await operation
+        latencies[kind].append((time.perf_counter() - start) * 1000)
+
+
+async def _page(papers: AsyncIterator[Paper]) -> None:
+    async for _ in papers:
+        pass
+
+
+async def run_load(
+    path: str, readers: int, clients: int, duration: float, write_every: int, count: int
+) -> Dict:
+    latencies: Dict[str, List[float]] = {
+        kind: [] for kind in ("iter_search", "get_paper_details", "iter_papers", "add_paper")
+    }
+    # Entries of a seed of their own, so that none is already in a library
+    # reused with --db. They are generated up front, as doing so on the event
+    # loop would stall it
+    writes = clients * int(duration * 1000) // write_every if write_every else 0
+    entries = iter(list(generate_entries(writes, random.randrange(2**32))))
+    async with AsyncResearchPaperOrganiser(Config(db_str=path), readers=readers) as library:
+        start = time.perf_counter()
+        await asyncio.gather(
+            *[
+                client(library, n, count, start + duration, write_every, entries, latencies)
+                for n in range(clients)
+            ]
+        )
+        elapsed = time.perf_counter() - start
+
+    every = [timing for timings in latencies.values() for timing in timings]
+    result = {
+        "readers": readers,
+        "clients": clients,
+        "requests": len(every),
+        "requests_per_s": len(every) / elapsed,
+        "p50_ms": percentile(every, 0.50),
+        "p95_ms": percentile(every, 0.95),
+        "p99_ms": percentile(every, 0.99),
+        "operations": {},
+    }
+    for kind, timings in latencies.items():
+        if timings:
+            result["operations"][kind] = {
+                "requests": len(timings),
+                "median_ms": statistics.median(timings),
+                "p99_ms": percentile(timings, 0.99),
+            }
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--papers", type=int, default=20000, help="Size of the library")
+    parser.add_argument("--db", help="Library to use, built if it does not exist")
+    parser.add_argument(
+        "--readers", default="1,2,4,8", help="Comma-separated read connection counts"
+    )
+    parser.add_argument("--clients", type=int, default=32, help="Concurrent clients")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per run")
+    parser.add_argument(
+        "--write-every", type=int, default=50, help="Every Nth request adds a paper; 0 for none"
+    )
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.db or os.path.join(tmp, "library.db")
+        count = build_library(path, args.papers)
+        results = [
+            asyncio.run(
+                run_load(path, readers, args.clients, args.duration, args.write_every, count)
+            )
+            for readers in (int(n) for n in args.readers.split(","))
+        ]
+
+    print(f"{args.clients} clients, {count} papers")
+    print(f"{'Readers':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for result in results:
+        print(
+            f"{result['readers']:>8}{result['requests_per_s']:>10.0f}"
+            f"{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+        )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
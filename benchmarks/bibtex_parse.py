@@ -0,0 +1,110 @@
+"""Time BibTeX parsing and importing on a corpus of real entries.
+
+Parses the entries of --corpus (tests/data/entries.bib, references written
+by Google Scholar, JabRef, Zotero, ADS and publishers) over and over, with
+parse_entry falling back to bibtexparser as imports do and with bibtexparser
+alone, then imports --entries copies of them, given distinct keys, and
+imports the same file again::
+
+    python benchmarks/bibtex_parse.py --entries 20000
+"""
+
+import argparse
+import logging
+import os
+import re
+import tempfile
+import time
+from typing import Callable, List, Tuple
+
+from bibtexparser.bparser import BibTexParser
+
+from rpo.bibtex import MONTHS, iter_entries, parse_entry
+from rpo.config import Config
+from rpo.rpo import ResearchPaperOrganiser
+
+CORPUS = os.path.join(os.path.dirname(__file__), "..", "tests", "data", "entries.bib")
+_KEY = re.compile(r"(@\w+\s*[{(]\s*)([^,\s]+)")
+
+
+def read_corpus(path: str) -> List[Tuple[str, str]]:
+    with open(path, encoding="utf-8") as f:
+        return list(iter_entries(f))
+
+
+def bibtexparser_parser() -> BibTexParser:
+    parser = BibTexParser(common_strings=True)
+    parser.expect_multiple_parse = True
+    return parser
+
+
+def parse_with_fallback(blocks: List[Tuple[str, str]]) -> int:
+    parser = bibtexparser_parser()
+    strings = MONTHS
+    fallbacks = 0
+    for entry_type, text in blocks:
+        if entry_type == "string":
+            parser.parse(text)
+            strings = dict(parser.bib_database.strings)
+        elif parse_entry(text, strings) is None:
+            fallbacks += 1
+            parser.parse(text).entries.clear()
+    return fallbacks
+
+
+def parse_with_bibtexparser(blocks: List[Tuple[str, str]]) -> int:
+    parser = bibtexparser_parser()
+    for _, text in blocks:
+        parser.parse(text).entries.clear()
+    return len(blocks)
+
+
+def rate(parse: Callable[[List[Tuple[str, str]]], int], blocks, entries: int) -> str:
+    start = time.perf_counter()
+    parse(blocks)
+    elapsed = time.perf_counter() - start
+    return f"{entries / elapsed:>10,.0f} entries/s"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=CORPUS, help="The .bib file of entries to parse")
+    parser.add_argument("--entries", type=int, default=20000, help="Entries to parse and import")
+    args = parser.parse_args()
+
+    # The corpus redefines its @string macros every time it is repeated
+    logging.getLogger("bibtexparser").setLevel(logging.ERROR)
+    corpus = read_corpus(args.corpus)
+    papers = [text for entry_type, text in corpus if entry_type != "string"]
+    repeats = max(1, args.entries // len(papers))
+    blocks = corpus * repeats
+    entries = len(papers) * repeats
+    fallbacks = parse_with_fallback(corpus)
+    print(
+        f"{len(papers)} entries in {os.path.basename(args.corpus)}, "
+        f"{fallbacks} of them left to bibtexparser; parsing {entries} entries"
+    )
+    print(f"{'parse_entry':<16}{rate(parse_with_fallback, blocks, entries)}")
+    print(f"{'bibtexparser':<16}{rate(parse_with_bibtexparser, blocks, entries)}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bib = os.path.join(tmp, "library.bib")
+        with open(bib, "w", encoding="utf-8") as f:
+            for copy in range(repeats):
+                for _, text in corpus:
+                    f.write(_KEY.sub(lambda m: f"{m.group(1)}{m.group(2)}-{copy}", text, 1))
+                    f.write("\n\n")
+        organiser = ResearchPaperOrganiser(Config(db_str=os.path.join(tmp, "library.db")))
+        for label in ("Import", "Import again"):
+            start = time.perf_counter()
+            report = organiser.import_bibtex_file(bib)
+            elapsed = time.perf_counter() - start
+            print(
+                f"{label:<16}{entries / elapsed:>10,.0f} entries/s  "
+                f"added {report.added}, {len(report.errors)} known or invalid"
+            )
+        organiser.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Time `rpo fsck` on a library whose papers all have a PDF.
+
+Builds a synthetic library of --papers papers, each pointing at an empty
+PDF, and times check_library with every number of threads in --threads.
+--latency-ms adds a delay to every file check, as a round trip to a
+network file server would::
+
+    python benchmarks/fsck.py --papers 100000
+    python benchmarks/fsck.py --papers 20000 --latency-ms 1 --threads 1,4,16,64
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from synthetic import write_bib  # noqa: E402
+
+from rpo.config import Config  # noqa: E402
+from rpo.rpo import ResearchPaperOrganiser  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--papers", type=int, default=100000, help="Size of the library")
+    parser.add_argument(
+        "--threads", default="1,4,16,64", help="Comma-separated thread counts"
+    )
+    parser.add_argument(
+        "--latency-ms", type=float, default=0.0, help="Simulated delay of every file check"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bib = os.path.join(tmp, "library.bib")
+        write_bib(bib, args.papers)
+        organiser = ResearchPaperOrganiser(Config(db_str=os.path.join(tmp, "library.db")))
+        organiser.import_bibtex_file(bib)
+        paths = []
+        for (paper_id,) in organiser.conn.execute("SELECT id FROM papers"):
+            path = os.path.join(tmp, "pdfs", str(paper_id // 1000), f"{paper_id}.pdf")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, "wb").close()
+            paths.append((path, paper_id))
+        organiser.conn.executemany("UPDATE papers SET file_path = ? WHERE id = ?", paths)
+        organiser.conn.commit()
+
+        if args.latency_ms:
+            check_file = ResearchPaperOrganiser._check_file
+
+            def slow_check_file(*row):
+                time.sleep(args.latency_ms / 1000)
+                return check_file(*row)
+
+            ResearchPaperOrganiser._check_file = staticmethod(slow_check_file)
+
+        print(f"{args.papers} PDFs, {args.latency_ms} ms per file check")
+        print(f"{'Threads':>8}{'Seconds':>10}")
+        for threads in (int(n) for n in args.threads.split(",")):
+            start = time.perf_counter()
+            check = organiser.check_library(threads=threads)
+            elapsed = time.perf_counter() - start
+            assert check.files == args.papers and not check.missing
+            print(f"{threads:>8}{elapsed:>10.2f}")
+        organiser.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Query times on a legacy database before and after the schema migrations.
+
+Builds a database the way the first releases wrote it (duplicate author and
+keyword rows, no indexes), times the lookups the organiser performs, runs
+``rpo.migrations.migrate`` and times them again::
+
+    python benchmarks/migration.py --papers 20000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from synthetic import build_legacy_db  # noqa: E402
+
+from rpo.migrations import migrate  # noqa: E402
+
+QUERIES = {
+    "author id by name": "SELECT id FROM authors WHERE name = ?",
+    "keyword id by name": "SELECT id FROM keywords WHERE keyword = ?",
+    "authors of paper": """
+        SELECT a.name FROM paper_authors pa JOIN authors a ON pa.author_id = a.id
+        WHERE pa.paper_id = ?
+    """,
+    "papers of author": """
+        SELECT pa.paper_id FROM paper_authors pa JOIN authors a ON pa.author_id = a.id
+        WHERE a.name = ?
+    """,
+    "bibtex of paper": "SELECT bibtex FROM bibtex_entries WHERE paper_id = ?",
+}
+
+
+def time_queries(conn: sqlite3.Connection, repeat: int, papers: int, seed: int = 1):
+    rng = random.Random(seed)
+    names = [row[0] for row in conn.execute("SELECT DISTINCT name FROM authors")]
+    results = {}
+    for label, sql in QUERIES.items():
+        if "name" in sql and "keyword" not in sql:
+            params = [(rng.choice(names),) for _ in range(repeat)]
+        elif "keyword" in sql:
+            params = [("md",)] * repeat
+        else:
+            params = [(rng.randint(1, papers),) for _ in range(repeat)]
+        start = time.perf_counter()
+        for param in params:
+            conn.execute(sql, param).fetchall()
+        results[label] = (time.perf_counter() - start) / repeat * 1000
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--papers", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=50, help="Executions per query")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "legacy.db")
+        build_legacy_db(path, args.papers)
+        conn = sqlite3.connect(path)
+
+        before = time_queries(conn, args.repeat, args.papers)
+        start = time.perf_counter()
+        applied = migrate(conn)
+        elapsed = time.perf_counter() - start
+        after = time_queries(conn, args.repeat, args.papers)
+        conn.close()
+
+    print(f"Migrated {args.papers} papers in {elapsed:.2f}s: {', '.join(applied)}")
+    print(f"{'Query':<22} {'Before (ms)':>12} {'After (ms)':>11} {'Speed-up':>9}")
+    for label in QUERIES:
+        print(
+            f"{label:<22} {before[label]:>12.3f} {after[label]:>11.3f} "
+            f"{before[label] / max(after[label], 1e-9):>8.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""Time every ResearchPaperOrganiser operation on synthetic libraries.
+
+Builds a synthetic library for each size, imports it once (kept in --cache
+between runs, as building the larger ones takes minutes), and times each
+operation on a fresh copy of it::
+
+    python benchmarks/operations.py --json results.json
+    python benchmarks/operations.py --sizes 1k,10k,100k,1m --cache ~/.rpo-bench
+
+Results, and the baseline they are compared with, are JSON with the median
+time of every operation at every size. With --baseline the exit status is 1
+if any operation got slower than the baseline by more than --threshold::
+
+    python benchmarks/operations.py --json baseline.json     # on main
+    python benchmarks/operations.py --baseline baseline.json # on a branch
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from synthetic import generate_entries, write_bib  # noqa: E402
+
+from rpo.config import Config  # noqa: E402
+from rpo.rpo import ResearchPaperOrganiser  # noqa: E402
+
+SEARCHES = ["quantum", "protein folding", "author:{author}", "keyword:dft theory", "year:2015"]
+# Differences smaller than this are noise whatever the ratio
+NOISE_MS = 1.0
+
+
+def parse_size(value: str) -> int:
+    multiplier = {"k": 1000, "m": 1000000}.get(value[-1:].lower(), 1)
+    number = value[:-1] if multiplier > 1 else value
+    return int(float(number) * multiplier)
+
+
+def cached_library(cache: str, size: int, seed: int) -> str:
+    path = os.path.join(cache, f"library-{size}-{seed}.db")
+    if not os.path.exists(path):
+        bib = os.path.join(cache, f"library-{size}-{seed}.bib")
+        write_bib(bib, size, seed)
+        # Built under another name so an interrupted import is not reused
+        building = path + ".building"
+        if os.path.exists(building):
+            os.remove(building)
+        organiser = ResearchPaperOrganiser(Config(db_str=building))
+        report = organiser.import_bibtex_file(bib)
+        organiser.close()
+        os.remove(bib)
+        os.replace(building, path)
+        print(f"Built a library of {report.added} papers in {report.elapsed:.0f}s")
+    return path
+
+
+def time_runs(operation: Callable[[int], object], repeat: int, min_time: float) -> Dict:
+    # At most repeat runs, fewer once min_time has been spent, at least one
+    timings: List[float] = []
+    spent = 0.0
+    for run in range(repeat):
+        start = time.perf_counter()
+        operation(run)
+        elapsed = time.perf_counter() - start
+        timings.append(elapsed * 1000)
+        spent += elapsed
+        if spent >= min_time:
+            break
+    return {
+        "median_ms": statistics.median(timings),
+        "min_ms": min(timings),
+        "runs": len(timings),
+    }
+
+
+def benchmark_size(
+    path: str, size: int, repeat: int, min_time: float, seed: int
+) -> Dict[str, Dict]:
+    rng = random.Random(seed)
+    organiser = ResearchPaperOrganiser(Config(db_str=path))
+    count = organiser.conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+    author = organiser.conn.execute(
+        """
+        SELECT a.name FROM paper_authors pa JOIN authors a ON a.id = pa.author_id
+        GROUP BY pa.author_id ORDER BY COUNT(*) DESC LIMIT 1
+        """
+    ).fetchone()[0].split(",")[0].lower()
+    searches = itertools.cycle(query.format(author=author) for query in SEARCHES)
+    # Entries that are not in the library yet, with keys of their own
+    new_entries = (
+        entry.replace("@article{key", "@article{new", 1)
+        for entry in generate_entries(repeat, seed + 1)
+    )
+
+    def search(run: int) -> None:
+        # Every run does the work, as it would for a new query
+        organiser._search_cache.clear()
+        organiser.search_papers(next(searches))
+
+    # Operations that change the library come last
+    operations = {
+        "get_paper_details": lambda run: organiser.get_paper_details(rng.randint(1, count)),
+        "search_papers": search,
+        "iter_papers (first page)": lambda run: list(organiser.iter_papers(page=1)),
+        "list_all_papers": lambda run: organiser.list_all_papers(),
+        "facets": lambda run: organiser.facets(),
+        "facets (search)": lambda run: organiser.facets(next(searches)),
+        "add_paper": lambda run: organiser.add_paper(next(new_entries), "new.pdf", []),
+        "remove_paper": lambda run: organiser.remove_paper(rng.randint(1, count)),
+    }
+    results = {}
+    for name, operation in operations.items():
+        results[name] = time_runs(operation, repeat, min_time)
+    organiser.close()
+    return results
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    regressions = []
+    for size, operations in results["sizes"].items():
+        for name, timing in operations.items():
+            before = baseline.get("sizes", {}).get(size, {}).get(name)
+            if before is None:
+                continue
+            old, new = before["median_ms"], timing["median_ms"]
+            if new > old * (1 + threshold) and new - old > NOISE_MS:
+                regressions.append(
+                    f"{name} at {size} papers: {old:.2f}ms -> {new:.2f}ms "
+                    f"(+{(new / old - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", default="1k,10k,100k", help="Comma-separated library sizes, e.g. 1k,1m"
+    )
+    parser.add_argument("--repeat", type=int, default=20, help="Most runs per operation")
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=1.0,
+        help="Seconds of runs after which an operation is not repeated further",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache", help="Directory keeping the built libraries")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--baseline", help="Results to compare with")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.5,
+        help="Slow-down over the baseline counted as a regression (0.5 = 50%%)",
+    )
+    args = parser.parse_args()
+    sizes = [parse_size(size) for size in args.sizes.split(",")]
+
+    results = {
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "sizes": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = os.path.expanduser(args.cache) if args.cache else tmp
+        os.makedirs(cache, exist_ok=True)
+        for size in sizes:
+            # Every size starts from an untouched copy of its library
+            work = os.path.join(tmp, "work.db")
+            shutil.copyfile(cached_library(cache, size, args.seed), work)
+            results["sizes"][str(size)] = benchmark_size(
+                work, size, args.repeat, args.min_time, args.seed
+            )
+            os.remove(work)
+
+    names = list(next(iter(results["sizes"].values())))
+    print(f"{'Operation (median ms)':<26}" + "".join(f"{size:>12}" for size in sizes))
+    for name in names:
+        row = "".join(
+            f"{results['sizes'][str(size)][name]['median_ms']:>12.2f}" for size in sizes
+        )
+        print(f"{name:<26}{row}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions over {args.threshold:.0%} against {args.baseline}.")
+
+
+if __name__ == "__main__":
+    main()
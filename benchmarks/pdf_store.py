@@ -0,0 +1,87 @@
+"""Time moving a library's PDFs into the content-addressed store.
+
+Builds a library of --papers papers, each with a PDF of --size-kb random
+bytes of which --duplicates are copies of another, and times move_to_store
+on a fresh copy of it for every number of hashing threads in --threads::
+
+    python benchmarks/pdf_store.py --papers 2000 --size-kb 512
+    python benchmarks/pdf_store.py --threads 1,2,4,8 --mode link
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from synthetic import write_bib  # noqa: E402
+
+from rpo.config import Config  # noqa: E402
+from rpo.rpo import ResearchPaperOrganiser  # noqa: E402
+
+
+def build_library(folder: str, papers: int, size: int, duplicates: float) -> str:
+    path = os.path.join(folder, "library.db")
+    bib = os.path.join(folder, "library.bib")
+    write_bib(bib, papers)
+    organiser = ResearchPaperOrganiser(Config(db_str=path))
+    organiser.import_bibtex_file(bib)
+    rng = random.Random(0)
+    pdfs = os.path.join(folder, "pdfs")
+    os.makedirs(pdfs)
+    files = []
+    for (paper_id,) in organiser.conn.execute("SELECT id FROM papers ORDER BY id"):
+        pdf = os.path.join(pdfs, f"{paper_id}.pdf")
+        if files and rng.random() < duplicates:
+            shutil.copyfile(rng.choice(files)[0], pdf)
+        else:
+            with open(pdf, "wb") as f:
+                f.write(os.urandom(size))
+        files.append((pdf, paper_id))
+    organiser.conn.executemany("UPDATE papers SET file_path = ? WHERE id = ?", files)
+    organiser.conn.commit()
+    organiser.close()
+    return path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--papers", type=int, default=1000, help="Papers, each with a PDF")
+    parser.add_argument("--size-kb", type=int, default=1024, help="Size of every PDF")
+    parser.add_argument(
+        "--duplicates", type=float, default=0.2, help="Share of PDFs that are copies"
+    )
+    parser.add_argument("--threads", default="1,4,8", help="Comma-separated thread counts")
+    parser.add_argument("--mode", choices=("copy", "link"), default="copy")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        library = build_library(tmp, args.papers, args.size_kb * 1024, args.duplicates)
+        print(f"{args.papers} PDFs of {args.size_kb} KB, {args.mode} mode")
+        print(f"{'Threads':>8}{'Seconds':>10}{'MB/s':>10}{'Saved MB':>10}")
+        for threads in (int(n) for n in args.threads.split(",")):
+            run = os.path.join(tmp, f"run{threads}")
+            os.makedirs(run)
+            db = os.path.join(run, "library.db")
+            shutil.copyfile(library, db)
+            config = Config(
+                db_str=db, pdf_store=os.path.join(run, "store"), store_mode=args.mode
+            )
+            organiser = ResearchPaperOrganiser(config)
+            start = time.perf_counter()
+            report = organiser.move_to_store(threads=threads)
+            elapsed = time.perf_counter() - start
+            organiser.close()
+            print(
+                f"{threads:>8}{elapsed:>10.2f}{report.bytes_total / elapsed / 2**20:>10.0f}"
+                f"{report.bytes_saved / 2**20:>10.1f}"
+            )
+            shutil.rmtree(run)
+
+
+if __name__ == "__main__":
+    main()
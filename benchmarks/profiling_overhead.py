@@ -0,0 +1,62 @@
+"""Time searches with and without profiling, to show what it costs.
+
+Builds a synthetic library of --papers papers and runs --searches searches
+with profiling off, then on::
+
+    python benchmarks/profiling_overhead.py --papers 20000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from synthetic import write_bib  # noqa: E402
+
+from rpo import profiling  # noqa: E402
+from rpo.config import Config  # noqa: E402
+from rpo.rpo import ResearchPaperOrganiser  # noqa: E402
+
+QUERIES = ["water", "ice", "surface", "cluster", "smith"]
+
+
+def time_searches(config: Config, searches: int) -> float:
+    organiser = ResearchPaperOrganiser(config)
+    start = time.perf_counter()
+    for n in range(searches):
+        # Distinct pages, so that the search cache does not answer them
+        list(organiser.iter_search(QUERIES[n % len(QUERIES)], limit=20, page=n // 5 + 1))
+    elapsed = time.perf_counter() - start
+    organiser.close()
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--papers", type=int, default=20000, help="Size of the library")
+    parser.add_argument("--searches", type=int, default=500, help="Searches to time")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bib = os.path.join(tmp, "library.bib")
+        write_bib(bib, args.papers)
+        config = Config(db_str=os.path.join(tmp, "library.db"))
+        organiser = ResearchPaperOrganiser(config)
+        organiser.import_bibtex_file(bib)
+        organiser.close()
+
+        off = time_searches(config, args.searches)
+        profiling._active = profiling.Profiler()
+        on = time_searches(config, args.searches)
+        profiling._active = None
+
+    print(f"{args.searches} searches of {args.papers} papers")
+    print(f"{'Profiling off':<16}{off * 1000 / args.searches:>8.3f} ms per search")
+    print(f"{'Profiling on':<16}{on * 1000 / args.searches:>8.3f} ms per search")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Keystroke-to-results latency of search-as-you-type.
+
+Types a set of queries one character at a time against a synthetic library
+and times every keystroke from the query reaching the organiser to the
+first page of results being ready, as the GUI search tab does. Each query
+starts with an empty result cache, and the same keystrokes are also timed
+with the cache cleared before each one::
+
+    python benchmarks/search_latency.py --papers 100000 --db /tmp/library.db
+    python benchmarks/search_latency.py --json latency.json
+
+The exit status is 1 if the slowest keystroke exceeds --budget.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from synthetic import write_bib  # noqa: E402
+
+from rpo.config import Config  # noqa: E402
+from rpo.rpo import ResearchPaperOrganiser  # noqa: E402
+
+QUERIES = [
+    "quantum dynamics",
+    "protein folding simulation",
+    "author:{author}",
+    "journal:nature lattice",
+    "year:2015 graphene",
+    "density functional theory",
+    "spectroscopy crystal surface",
+]
+# Rows the GUI shows before the user scrolls
+FIRST_PAGE = 200
+
+
+def open_library(path: str, papers: int) -> ResearchPaperOrganiser:
+    exists = os.path.exists(path)
+    organiser = ResearchPaperOrganiser(Config(db_str=path))
+    if not exists:
+        with tempfile.TemporaryDirectory() as tmp:
+            bib = os.path.join(tmp, "library.bib")
+            write_bib(bib, papers)
+            report = organiser.import_bibtex_file(bib)
+        print(f"Built a library of {report.added} papers in {report.elapsed:.0f}s")
+    return organiser
+
+
+def type_query(organiser: ResearchPaperOrganiser, query: str, cached: bool):
+    organiser._search_cache.clear()
+    timings = []
+    for length in range(1, len(query) + 1):
+        if not cached:
+            organiser._search_cache.clear()
+        start = time.perf_counter()
+        list(itertools.islice(organiser.iter_search(query[:length]), FIRST_PAGE))
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def summary(timings):
+    timings = sorted(timings)
+    return {
+        "median_ms": statistics.median(timings),
+        "p95_ms": timings[int(len(timings) * 0.95)],
+        "max_ms": timings[-1],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--papers", type=int, default=100000)
+    parser.add_argument(
+        "--db", help="Library to use, built with --papers papers if it does not exist"
+    )
+    parser.add_argument("--budget", type=float, default=50.0, help="Milliseconds")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        organiser = open_library(args.db or os.path.join(tmp, "papers.db"), args.papers)
+        count = organiser.conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+        # Warm SQLite's page cache, as a running GUI would have
+        for _ in organiser.iter_search("a"):
+            pass
+        # The surname on most papers
+        author = organiser.conn.execute(
+            """
+            SELECT a.name FROM paper_authors pa JOIN authors a ON a.id = pa.author_id
+            GROUP BY pa.author_id ORDER BY COUNT(*) DESC LIMIT 1
+            """
+        ).fetchone()[0].split(",")[0].lower()
+        results = {"papers": count, "queries": {}}
+        print(
+            f"{'Query':<30} {'Keys':>4} {'Median':>8} {'p95':>8} {'Max':>8} "
+            f"{'Uncached max':>13}"
+        )
+        every = []
+        for query in QUERIES:
+            query = query.format(author=author)
+            timings = type_query(organiser, query, cached=True)
+            uncached = type_query(organiser, query, cached=False)
+            every += timings
+            row = summary(timings)
+            row["uncached_max_ms"] = max(uncached)
+            results["queries"][query] = row
+            print(
+                f"{query:<30} {len(query):>4} {row['median_ms']:>7.1f}ms "
+                f"{row['p95_ms']:>7.1f}ms {row['max_ms']:>7.1f}ms "
+                f"{row['uncached_max_ms']:>12.1f}ms"
+            )
+        organiser.close()
+
+    results["overall"] = summary(every)
+    overall = results["overall"]
+    print(
+        f"{count} papers, {len(every)} keystrokes: median {overall['median_ms']:.1f}ms, "
+        f"p95 {overall['p95_ms']:.1f}ms, max {overall['max_ms']:.1f}ms "
+        f"(budget {args.budget:.0f}ms)"
+    )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    sys.exit(0 if overall["max_ms"] <= args.budget else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Cold-start time of the rpo CLI per subcommand.
+
+Every subcommand is run in a fresh interpreter with ``python -X importtime``
+against a throwaway home directory and database. The report shows the wall
+time of the whole process and the cumulative import time of the heaviest
+top-level modules, followed by the time to open the library in-process
+(connection, pragmas and schema checks) on the same database, e.g.::
+
+    python benchmarks/startup.py --repeat 5
+    python benchmarks/startup.py --json startup.json
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ENTRY = "@article{bench, title={Startup}, author={Smith, John}, year={2020}}"
+
+# Subcommands and the arguments they are run with; "add" is run with a
+# fresh entry each time so it never fails as a duplicate
+COMMANDS = {
+    "list": ["list"],
+    "search": ["search", "startup"],
+    "details": ["details", "1"],
+    "open": ["open", "999999"],
+    "add": ["add", "--bibtex", None, "--file", "x.pdf", "--keywords", "bench"],
+    "help": ["--help"],
+}
+
+_IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def run(args, home: Path):
+    env = dict(os.environ, HOME=str(home), USERPROFILE=str(home))
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "rpo", *args],
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    wall = time.perf_counter() - start
+
+    # Cumulative microseconds of every top-level import
+    imports = {}
+    for line in result.stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match and len(match.group(3)) == 1:
+            imports[match.group(4)] = int(match.group(2))
+    return wall, imports
+
+
+def time_open(db: Path, repeat: int) -> float:
+    # Median milliseconds to open and close an organiser on an existing library
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+    from rpo.config import Config
+    from rpo.rpo import ResearchPaperOrganiser
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        ResearchPaperOrganiser(Config(db_str=str(db))).close()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per command")
+    parser.add_argument("--top", type=int, default=5, help="Imports shown per command")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        home = Path(tmp)
+        (home / ".rpo.json").write_text(json.dumps({"db_str": str(home / "bench.db")}))
+        run(["add", "--bibtex", ENTRY, "--file", "x.pdf", "--keywords", "bench"], home)
+
+        for name, command in COMMANDS.items():
+            walls = []
+            imports = {}
+            for i in range(args.repeat):
+                argv = [
+                    ENTRY.replace("bench,", f"bench{name}{i},") if a is None else a
+                    for a in command
+                ]
+                wall, imports = run(argv, home)
+                walls.append(wall)
+            total_import = sum(imports.values())
+            results[name] = {
+                "wall_ms": statistics.median(walls) * 1000,
+                "import_ms": total_import / 1000,
+                "top_imports_ms": {
+                    module: us / 1000
+                    for module, us in sorted(imports.items(), key=lambda i: -i[1])[
+                        : args.top
+                    ]
+                },
+            }
+        open_ms = time_open(home / "bench.db", max(args.repeat, 20))
+
+    print(f"{'Command':<10} {'Wall (ms)':>10} {'Imports (ms)':>13}  Heaviest imports")
+    for name, result in results.items():
+        heaviest = ", ".join(
+            f"{module} {ms:.1f}" for module, ms in result["top_imports_ms"].items()
+        )
+        print(
+            f"{name:<10} {result['wall_ms']:>10.1f} {result['import_ms']:>13.1f}  {heaviest}"
+        )
+
+    print(f"Opening the library in-process: {open_ms:.2f} ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"commands": results, "open_ms": open_ms}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
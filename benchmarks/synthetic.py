@@ -0,0 +1,111 @@
+"""Synthetic BibTeX libraries for the benchmarks."""
+
+import itertools
+import random
+import sqlite3
+from typing import Iterator, List
+
+FIRST_NAMES = ["John", "Jane", "Wei", "Maria", "Ahmed", "Olga", "Kenji", "Ana", "Lars", "Priya"]
+WORDS = [
+    "quantum", "molecular", "dynamics", "protein", "folding", "lattice", "network",
+    "neural", "graphene", "catalysis", "spectroscopy", "entropy", "crystal",
+    "diffusion", "simulation", "density", "functional", "theory", "surface", "model",
+]
+JOURNALS = ["J. Chem. Phys.", "Phys. Rev. B", "Nature", "Science", "J. Am. Chem. Soc."]
+KEYWORDS = ["dft", "md", "ml", "qmc", "experiment", "review", "theory", "methods"]
+
+
+SYLLABLES = [
+    "ka", "lo", "ber", "an", "mi", "tso", "ren", "da", "vic", "ho", "sun", "el",
+    "mar", "ti", "nak", "ura", "gon", "zal", "es", "pet", "rov", "li", "wen", "sch",
+    "midt", "fer", "nan", "dez", "ol", "sen",
+]
+
+
+def author_pool(size: int, rng: random.Random) -> List[str]:
+    # Surnames built from syllables spread over the alphabet like real
+    # names do; numbered names would all share one long prefix
+    names = []
+    for _ in range(size):
+        surname = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        names.append(f"{surname.capitalize()}, {rng.choice(FIRST_NAMES)}")
+    return names
+
+
+def keyword_pool() -> List[str]:
+    # The common keywords first, then a long tail of two-word topics
+    return KEYWORDS + [f"{a} {b}" for a, b in itertools.permutations(WORDS, 2)]
+
+
+def generate_entries(count: int, seed: int = 0) -> Iterator[str]:
+    # Author popularity is skewed like a real library: a few names appear on
+    # many papers and most appear on one or two. Keywords follow Zipf's law
+    rng = random.Random(seed)
+    authors = author_pool(max(10, count // 3), rng)
+    keywords = keyword_pool()
+    weights = list(itertools.accumulate(1 / rank for rank in range(1, len(keywords) + 1)))
+    for i in range(count):
+        topics = rng.choices(keywords, cum_weights=weights, k=rng.randint(1, 4))
+        names = [authors[min(int(rng.paretovariate(1.2)) - 1, len(authors) - 1)]]
+        names += rng.sample(authors, rng.randint(0, 5))
+        title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 10)))
+        yield (
+            f"@article{{key{i},\n"
+            f"  title = {{{title.capitalize()} {i}}},\n"
+            f"  author = {{{' and '.join(dict.fromkeys(names))}}},\n"
+            f"  year = {{{rng.randint(1980, 2024)}}},\n"
+            f"  journal = {{{rng.choice(JOURNALS)}}},\n"
+            f"  keywords = {{{', '.join(dict.fromkeys(topics))}}}\n"
+            f"}}"
+        )
+
+
+def write_bib(path: str, count: int, seed: int = 0) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for entry in generate_entries(count, seed):
+            f.write(entry + "\n\n")
+
+
+def build_legacy_db(path: str, count: int, seed: int = 0) -> None:
+    # Mirrors what the original add_paper wrote: authors and keywords were
+    # inserted again for every paper because their names were not unique
+    rng = random.Random(seed)
+    authors = author_pool(max(10, count // 3), rng)
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        """
+        CREATE TABLE papers (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT,
+                             year INTEGER, file_path TEXT, journal TEXT);
+        CREATE TABLE authors (id INTEGER PRIMARY KEY, name TEXT);
+        CREATE TABLE paper_authors (paper_id INTEGER, author_id INTEGER,
+            FOREIGN KEY (paper_id) REFERENCES papers (id),
+            FOREIGN KEY (author_id) REFERENCES authors (id));
+        CREATE TABLE keywords (id INTEGER PRIMARY KEY, keyword TEXT);
+        CREATE TABLE paper_keywords (paper_id INTEGER, keyword_id INTEGER,
+            FOREIGN KEY (paper_id) REFERENCES papers (id),
+            FOREIGN KEY (keyword_id) REFERENCES keywords (id));
+        CREATE TABLE bibtex_entries (paper_id INTEGER, bibtex TEXT,
+            FOREIGN KEY (paper_id) REFERENCES papers (id));
+        """
+    )
+    for i in range(count):
+        title = " ".join(rng.choice(WORDS) for _ in range(6)).capitalize()
+        cursor = conn.execute(
+            "INSERT INTO papers (title, year, file_path, journal) VALUES (?, ?, ?, ?)",
+            (f"{title} {i}", rng.randint(1980, 2024), f"{i}.pdf", rng.choice(JOURNALS)),
+        )
+        paper_id = cursor.lastrowid
+        for name in rng.sample(authors, rng.randint(1, 6)):
+            author_id = conn.execute("INSERT INTO authors (name) VALUES (?)", (name,)).lastrowid
+            conn.execute("INSERT INTO paper_authors VALUES (?, ?)", (paper_id, author_id))
+        for keyword in rng.sample(KEYWORDS, 2):
+            keyword_id = conn.execute(
+                "INSERT INTO keywords (keyword) VALUES (?)", (keyword,)
+            ).lastrowid
+            conn.execute("INSERT INTO paper_keywords VALUES (?, ?)", (paper_id, keyword_id))
+        conn.execute(
+            "INSERT INTO bibtex_entries VALUES (?, ?)",
+            (paper_id, f"@article{{key{i}, title={{{title}}}}}"),
+        )
+    conn.commit()
+    conn.close()
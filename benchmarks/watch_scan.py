@@ -0,0 +1,68 @@
+"""Time `rpo watch` scans of a large folder of PDFs and .bib files.
+
+Builds a folder of --papers empty PDFs named after their citation keys, in
+subfolders of 1,000, with their entries in one .bib file per subfolder.
+Times the first scan, which adds every paper, a rescan with nothing
+changed, and a rescan after a new subfolder is dropped in::
+
+    python benchmarks/watch_scan.py --papers 100000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from synthetic import generate_entries  # noqa: E402
+
+from rpo.config import Config  # noqa: E402
+from rpo.rpo import ResearchPaperOrganiser  # noqa: E402
+
+# PDFs per subfolder
+FOLDER_SIZE = 1000
+
+
+def write_folder(root: str, entries, first: int) -> None:
+    folder = os.path.join(root, f"batch{first // FOLDER_SIZE:04d}")
+    os.makedirs(folder)
+    with open(os.path.join(folder, "refs.bib"), "w", encoding="utf-8") as bib:
+        for number, entry in enumerate(entries, first):
+            bib.write(entry + "\n\n")
+            open(os.path.join(folder, f"key{number}.pdf"), "wb").close()
+
+
+def timed_scan(organiser: ResearchPaperOrganiser, root: str, label: str) -> None:
+    start = time.perf_counter()
+    report = organiser.scan_folder(root)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{label:<22}{elapsed:>8.2f}s  added {report.added}, "
+        f"{report.unchanged} unchanged, {report.unmatched} unmatched"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--papers", type=int, default=100000, help="PDFs in the folder")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, "inbox")
+        entries = list(generate_entries(args.papers + FOLDER_SIZE))
+        for first in range(0, args.papers, FOLDER_SIZE):
+            write_folder(root, entries[first : first + FOLDER_SIZE], first)
+
+        organiser = ResearchPaperOrganiser(Config(db_str=os.path.join(tmp, "library.db")))
+        print(f"{args.papers} PDFs and {args.papers // FOLDER_SIZE} .bib files")
+        timed_scan(organiser, root, "First scan")
+        timed_scan(organiser, root, "Rescan, no changes")
+        write_folder(root, entries[args.papers :], args.papers)
+        timed_scan(organiser, root, "Rescan, 1 new folder")
+        organiser.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,155 @@
 import argparse
-from .rpo import ResearchPaperOrganiser
-from .config import load_config, update_config
-from .gui import run_gui
+import contextlib
+import os
+import sys
+import itertools
+import time
+from types import SimpleNamespace
+from typing import ContextManager, List
+from .config import SERVED_COMMANDS, Config, load_config, profile_destination, update_config
+from .display import print_details, print_facets, print_papers
+
+
+def parse_id_range(value: str) -> List[int]:
+    start, sep, end = value.partition("-")
+    try:
+        first = int(start)
+        last = int(end) if sep else first
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid paper ID or range: {value}")
+    if last < first:
+        raise argparse.ArgumentTypeError(f"empty paper ID range: {value}")
+    return list(range(first, last + 1))
+
+
+def positive_int(value: str) -> int:
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive integer: {value}")
+    return number
+
+
+def add_paging_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--limit", type=positive_int, help="Show at most this many papers"
+    )
+    parser.add_argument(
+        "--page",
+        type=positive_int,
+        help="Show this page of results (50 papers per page unless --limit is given)",
+    )
+
+
+def add_filter_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--year-from", type=int, metavar="YEAR", help="Only papers from this year on"
+    )
+    parser.add_argument(
+        "--year-to", type=int, metavar="YEAR", help="Only papers up to this year"
+    )
+    parser.add_argument("--journal", help="Only papers in this journal (any case)")
+
+
+def null_operation(name: str) -> ContextManager[None]:
+    # profiling.operation, when not profiling
+    return contextlib.nullcontext()
+
+
+def filter_options(args: argparse.Namespace) -> dict:
+    return {"year_from": args.year_from, "year_to": args.year_to, "journal": args.journal}
+
+
+def run_remote(args: argparse.Namespace, config: Config) -> bool:
+    """Run a command on a running `rpo serve`, if there is one.
+
+    Returns False, having printed nothing, when no server is serving the
+    configured database; set RPO_NO_SERVER to never ask one.
+    """
+    if os.environ.get("RPO_NO_SERVER"):
+        return False
+    from .server import ServerUnavailable, request
+
+    if args.command == "list":
+        message = dict(
+            filter_options(args), limit=args.limit, after=args.after, page=args.page
+        )
+    elif args.command == "search":
+        message = dict(
+            filter_options(args),
+            query=args.query,
+            limit=args.limit,
+            page=args.page,
+            facets=args.facets,
+            fuzzy=args.fuzzy,
+        )
+    elif args.command == "details":
+        message = {"paper_id": args.paper_id}
+    else:
+        # The server resolves paths from its own working directory
+        message = {
+            "bibtex": args.bibtex,
+            "file": os.path.abspath(os.path.expanduser(args.file)),
+            "keywords": args.keywords,
+        }
+    replies = request(config, dict(message, command=args.command))
+    try:
+        # Empty listings have no reply before the end
+        first = next(replies, {"papers": []})
+    except ServerUnavailable:
+        return False
+
+    try:
+        if "error" in first:
+            print(f"Error: {first['error']}")
+        elif args.command in ("list", "search"):
+            facets = {}
+
+            def papers():
+                for reply in itertools.chain([first], replies):
+                    # Facet counts follow the papers
+                    facets.update(reply.get("facets", {}))
+                    for paper in reply.get("papers", []):
+                        yield SimpleNamespace(**paper)
+
+            empty = "No results found." if args.command == "search" else "No papers found."
+            print_papers(papers(), empty)
+            if facets:
+                print()
+                print_facets(facets)
+        elif args.command == "details":
+            if first["details"]:
+                print_details(SimpleNamespace(**first["details"]))
+            else:
+                print(f"No paper found with ID {args.paper_id}")
+        else:
+            print("Paper added successfully.")
+        # Read up to the end of the reply
+        for _ in replies:
+            pass
+    except RuntimeError as e:
+        print(f"Error: {e}")
+    return True
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Research Paper organiser")
+    parser.add_argument(
+        "--profile",
+        action="store_const",
+        const="-",
+        help="Time operations, SQL statements and imports, and print a summary on exit "
+        "(as does RPO_PROFILE=1)",
+    )
+    parser.add_argument(
+        "--profile-trace",
+        dest="profile",
+        metavar="TRACE.json",
+        help="Profile as --profile, but write a JSON trace to this file "
+        "(as does RPO_PROFILE=TRACE.json)",
+    )
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
 
     # Config command
@@ -24,16 +168,166 @@ def main() -> None:
         "--keywords", required=True, nargs="+", help="List of keywords"
     )
 
+    # Import a BibTeX library
+    import_parser = subparsers.add_parser(
+        "import", help="Import every entry of a BibTeX file"
+    )
+    import_parser.add_argument("bibfile", help="Path to the .bib file")
+    import_parser.add_argument(
+        "--keywords", nargs="+", default=[], help="Keywords for every imported paper"
+    )
+
+    # Pick up new PDFs and .bib files from a folder
+    watch_parser = subparsers.add_parser(
+        "watch", help="Add the papers of new PDFs and .bib files in a folder"
+    )
+    watch_parser.add_argument("folder", help="Folder to scan, with its subfolders")
+    watch_parser.add_argument(
+        "--interval",
+        type=positive_int,
+        default=60,
+        help="Seconds between scans (default: 60)",
+    )
+    watch_parser.add_argument(
+        "--once", action="store_true", help="Scan once and exit instead of watching"
+    )
+    watch_parser.add_argument(
+        "--keywords", nargs="+", default=[], help="Keywords for every added paper"
+    )
+
     # Remove paper
-    remove_parser = subparsers.add_parser("remove", help="Remove a paper")
-    remove_parser.add_argument("paper_id", type=int, help="Paper ID to remove")
+    remove_parser = subparsers.add_parser("remove", help="Remove papers")
+    remove_parser.add_argument(
+        "paper_ids",
+        type=parse_id_range,
+        nargs="+",
+        help="Paper IDs or ranges to remove, e.g. 3 8 12-40",
+    )
+
+    # Find duplicates
+    subparsers.add_parser("dedupe", help="Find papers that are likely duplicates")
+
+    # Renumber papers
+    subparsers.add_parser("renumber", help="Renumber papers to close gaps in IDs")
+
+    # Export papers
+    export_parser = subparsers.add_parser("export", help="Export papers to a file")
+    export_parser.add_argument(
+        "--format",
+        choices=("bib", "csv", "jsonl", "parquet"),
+        default="bib",
+        help="Output format (default: bib, the stored BibTeX entries)",
+    )
+    export_parser.add_argument(
+        "--output", "-o", help="File to write (default: standard output)"
+    )
+    export_parser.add_argument("--query", help="Only export papers matching this search")
+    export_parser.add_argument("--keyword", help="Only export papers with this keyword")
+
+    # Keep a warm organiser running for other rpo commands
+    subparsers.add_parser(
+        "serve", help="Answer list, search, details and add from a background process"
+    )
+
+    # Index the text of the PDFs
+    index_pdfs_parser = subparsers.add_parser(
+        "index-pdfs", help="Extract the text of the PDFs so it can be searched"
+    )
+    index_pdfs_parser.add_argument(
+        "--jobs", type=positive_int, help="Extraction processes (default: one per core)"
+    )
+    index_pdfs_parser.add_argument(
+        "--force", action="store_true", help="Extract every PDF, changed or not"
+    )
+
+    # Check the library for missing PDFs and orphaned rows
+    fsck_parser = subparsers.add_parser(
+        "fsck", help="Check that every PDF exists and no rows are orphaned"
+    )
+    fsck_parser.add_argument(
+        "--hash",
+        action="store_true",
+        help="Also hash the indexed PDFs to find those whose content changed",
+    )
+    fsck_parser.add_argument(
+        "--threads", type=positive_int, default=16, help="Files checked at once (default: 16)"
+    )
+    fsck_parser.add_argument(
+        "--repair", action="store_true", help="Delete the orphaned rows found"
+    )
+    fsck_parser.add_argument(
+        "--vacuum",
+        action="store_true",
+        help="Compact the database file, after repairing with --repair",
+    )
+
+    # Move the PDFs into the content-addressed store
+    store_parser = subparsers.add_parser(
+        "store", help="Move every paper's PDF into the configured PDF store"
+    )
+    store_parser.add_argument(
+        "--threads", type=positive_int, default=8, help="Files hashed at once (default: 8)"
+    )
+    store_parser.add_argument(
+        "--remove-originals",
+        action="store_true",
+        help="Delete each PDF once its paper points at the stored copy",
+    )
+
+    # Rebuild the precomputed listing columns
+    rebuild_parser = subparsers.add_parser(
+        "rebuild-cache", help="Recompute the author columns shown in listings"
+    )
+    rebuild_parser.add_argument(
+        "--check", action="store_true", help="Only report papers whose columns are stale"
+    )
 
     # Search papers
     search_parser = subparsers.add_parser("search", help="Search for papers")
     search_parser.add_argument("query", help="Search query")
+    add_paging_arguments(search_parser)
+    add_filter_arguments(search_parser)
+    search_parser.add_argument(
+        "--facets",
+        action="store_true",
+        help="Also count the results per year, journal, author and keyword",
+    )
+    search_parser.add_argument(
+        "--fuzzy",
+        action="store_true",
+        help="Forgive typos and missing accents in author and title words",
+    )
+
+    # Count papers per year, journal, author and keyword
+    stats_parser = subparsers.add_parser(
+        "stats", help="Count papers per year, journal, author and keyword"
+    )
+    stats_parser.add_argument("--query", help="Only count papers matching this search")
+    add_filter_arguments(stats_parser)
+    stats_parser.add_argument(
+        "--facets",
+        nargs="+",
+        choices=("year", "journal", "author", "keyword"),
+        default=["year", "journal", "author", "keyword"],
+        help="What to count (default: all)",
+    )
+    stats_parser.add_argument(
+        "--limit",
+        type=positive_int,
+        default=10,
+        help="Show this many journals, authors and keywords (default: 10)",
+    )
 
     # List all papers
-    subparsers.add_parser("list", help="List all papers")
+    list_parser = subparsers.add_parser("list", help="List all papers")
+    add_paging_arguments(list_parser)
+    add_filter_arguments(list_parser)
+    list_parser.add_argument(
+        "--after",
+        type=int,
+        metavar="PAPER_ID",
+        help="Continue the listing after the paper with this ID",
+    )
 
     # Get paper details
     details_parser = subparsers.add_parser("details", help="Get paper details")
@@ -44,15 +338,43 @@ def main() -> None:
     open_parser.add_argument("paper_id", type=int, help="Paper ID to open")
 
     args = parser.parse_args()
+    # The profiler is only imported when asked for
+    profile = args.profile or profile_destination()
+    operation = null_operation
+    if profile:
+        from . import profiling
+
+        profiling.enable(profile)
+        operation = profiling.operation
 
     config = load_config()
     if args.command == "config":
         update_config()
         return
 
+    if args.command == "serve":
+        from .server import serve
+
+        try:
+            serve(config)
+        except (OSError, RuntimeError) as e:
+            print(f"Error: {e}")
+        return
+
+    # A profile is of this process's own work, not a server's
+    if args.command in SERVED_COMMANDS and not profile and run_remote(args, config):
+        return
+
+    from .rpo import ResearchPaperOrganiser, SearchFilters
+
     organiser = ResearchPaperOrganiser(config)
+    # Only list, search and stats take filters
+    filters = SearchFilters(**filter_options(args)) if "journal" in args else None
 
     if args.command == "gui":
+        # PyQt6 is slow to import, so only the gui command loads it
+        from .gui import run_gui
+
         run_gui(organiser)
         return
 
@@ -60,38 +382,220 @@ def main() -> None:
         try:
             organiser.add_paper(args.bibtex, args.file, args.keywords)
             print("Paper added successfully.")
-        except ValueError as e:
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+
+    elif args.command == "import":
+        try:
+            report = organiser.import_bibtex_file(args.bibfile, args.keywords)
+        except (OSError, UnicodeDecodeError) as e:
             print(f"Error: {e}")
+        else:
+            print(
+                f"Imported {report.added} papers in {report.elapsed:.2f}s "
+                f"({report.entries_per_second:.0f} entries/sec)."
+            )
+            if report.errors:
+                print(f"{len(report.errors)} entries could not be imported:")
+                for index, key, message in report.errors:
+                    print(f"  #{index} {key or '<no key>'}: {message}")
+            if report.unstored:
+                print(f"{len(report.unstored)} PDFs could not be stored, and were kept as given:")
+                for index, key, message in report.unstored:
+                    print(f"  #{index} {key or '<no key>'}: {message}")
+
+    elif args.command == "watch":
+        try:
+            first = True
+            while True:
+                report = organiser.scan_folder(args.folder, args.keywords)
+                # While watching, quiet scans print nothing
+                if first or report.added or report.linked or report.errors:
+                    print(
+                        f"Added {report.added} papers and gave {report.linked} PDFs "
+                        f"to papers in {report.elapsed:.2f}s; {report.unchanged} files "
+                        f"unchanged, {report.unmatched} PDFs without an entry."
+                    )
+                    for path, key, message in report.errors:
+                        print(f"  {path} {key or '<no key>'}: {message}")
+                first = False
+                if args.once:
+                    break
+                time.sleep(args.interval)
+        except OSError as e:
+            print(f"Error: {e}")
+        except KeyboardInterrupt:
+            pass
 
     elif args.command == "remove":
+        paper_ids = sorted({id for ids in args.paper_ids for id in ids})
+        removed = organiser.remove_papers(paper_ids)
+        missing = sorted(set(paper_ids) - set(removed))
+        if len(paper_ids) == 1 and removed:
+            print(f"Paper with ID {removed[0]} removed successfully.")
+        elif removed:
+            print(f"Removed {len(removed)} papers.")
+        if missing:
+            print(f"Error: No paper found with ID {', '.join(map(str, missing))}")
+
+    elif args.command == "dedupe":
+        groups = organiser.find_duplicates()
+        for group in groups:
+            ids = ", ".join(map(str, group.paper_ids))
+            print(f"Papers {ids}: {'; '.join(group.reasons)}")
+        if groups:
+            print(f"Found {len(groups)} groups of possible duplicates.")
+        else:
+            print("No duplicates found.")
+
+    elif args.command == "renumber":
+        renumbered = organiser.renumber_papers()
+        print(f"Renumbered {renumbered} papers.")
+
+    elif args.command == "export":
+        from .export import export_papers
+
         try:
-            organiser.remove_paper(args.paper_id)
-            print(f"Paper with ID {args.paper_id} removed successfully.")
-        except ValueError as e:
+            count = export_papers(
+                organiser, args.format, args.output, query=args.query, keyword=args.keyword
+            )
+        except (OSError, RuntimeError, ValueError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+        else:
+            if args.output:
+                print(f"Exported {count} papers to {args.output}.")
+
+    elif args.command == "index-pdfs":
+        try:
+            report = organiser.index_pdfs(jobs=args.jobs, force=args.force)
+        except RuntimeError as e:
             print(f"Error: {e}")
+        else:
+            print(
+                f"Indexed {report.indexed} PDFs in {report.elapsed:.2f}s, "
+                f"{report.unchanged} unchanged."
+            )
+            if report.errors:
+                print(f"{len(report.errors)} PDFs could not be read:")
+                for paper_id, path, message in report.errors:
+                    print(f"  #{paper_id} {path}: {message}")
+            if report.missing:
+                print(f"{len(report.missing)} PDFs were not found:")
+                for paper_id, path in report.missing:
+                    print(f"  #{paper_id} {path}")
+
+    elif args.command == "fsck":
+        check = organiser.check_library(hash_files=args.hash, threads=args.threads)
+        print(f"Checked {check.files} PDFs in {check.elapsed:.2f}s.")
+        for problem in check.database:
+            print(f"Database: {problem}")
+        if check.missing:
+            print(f"{len(check.missing)} PDFs cannot be opened:")
+            for paper_id, path, message in check.missing:
+                print(f"  #{paper_id} {path}: {message}")
+        if check.changed:
+            print(f"{len(check.changed)} PDFs changed since they were indexed:")
+            for paper_id, path in check.changed:
+                print(f"  #{paper_id} {path}")
+        for kind, count in check.orphans.items():
+            if count:
+                print(f"{count} {kind}")
+        if args.repair:
+            deleted = organiser.repair_library(vacuum=args.vacuum)
+            print(f"Deleted {sum(deleted.values())} orphaned rows.")
+            check.orphans = {}
+        elif args.vacuum:
+            organiser.compact_library()
+        if check.ok:
+            print("No problems found." if not args.repair else "No problems left.")
+        else:
+            # For scripts and nightly jobs
+            organiser.close()
+            sys.exit(1)
+
+    elif args.command == "store":
+        try:
+            report = organiser.move_to_store(
+                threads=args.threads, remove_originals=args.remove_originals
+            )
+        except (OSError, RuntimeError) as e:
+            print(f"Error: {e}")
+        else:
+            megabytes = 1024 * 1024
+            print(
+                f"Stored {report.files} PDFs in {report.elapsed:.2f}s, "
+                f"{report.duplicates} of them duplicates."
+            )
+            print(
+                f"{report.bytes_total / megabytes:.1f} MB of PDFs are "
+                f"{report.bytes_unique / megabytes:.1f} MB stored once, saving "
+                f"{report.bytes_saved / megabytes:.1f} MB; the store grew by "
+                f"{report.bytes_stored / megabytes:.1f} MB."
+            )
+            if report.errors:
+                print(f"{len(report.errors)} PDFs could not be read:")
+                for path, message in report.errors:
+                    print(f"  {path}: {message}")
+
+    elif args.command == "rebuild-cache":
+        stale = organiser.check_display_cache()
+        if args.check:
+            if stale:
+                print(
+                    f"{len(stale)} papers have stale listing columns: "
+                    f"{', '.join(map(str, stale[:20]))}{' ...' if len(stale) > 20 else ''}"
+                )
+            else:
+                print("Listing columns are up to date.")
+        else:
+            rebuilt = organiser.rebuild_display_cache()
+            print(f"Rebuilt listing columns of {rebuilt} papers ({len(stale)} were stale).")
 
     elif args.command == "list":
-        papers = organiser.list_all_papers()
-        organiser.print_papers(papers)
+        try:
+            papers = organiser.iter_papers(
+                limit=args.limit, after=args.after, page=args.page, filters=filters
+            )
+        except ValueError as e:
+            print(f"Error: {e}")
+        else:
+            with operation("print"):
+                print_papers(papers)
 
     elif args.command == "search":
-        results = organiser.search_papers(args.query)
-        if results:
-            organiser.print_papers(results)
+        try:
+            results = organiser.iter_search(
+                args.query,
+                limit=args.limit,
+                page=args.page,
+                filters=filters,
+                fuzzy=args.fuzzy,
+            )
+        except RuntimeError as e:
+            print(f"Error: {e}")
         else:
-            print("No results found.")
+            with operation("print"):
+                print_papers(results, "No results found.")
+            if args.facets:
+                print()
+                facets = organiser.facets(args.query, filters, fuzzy=args.fuzzy)
+                with operation("print"):
+                    print_facets(facets)
+
+    elif args.command == "stats":
+        try:
+            facets = organiser.facets(args.query, filters, args.facets, args.limit)
+        except RuntimeError as e:
+            print(f"Error: {e}")
+        else:
+            with operation("print"):
+                print_facets(facets)
 
     elif args.command == "details":
         details = organiser.get_paper_details(args.paper_id)
         if details:
-            title, year, file_path, journal, authors, keywords, bibtex = details
-            print(f"Title: {title}")
-            print(f"Year: {year}")
-            print(f"Journal: {journal}")
-            print(f"File: {file_path}")
-            print(f"Authors: {authors}")
-            print(f"Keywords: {keywords}")
-            print(f"BibTeX:\n{bibtex}")
+            with operation("print"):
+                print_details(details)
         else:
             print(f"No paper found with ID {args.paper_id}")
 
@@ -101,5 +605,17 @@ def main() -> None:
     organiser.close()
 
 
+def run() -> None:
+    try:
+        main()
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # The reader went away, e.g. `rpo list | head`; point stdout at
+        # devnull so the interpreter's final flush does not fail again
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        sys.exit(1)
+
+
 if __name__ == "__main__":
-    main()
+    run()
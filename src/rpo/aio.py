@@ -0,0 +1,265 @@
+import asyncio
+import collections
+import contextlib
+import functools
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+from .config import Config
+from .rpo import (
+    FACET_LIMIT,
+    FACETS,
+    FETCH_SIZE,
+    NO_FILTERS,
+    DuplicateGroup,
+    ImportReport,
+    Paper,
+    PaperDetails,
+    ResearchPaperOrganiser,
+    SearchFilters,
+    WatchReport,
+)
+
+# Read connections of an AsyncResearchPaperOrganiser unless told otherwise
+DEFAULT_READERS = 4
+
+T = TypeVar("T")
+
+
+class _Connection:
+    # An organiser confined to a thread of its own, as SQLite connections
+    # must be, and opened there on first use
+    def __init__(self, config: Config, name: str):
+        self.config = config
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self.organiser: Optional[ResearchPaperOrganiser] = None
+
+    def _call(self, function: Callable[..., T], *args: Any) -> T:
+        if self.organiser is None:
+            self.organiser = ResearchPaperOrganiser(self.config)
+        return function(self.organiser, *args)
+
+    def run(self, function: Callable[..., T], *args: Any) -> "asyncio.Future[T]":
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self.executor, self._call, function, *args)
+
+    def interrupt(self) -> None:
+        # The one connection method that is safe to call from another thread
+        if self.organiser is not None:
+            self.organiser.conn.interrupt()
+
+    def _close(self) -> None:
+        if self.organiser is not None:
+            self.organiser.close()
+            self.organiser = None
+
+    async def close(self) -> None:
+        await asyncio.get_running_loop().run_in_executor(self.executor, self._close)
+        self.executor.shutdown()
+
+
+class AsyncResearchPaperOrganiser:
+    """The organiser's operations as coroutines, for use from asyncio.
+
+    Reads run on a pool of `readers` connections, each on a thread of its
+    own, so that many searches run at once without blocking the event loop;
+    callers wait for a free connection when all are busy. Writes run one at
+    a time on a separate connection. In WAL mode readers never wait for the
+    writer, and they see each write once it has been committed.
+
+    Cancelling a read interrupts its query. A cancelled write still runs to
+    completion, since an interrupted one would be rolled back half way
+    through an operation the caller may believe started.
+    """
+
+    def __init__(self, config: Config, readers: int = DEFAULT_READERS):
+        if readers < 1:
+            raise ValueError("An AsyncResearchPaperOrganiser needs at least one reader")
+        self.config = config
+        self._writer = _Connection(config, "rpo-writer")
+        self._readers = [_Connection(config, f"rpo-reader-{n}") for n in range(readers)]
+        self._idle = list(self._readers)
+        # Callers waiting for a reader, served in order
+        self._waiting: "Deque[asyncio.Future[_Connection]]" = collections.deque()
+        self._opened: Optional["asyncio.Future[None]"] = None
+
+    async def __aenter__(self) -> "AsyncResearchPaperOrganiser":
+        await self._open()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def _open(self) -> None:
+        # The writer opens the database first, so that any schema setup is
+        # done once before readers connect
+        if self._opened is None:
+            self._opened = self._writer.run(lambda organiser: None)
+        await asyncio.shield(self._opened)
+
+    async def _acquire(self) -> _Connection:
+        # First come, first served: a caller giving a reader back and at once
+        # asking for another does not overtake those already waiting, as it
+        # would with an asyncio.Queue
+        await self._open()
+        if self._idle and not self._waiting:
+            return self._idle.pop()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiting.append(waiter)
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release(waiter.result())
+            else:
+                self._waiting.remove(waiter)
+            raise
+
+    def _release(self, reader: _Connection) -> None:
+        while self._waiting:
+            waiter = self._waiting.popleft()
+            if not waiter.done():
+                waiter.set_result(reader)
+                return
+        self._idle.append(reader)
+
+    async def _read(self, function: Callable[..., T], *args: Any) -> T:
+        reader = await self._acquire()
+        try:
+            future = reader.run(function, *args)
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                reader.interrupt()
+                # The connection goes back to the pool once it is idle
+                with contextlib.suppress(Exception):
+                    await future
+                raise
+        finally:
+            self._release(reader)
+
+    async def _write(self, function: Callable[..., T], *args: Any) -> T:
+        await self._open()
+        future = self._writer.run(function, *args)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # Cancellation returns once the write is done, so that reads
+            # after it see it
+            with contextlib.suppress(Exception):
+                await future
+            raise
+
+    async def _stream(
+        self, open_iterator: Callable[..., Iterable[T]], *args: Any
+    ) -> AsyncIterator[T]:
+        # Holds a reader for as long as the caller iterates, reading
+        # FETCH_SIZE rows ahead of it at most
+        reader = await self._acquire()
+        iterator: Optional[Iterator[T]] = None
+        try:
+            iterator = await reader.run(
+                lambda organiser: iter(open_iterator(organiser, *args))
+            )
+            while True:
+                future = reader.run(
+                    lambda organiser: list(itertools.islice(iterator, FETCH_SIZE))
+                )
+                try:
+                    rows = await asyncio.shield(future)
+                except asyncio.CancelledError:
+                    reader.interrupt()
+                    with contextlib.suppress(Exception):
+                        await future
+                    raise
+                if not rows:
+                    return
+                for row in rows:
+                    yield row
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                # Generators must be closed on the thread that owns their cursor
+                with contextlib.suppress(Exception):
+                    await asyncio.shield(reader.run(lambda organiser: close()))
+            self._release(reader)
+
+    # Reads
+
+    async def search_papers(self, query: str) -> List[Paper]:
+        return await self._read(ResearchPaperOrganiser.search_papers, query)
+
+    async def list_all_papers(self) -> List[Paper]:
+        return await self._read(ResearchPaperOrganiser.list_all_papers)
+
+    async def get_paper_details(self, paper_id: int) -> Optional[PaperDetails]:
+        return await self._read(ResearchPaperOrganiser.get_paper_details, paper_id)
+
+    async def get_papers_details(self, paper_ids: Iterable[int]) -> List[PaperDetails]:
+        return await self._read(ResearchPaperOrganiser.get_papers_details, list(paper_ids))
+
+    async def find_duplicates(self) -> List[DuplicateGroup]:
+        return await self._read(ResearchPaperOrganiser.find_duplicates)
+
+    async def facets(
+        self,
+        query: Optional[str] = None,
+        filters: SearchFilters = NO_FILTERS,
+        names: Sequence[str] = FACETS,
+        limit: int = FACET_LIMIT,
+        fuzzy: bool = False,
+    ) -> Dict[str, List[Tuple[Any, int]]]:
+        return await self._read(
+            ResearchPaperOrganiser.facets, query, filters, names, limit, fuzzy
+        )
+
+    def iter_papers(self, **options: Any) -> AsyncIterator[Paper]:
+        # Takes the options of ResearchPaperOrganiser.iter_papers
+        return self._stream(functools.partial(ResearchPaperOrganiser.iter_papers, **options))
+
+    def iter_search(self, query: str, **options: Any) -> AsyncIterator[Paper]:
+        # Takes the options of ResearchPaperOrganiser.iter_search
+        return self._stream(
+            functools.partial(ResearchPaperOrganiser.iter_search, **options), query
+        )
+
+    # Writes
+
+    async def add_paper(self, bibtex: str, file_path: str, keywords: List[str]) -> None:
+        await self._write(ResearchPaperOrganiser.add_paper, bibtex, file_path, keywords)
+
+    async def import_bibtex_file(
+        self, path: str, keywords: Optional[List[str]] = None
+    ) -> ImportReport:
+        return await self._write(ResearchPaperOrganiser.import_bibtex_file, path, keywords)
+
+    async def scan_folder(self, root: str, keywords: Optional[List[str]] = None) -> WatchReport:
+        return await self._write(ResearchPaperOrganiser.scan_folder, root, keywords)
+
+    async def remove_paper(self, paper_id: int) -> None:
+        await self._write(ResearchPaperOrganiser.remove_paper, paper_id)
+
+    async def remove_papers(self, paper_ids: Iterable[int]) -> List[int]:
+        return await self._write(ResearchPaperOrganiser.remove_papers, list(paper_ids))
+
+    async def renumber_papers(self) -> int:
+        return await self._write(ResearchPaperOrganiser.renumber_papers)
+
+    async def close(self) -> None:
+        # Each connection closes after the work already queued on its thread
+        for connection in [self._writer, *self._readers]:
+            await connection.close()
@@ -0,0 +1,398 @@
+import hashlib
+import re
+import unicodedata
+from typing import Dict, Iterator, List, Mapping, Optional, TextIO, Tuple
+
+_HEADER = re.compile(r"@\s*([A-Za-z]+)\s*([{(])")
+_PARTIAL_HEADER = re.compile(r"@\s*[A-Za-z]*\s*$")
+_DELIMITERS = re.compile(r"[{}()]")
+_WHITESPACE = re.compile(r"\s+")
+_DOI_PREFIX = re.compile(r"^(?:https?://(?:dx\.)?doi\.org/|doi:)", re.IGNORECASE)
+_NON_WORD = re.compile(r"[\W_]+")
+
+# Entry types bibtexparser keeps; it drops entries of any other type
+STANDARD_TYPES = frozenset(
+    (
+        "article book booklet conference inbook incollection inproceedings manual "
+        "mastersthesis misc phdthesis proceedings techreport unpublished"
+    ).split()
+)
+# Month abbreviations, which BibTeX defines for every file
+MONTHS = {
+    "jan": "January",
+    "feb": "February",
+    "mar": "March",
+    "apr": "April",
+    "may": "May",
+    "jun": "June",
+    "jul": "July",
+    "aug": "August",
+    "sep": "September",
+    "oct": "October",
+    "nov": "November",
+    "dec": "December",
+}
+# Pieces of a single entry, as bibtexparser's grammar defines them. Only
+# spaces, CR and LF separate tokens, tabs having been expanded
+_ENTRY_HEAD = re.compile(
+    r"[ \n\r]*@[ \n\r]*([A-Za-z]+)[ \n\r]*([{(])[ \n\r]*"
+    r"([^\s,{}()\"#%'=\\]+)[ \n\r]*,[ \n\r]*"
+)
+_FIELD_NAME = re.compile(r"([A-Za-z0-9_\-().+]+)[ \n\r]*=[ \n\r]*")
+_INTEGER = re.compile(r"[0-9]+")
+_STRING_NAME = re.compile(r"[A-Za-z0-9_\-:]+")
+_SPACE = re.compile(r"[ \n\r]*")
+_BRACES = re.compile(r"[{}]")
+_QUOTED = re.compile(r'[{}"]')
+# What may refer to an @string macro: a value or concatenated part that
+# starts with a letter
+_MACRO_REFERENCE = re.compile(r"[=#]\s*[A-Za-z_]")
+# Separators of names in an author or editor field
+_AND = re.compile(r"\s+and\s+", re.IGNORECASE)
+_SPLIT_AUTHORS = re.compile(r"[{}]|\s+and(?:\s+|\s*$)", re.IGNORECASE)
+
+# Combining characters of LaTeX's accent commands
+_ACCENTS = {
+    '"': "\u0308",
+    "'": "\u0301",
+    "`": "\u0300",
+    "^": "\u0302",
+    "~": "\u0303",
+    "=": "\u0304",
+    ".": "\u0307",
+    "u": "\u0306",
+    "v": "\u030c",
+    "H": "\u030b",
+    "c": "\u0327",
+    "k": "\u0328",
+    "r": "\u030a",
+    "d": "\u0323",
+    "b": "\u0331",
+}
+_LETTERS = {
+    "ss": "ß",
+    "ae": "æ",
+    "AE": "Æ",
+    "oe": "œ",
+    "OE": "Œ",
+    "aa": "å",
+    "AA": "Å",
+    "o": "ø",
+    "O": "Ø",
+    "l": "ł",
+    "L": "Ł",
+    "i": "ı",
+    "j": "ȷ",
+}
+# \"o, \"{o}, \'{\i} and \c{c}, \c c; a dotless i or j under an accent is
+# the plain letter
+_ACCENT = re.compile(
+    r"\\(?:([\"'`^~=.])|([uvHckrdb])(?=[\s{]))\s*"
+    r"(?:\{\s*(\\[ij]|[A-Za-z])\s*\}|\\([ij])(?![A-Za-z])\s*|([A-Za-z]))"
+)
+_LETTER = re.compile(r"\\(ss|ae|AE|oe|OE|aa|AA|o|O|l|L|i|j)(?![A-Za-z])\s*(?:\{\})?")
+_ESCAPED = re.compile(r"\\([&%$#_])")
+# A command left undecoded keeps the braces of its argument
+_COMMAND_OR_BRACE = re.compile(r"\\[A-Za-z]+\s*\{|\\.|[{}]")
+
+
+def _block_end(buffer: str, pos: int, opener: str) -> int:
+    # Return the index just past the block that opened at pos, or -1 if the
+    # buffer does not contain the closing delimiter yet
+    depth = 0
+    for match in _DELIMITERS.finditer(buffer, pos):
+        char = match.group()
+        if char == "{":
+            depth += 1
+        elif char == "}":
+            if opener == "{" and depth == 0:
+                return match.end()
+            depth -= 1
+        elif char == ")" and opener == "(" and depth == 0:
+            return match.end()
+    return -1
+
+
+def iter_entries(stream: TextIO, chunk_size: int = 1 << 16) -> Iterator[Tuple[str, str]]:
+    """Yield (entry type, raw text) for every @-block of a BibTeX stream.
+
+    The stream is read in chunks so arbitrarily large files can be processed
+    without holding them in memory. Text between blocks is ignored, as it is
+    by BibTeX itself.
+    """
+    buffer = ""
+    eof = False
+    while True:
+        at = buffer.find("@")
+        header = _HEADER.match(buffer, at) if at != -1 else None
+        if header is not None:
+            end = _block_end(buffer, header.end(), header.group(2))
+            if end != -1:
+                yield header.group(1).lower(), buffer[at:end]
+                buffer = buffer[end:]
+                continue
+            if eof:
+                # Unterminated block, let the caller's parser report it
+                yield header.group(1).lower(), buffer[at:]
+                return
+        elif at != -1 and not _PARTIAL_HEADER.match(buffer, at):
+            # A stray '@' (e.g. in an email address between entries)
+            buffer = buffer[at + 1 :]
+            continue
+        elif at == -1:
+            buffer = ""
+        else:
+            buffer = buffer[at:]
+        if eof:
+            return
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            eof = True
+        buffer += chunk
+
+
+def _strip_after_new_lines(value: str) -> str:
+    # As bibtexparser does to every quoted or braced value
+    lines = value.splitlines()
+    if len(lines) > 1:
+        lines = [lines[0]] + [line.lstrip() for line in lines[1:]]
+    return "\n".join(lines)
+
+
+def _value_end(text: str, pos: int) -> int:
+    # Index just past the braced or quoted value starting at pos, or -1.
+    # Braces must balance in both; quotes only end a value outside them
+    quoted = text[pos] == '"'
+    depth = 0
+    for match in (_QUOTED if quoted else _BRACES).finditer(text, pos + 1):
+        char = match.group()
+        if char == "{":
+            depth += 1
+        elif char == '"':
+            if depth == 0:
+                return match.end()
+        elif depth > 0:
+            depth -= 1
+        else:
+            return -1 if quoted else match.end()
+    return -1
+
+
+def _parse_value(
+    text: str, pos: int, strings: Optional[Mapping[str, str]]
+) -> Tuple[Optional[str], int]:
+    # The value of a field starting at pos and the index after it; None for
+    # anything parse_entry leaves to bibtexparser
+    integer = _INTEGER.match(text, pos)
+    if integer is not None:
+        return integer.group(), _SPACE.match(text, integer.end()).end()
+
+    parts = []
+    macros = False
+    while True:
+        char = text[pos : pos + 1]
+        if char == "{" or char == '"':
+            end = _value_end(text, pos)
+            if end == -1:
+                return None, pos
+            parts.append(_strip_after_new_lines(text[pos + 1 : end - 1]))
+        else:
+            name = _STRING_NAME.match(text, pos)
+            if name is None or strings is None or name.group().lower() not in strings:
+                return None, pos
+            end = name.end()
+            parts.append(strings[name.group().lower()])
+            macros = True
+        pos = _SPACE.match(text, end).end()
+        if text[pos : pos + 1] != "#":
+            break
+        pos = _SPACE.match(text, pos + 1).end()
+
+    # A lone {} is empty, as bibtexparser has it
+    if len(parts) == 1 and not macros and parts[0] == "{}":
+        return "", pos
+    return "".join(parts), pos
+
+
+def parse_entry(
+    text: str, strings: Optional[Mapping[str, str]] = MONTHS
+) -> Optional[Dict[str, str]]:
+    """Parse a single BibTeX entry into the dict bibtexparser would make.
+
+    Field names are lower-cased, the outer braces or quotes of values are
+    removed and ENTRYTYPE and ID hold the entry type and citation key.
+    strings are the @string macros values may use, None for none at all.
+
+    Returns None for what this does not handle: several entries, comments,
+    non-standard types, unknown macros and malformed input. Callers then
+    fall back to bibtexparser, which is many times slower but gives the
+    same result for the entries this does parse.
+    """
+    if "\t" in text:
+        # bibtexparser expands tabs before parsing
+        text = text.expandtabs()
+    head = _ENTRY_HEAD.match(text)
+    if head is None:
+        return None
+    entry_type = head.group(1).lower()
+    if entry_type not in STANDARD_TYPES:
+        return None
+    closer = "}" if head.group(2) == "{" else ")"
+
+    fields: Dict[str, str] = {}
+    names: Dict[str, str] = {}
+    pos = head.end()
+    while True:
+        name = _FIELD_NAME.match(text, pos)
+        if name is None:
+            return None
+        value, pos = _parse_value(text, name.end(), strings)
+        if value is None:
+            return None
+        # The first of fields given twice is kept; which one bibtexparser
+        # keeps of fields differing in case depends on their order
+        raw_name = name.group(1)
+        key = raw_name.lower()
+        if key not in fields:
+            fields[key] = value
+            names[key] = raw_name
+        elif names[key] != raw_name:
+            return None
+        char = text[pos : pos + 1]
+        if char == ",":
+            pos = _SPACE.match(text, pos + 1).end()
+            char = text[pos : pos + 1]
+            if char != closer:
+                continue
+        if char != closer or text[pos + 1 :].strip(" \n\r"):
+            return None
+        fields["ENTRYTYPE"] = entry_type
+        fields["ID"] = head.group(3)
+        return fields
+
+
+def entry_key(text: str) -> str:
+    # The citation key of an entry, without parsing the rest of it
+    head = _ENTRY_HEAD.match(text)
+    return head.group(3) if head is not None else ""
+
+
+def may_use_macros(text: str) -> bool:
+    # False only for entries none of whose values can refer to an @string
+    return _MACRO_REFERENCE.search(text) is not None
+
+
+def text_hash(text: str) -> str:
+    # SHA-256 of an entry exactly as written, to recognise it unparsed
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _accented(match: "re.Match[str]") -> str:
+    accent = _ACCENTS[match.group(1) or match.group(2)]
+    letter = (match.group(3) or match.group(4) or match.group(5))[-1]
+    return unicodedata.normalize("NFC", letter + accent)
+
+
+def latex_to_unicode(text: str) -> str:
+    """Text of a BibTeX value as it would be typeset.
+
+    Accents and special letters become Unicode ("Schr{\\"o}dinger" ->
+    "Schrödinger"), grouping braces go ("The {DNA} helix" -> "The DNA
+    helix") and runs of whitespace, ~ included, become single spaces.
+    Math and other commands are left as they are, with their arguments.
+    """
+    if "\\" in text:
+        text = _ACCENT.sub(_accented, text)
+        text = _LETTER.sub(lambda match: _LETTERS[match.group(1)], text)
+        text = _ESCAPED.sub(r"\1", text)
+    if "{" in text or "}" in text:
+        kept = []
+        pieces = []
+        last = 0
+        for match in _COMMAND_OR_BRACE.finditer(text):
+            token = match.group()
+            if token[0] == "\\" and token[-1] != "{":
+                continue
+            pieces.append(text[last : match.start()])
+            last = match.end()
+            if token == "}":
+                if kept and kept.pop():
+                    pieces.append(token)
+            elif token == "{":
+                kept.append(False)
+            else:
+                kept.append(True)
+                pieces.append(token)
+        pieces.append(text[last:])
+        text = "".join(pieces)
+    return " ".join(text.replace("~", " ").split())
+
+
+def split_authors(value: str) -> List[str]:
+    """The names of an author or editor field, as BibTeX separates them.
+
+    Names are separated by "and" between whitespace, in any case, but not
+    inside braces: "{Barnes and Noble} and Smith, J" is two names.
+    """
+    names = []
+    depth = 0
+    start = 0
+    for match in _SPLIT_AUTHORS.finditer(value):
+        token = match.group()
+        if token == "{":
+            depth += 1
+        elif token == "}":
+            depth = max(depth - 1, 0)
+        elif depth == 0:
+            names.append(value[start : match.start()])
+            start = match.end()
+    names.append(value[start:])
+    return [" ".join(name.split()) for name in names if name.strip()]
+
+
+def author_names(value: str) -> List[str]:
+    # The names of an author field as stored: decoded, and with any "and"
+    # inside a name written "&", since stored names are joined with " and "
+    return [_AND.sub(" & ", latex_to_unicode(name)) for name in split_authors(value)]
+
+
+def normalise_doi(doi: str) -> str:
+    # DOIs are case-insensitive and often stored as resolver URLs
+    return _DOI_PREFIX.sub("", doi.strip()).lower()
+
+
+def normalise_title(title: str) -> str:
+    return _NON_WORD.sub(" ", title.replace("{", "").replace("}", "")).strip().casefold()
+
+
+def match_key(name: str) -> str:
+    # Citation keys, DOIs and file names reduced to their letters and digits,
+    # so that DOI 10.1103/PhysRevB.1 matches 10.1103_physrevb.1.pdf
+    return _NON_WORD.sub("", normalise_doi(name))
+
+
+def content_hash(entry: Dict[str, str]) -> str:
+    """SHA-256 of a parsed entry, independent of layout and field order.
+
+    The entry type, citation key and every field take part; field names are
+    lower-cased, whitespace inside values is collapsed and the DOI is
+    normalised.
+    """
+    fields = []
+    for name, value in entry.items():
+        name = name.lower()
+        if name in ("entrytype", "id"):
+            continue
+        value = _WHITESPACE.sub(" ", value).strip()
+        if name == "doi":
+            value = normalise_doi(value)
+        fields.append(f"{name}={value}")
+    canonical = "\n".join(
+        [entry.get("ENTRYTYPE", "").lower(), entry.get("ID", "")] + sorted(fields)
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def entry_identity(entry: Dict[str, str]) -> Tuple[str, str, str]:
+    # (content hash, normalised DOI, citation key) as stored in bibtex_entries
+    return content_hash(entry), normalise_doi(entry.get("doi", "")), entry.get("ID", "")
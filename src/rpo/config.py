@@ -1,19 +1,43 @@
 import json
+import os
 from pathlib import Path
 from dataclasses import dataclass, asdict
+from typing import Optional
 
 CONFIG_FILE = Path.home() / ".rpo.json"
 DB_FILE = Path.home() / ".research_papers.db"
+# Where `rpo serve` listens
+SOCKET_FILE = Path.home() / ".rpo.sock"
+# Commands the CLI sends to a running server
+SERVED_COMMANDS = ("list", "search", "details", "add")
+# Set to "1" to profile rpo with a summary on stderr at exit, or to a file
+# name to write a JSON trace there (see profiling.py)
+PROFILE_VARIABLE = "RPO_PROFILE"
 
 
 @dataclass
 class Config:
     db_str: str
+    # Keep paper IDs when papers are removed instead of renumbering the rest
+    stable_ids: bool = False
+    # Directory of the content-addressed PDF store, None to keep PDFs where
+    # they were added from, and whether PDFs are copied into it or linked
+    pdf_store: Optional[str] = None
+    store_mode: str = "copy"
 
     def __post_init__(self):
         self.db_path = Path(self.db_str).expanduser().resolve()
 
 
+def profile_destination() -> Optional[str]:
+    # Where RPO_PROFILE asks for the profile to go: "-" for stderr, else a
+    # file; None if profiling is off
+    setting = os.environ.get(PROFILE_VARIABLE, "")
+    if setting in ("", "0"):
+        return None
+    return "-" if setting == "1" else setting
+
+
 def load_config(db_file: Path = DB_FILE, config_file: Path = CONFIG_FILE) -> Config:
     if not config_file.exists():
         print(f"Using default configuration at: {str(CONFIG_FILE)}")
@@ -33,11 +57,23 @@ def update_config() -> None:
     db_str = input(
         "Enter the new path for the database file (leave blank to keep current): "
     )
-    if not db_str:
+    stable_ids = input(
+        "Keep paper IDs stable when papers are removed? [y/n] (leave blank to keep current): "
+    ).strip().lower()
+    pdf_store = input(
+        "Directory to store PDFs in by content (leave blank to keep current, "
+        "'none' to keep PDFs where they are): "
+    ).strip()
+    if not db_str and stable_ids not in ("y", "n") and not pdf_store:
         print("Configuration not updated.")
         return
     config = load_config()
-    config.db_str = db_str
-    config.__post_init__()
+    if db_str:
+        config.db_str = db_str
+        config.__post_init__()
+    if stable_ids in ("y", "n"):
+        config.stable_ids = stable_ids == "y"
+    if pdf_store:
+        config.pdf_store = None if pdf_store.lower() == "none" else pdf_store
     save_config(config)
     print("Configuration updated successfully.")
@@ -0,0 +1,39 @@
+import sqlite3
+from pathlib import Path
+from typing import Union
+
+# Seconds a connection waits for another one's write lock before giving up
+# with "database is locked"
+BUSY_TIMEOUT = 10.0
+# Prepared statements kept per connection; the organiser's queries vary by
+# batch size and options, more than the default 128 hold
+CACHED_STATEMENTS = 512
+# Page cache per connection, in KiB
+CACHE_SIZE_KIB = 64 * 1024
+# Bytes of the database file read through memory mapping instead of read()
+MMAP_SIZE = 256 * 1024 * 1024
+# SQLite's default limit on host parameters in a single statement
+MAX_SQL_VARIABLES = 999
+
+
+def connect(path: Union[str, Path]) -> sqlite3.Connection:
+    """Open the library database, tuned for one writer and many readers.
+
+    In WAL mode readers never block the writer or each other, so the GUI's
+    worker, the GUI and any number of CLI invocations can use the library
+    at once; writers queue for up to BUSY_TIMEOUT seconds. synchronous =
+    NORMAL is durable across application crashes in WAL mode and only a
+    power loss can lose the last transactions.
+    """
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, cached_statements=CACHED_STATEMENTS)
+    # The journal mode is stored in the database, so this only changes
+    # anything the first time
+    (mode,) = conn.execute("PRAGMA journal_mode").fetchone()
+    if mode.lower() != "wal":
+        conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = {-CACHE_SIZE_KIB}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
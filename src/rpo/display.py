@@ -0,0 +1,95 @@
+import itertools
+import textwrap
+from typing import Any, Dict, Iterable, List, Tuple
+
+# Output of the CLI. Kept apart from the organiser so that commands answered
+# by `rpo serve` can print without importing it; papers and details are
+# anything with the attributes of Paper and PaperDetails
+
+FACET_TITLES = {
+    "year": "Papers per year",
+    "journal": "Top journals",
+    "author": "Top authors",
+    "keyword": "Top keywords",
+}
+
+
+def print_papers(papers: Iterable[Any], empty_message: str = "No papers found.") -> int:
+    # Prints as papers arrive, so output starts before a large listing
+    # has been read; returns the number printed
+    papers = iter(papers)
+    first = next(papers, None)
+    if first is None:
+        print(empty_message)
+        return 0
+
+    # Define column widths
+    id_width = 4
+    authors_width = 30
+    year_width = 6
+    journal_width = 20
+    title_width = 50
+
+    # Print header
+    print(
+        f"{'ID':<{id_width}} {'Authors':<{authors_width}} {'Year':<{year_width}} {'Journal':<{journal_width}} {'Title'}"
+    )
+    print(
+        "-"
+        * (4 + id_width + authors_width + year_width + journal_width + title_width)
+    )
+
+    # Print each paper
+    count = 0
+    for paper in itertools.chain([first], papers):
+        count += 1
+        # Truncate authors if too long
+        authors = paper.authors
+        if len(authors) > authors_width:
+            authors = authors[: authors_width - 3] + "..."
+
+        # Truncate journal if too long
+        journal = paper.journal
+        if len(journal) > journal_width:
+            journal = journal[: journal_width - 3] + "..."
+
+        # Wrap title
+        wrapped_title = textwrap.wrap(paper.title, width=title_width)
+
+        # Print first line
+        print(
+            f"{paper.id:<{id_width}} {authors:<{authors_width}} {paper.year:<{year_width}} {journal:<{journal_width}} {wrapped_title[0]}"
+        )
+
+        # Print remaining lines of title, if any
+        for line in wrapped_title[1:]:
+            print(
+                f"{'':<{id_width}} {'':<{authors_width}} {'':<{year_width}} {'':<{journal_width}} {line}"
+            )
+
+        print()  # Add a blank line between papers
+    return count
+
+
+def print_details(details: Any) -> None:
+    print(f"Title: {details.title}")
+    print(f"Year: {details.year}")
+    print(f"Journal: {details.journal}")
+    print(f"File: {details.file_path}")
+    print(f"Authors: {'; '.join(details.authors)}")
+    print(f"Keywords: {', '.join(details.keywords)}")
+    print(f"BibTeX:\n{details.bibtex}")
+
+
+def print_facets(facets: Dict[str, List[Tuple[Any, int]]]) -> None:
+    # Facets as returned by ResearchPaperOrganiser.facets, one table each
+    for number, (name, counts) in enumerate(facets.items()):
+        if number:
+            print()
+        print(FACET_TITLES.get(name, name))
+        if not counts:
+            print("  (none)")
+            continue
+        width = max(len(str(value)) for value, _ in counts)
+        for value, count in counts:
+            print(f"  {'' if value is None else value!s:<{width}}  {count:>7}")
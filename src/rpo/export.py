@@ -0,0 +1,134 @@
+import csv
+import itertools
+import json
+import sys
+from typing import IO, Iterator, List, Optional, Tuple
+
+from .rpo import ResearchPaperOrganiser
+
+FORMATS = ("bib", "csv", "jsonl", "parquet")
+# Columns of the tabular formats, in order
+COLUMNS = (
+    "id", "title", "authors", "year", "journal", "keywords", "doi", "citation_key", "file_path"
+)
+# Rows per Parquet row group
+PARQUET_BATCH = 100000
+
+
+def _split(value: Optional[str], separator: str) -> List[str]:
+    return value.split(separator) if value else []
+
+
+def _lists(rows: Iterator[Tuple]) -> Iterator[Tuple]:
+    # Authors and keywords as lists rather than joined strings
+    for id, title, authors, year, journal, keywords, doi, key, file_path in rows:
+        yield (
+            id,
+            title,
+            _split(authors, " and "),
+            year,
+            journal,
+            _split(keywords, "; "),
+            doi,
+            key,
+            file_path,
+        )
+
+
+def write_bib(rows: Iterator[Tuple], f: IO[str]) -> int:
+    # The entries exactly as they were added
+    count = 0
+    for (bibtex,) in rows:
+        if bibtex:
+            f.write(bibtex)
+            f.write("\n\n")
+            count += 1
+    return count
+
+
+def write_csv(rows: Iterator[Tuple], f: IO[str]) -> int:
+    writer = csv.writer(f)
+    writer.writerow(COLUMNS)
+    count = 0
+    for row in rows:
+        # One separator for both lists
+        authors = row[2].replace(" and ", "; ") if row[2] else row[2]
+        writer.writerow(row[:2] + (authors,) + row[3:])
+        count += 1
+    return count
+
+
+def write_jsonl(rows: Iterator[Tuple], f: IO[str]) -> int:
+    # json.dumps builds a new encoder for every call with non-default options
+    encode = json.JSONEncoder(ensure_ascii=False).encode
+    count = 0
+    for row in _lists(rows):
+        f.write(encode(dict(zip(COLUMNS, row))))
+        f.write("\n")
+        count += 1
+    return count
+
+
+def write_parquet(rows: Iterator[Tuple], path: str) -> int:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Exporting to Parquet needs pyarrow (pip install pyarrow).")
+
+    schema = pa.schema(
+        [
+            ("id", pa.int64()),
+            ("title", pa.string()),
+            ("authors", pa.list_(pa.string())),
+            ("year", pa.int64()),
+            ("journal", pa.string()),
+            ("keywords", pa.list_(pa.string())),
+            ("doi", pa.string()),
+            ("citation_key", pa.string()),
+            ("file_path", pa.string()),
+        ]
+    )
+    count = 0
+    rows = _lists(rows)
+    writer = pq.ParquetWriter(path, schema)
+    try:
+        for batch in iter(lambda: list(itertools.islice(rows, PARQUET_BATCH)), []):
+            arrays = [
+                pa.array(values, type=field.type)
+                for values, field in zip(zip(*batch), schema)
+            ]
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            count += len(batch)
+    finally:
+        writer.close()
+    return count
+
+
+def export_papers(
+    organiser: ResearchPaperOrganiser,
+    format: str,
+    output: Optional[str] = None,
+    query: Optional[str] = None,
+    keyword: Optional[str] = None,
+) -> int:
+    """Write the papers to output, or stdout if not given, and return how many.
+
+    Rows are streamed from the database, so libraries of any size export
+    in bounded memory. Parquet, being binary, needs an output file.
+    """
+    if format not in FORMATS:
+        raise ValueError(f"Unknown export format {format!r}")
+    columns = ("bibtex",) if format == "bib" else COLUMNS
+    rows = organiser.iter_export(columns, query=query, keyword=keyword)
+    if format == "parquet":
+        if output is None:
+            raise ValueError("Parquet can only be written to a file (use --output).")
+        return write_parquet(rows, output)
+
+    writer = {"bib": write_bib, "csv": write_csv, "jsonl": write_jsonl}[format]
+    if output is None:
+        return writer(rows, sys.stdout)
+    # newline="" leaves line endings to the csv module
+    with open(output, "w", encoding="utf-8", newline="") as f:
+        return writer(rows, f)
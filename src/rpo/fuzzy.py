@@ -0,0 +1,102 @@
+import re
+import sqlite3
+import unicodedata
+from typing import Iterable, Iterator, List, Set, Tuple
+
+from .database import MAX_SQL_VARIABLES
+
+# Typo-tolerant matching of author names and title words. Every word ever
+# added is kept once in fuzzy_terms, and each of its trigrams in
+# fuzzy_trigrams, so the words resembling a mistyped one are found by
+# looking up the mistyped word's trigrams rather than by comparing it with
+# every word of the library.
+
+# Share of trigrams (shared / all of both words) a word needs in common
+# with another to be counted as similar, as pg_trgm's default
+SIMILARITY_THRESHOLD = 0.3
+# Letters NFKD does not decompose into a base letter and an accent
+_LETTERS = str.maketrans(
+    {"ø": "o", "ł": "l", "đ": "d", "ð": "d", "þ": "th", "æ": "ae", "œ": "oe", "ı": "i"}
+)
+_WORD = re.compile(r"\w+")
+
+
+def fold(text: str) -> str:
+    """Lower-case text and strip its accents: "Schrödinger" -> "schrodinger"."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).translate(_LETTERS)
+
+
+def words(text: str) -> Iterator[str]:
+    # The words of a name or title worth correcting, lower-cased; numbers
+    # and single letters (initials) are left out
+    for word in _WORD.findall(text.casefold()):
+        if len(word) > 1 and not word.isdigit():
+            yield word
+
+
+def trigrams(word: str) -> Set[str]:
+    # Padded as pg_trgm does, so that the start of a word weighs more than
+    # its end and even two-letter words have trigrams
+    padded = f"  {fold(word)} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a: str, b: str) -> float:
+    ta, tb = trigrams(a), trigrams(b)
+    shared = len(ta & tb)
+    return shared / (len(ta) + len(tb) - shared) if ta or tb else 0.0
+
+
+def index_terms(cursor: sqlite3.Cursor, texts: Iterable[str]) -> int:
+    """Add the words of texts not in the index yet; returns how many."""
+    candidates = list({word for text in texts if text for word in words(text)})
+    known: Set[str] = set()
+    for start in range(0, len(candidates), MAX_SQL_VARIABLES):
+        batch = candidates[start : start + MAX_SQL_VARIABLES]
+        cursor.execute(
+            f"SELECT term FROM fuzzy_terms WHERE term IN ({', '.join('?' * len(batch))})",
+            batch,
+        )
+        known.update(term for (term,) in cursor.fetchall())
+
+    new = [word for word in candidates if word not in known]
+    for word in new:
+        grams = trigrams(word)
+        cursor.execute(
+            "INSERT INTO fuzzy_terms (term, trigram_count) VALUES (?, ?)", (word, len(grams))
+        )
+        term_id = cursor.lastrowid
+        cursor.executemany(
+            "INSERT INTO fuzzy_trigrams (trigram, term_id) VALUES (?, ?)",
+            [(gram, term_id) for gram in grams],
+        )
+    return len(new)
+
+
+def similar_terms(
+    conn: sqlite3.Connection,
+    word: str,
+    limit: int,
+    threshold: float = SIMILARITY_THRESHOLD,
+) -> List[Tuple[str, float]]:
+    """Indexed words resembling word, most similar first, with their similarity."""
+    grams = sorted(trigrams(word))
+    # A word sharing s of the n trigrams has a similarity of at most s / n,
+    # so most candidates are dropped before their similarity is computed
+    return conn.execute(
+        f"""
+        SELECT t.term, CAST(m.shared AS REAL) / (? + t.trigram_count - m.shared) AS similarity
+        FROM (
+            SELECT term_id, COUNT(*) AS shared FROM fuzzy_trigrams
+            WHERE trigram IN ({", ".join("?" * len(grams))})
+            GROUP BY term_id
+            HAVING COUNT(*) >= ?
+        ) m
+        JOIN fuzzy_terms t ON t.id = m.term_id
+        WHERE similarity >= ?
+        ORDER BY similarity DESC, t.term
+        LIMIT ?
+        """,
+        (len(grams), *grams, threshold * len(grams), threshold, limit),
+    ).fetchall()
@@ -1,4 +1,6 @@
+import itertools
 import sys
+from typing import Callable, Iterator, List, Optional
 from PyQt6.QtWidgets import (
     QApplication,
     QMainWindow,
@@ -11,12 +13,152 @@ from PyQt6.QtWidgets import (
     QTextEdit,
     QLabel,
     QFileDialog,
-    QTableWidget,
-    QTableWidgetItem,
+    QTableView,
+    QHeaderView,
     QMessageBox,
+    QProgressBar,
 )
-from PyQt6.QtCore import Qt
-from .rpo import ResearchPaperOrganiser
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, QTimer, pyqtSignal
+from .rpo import ResearchPaperOrganiser, Paper
+from .worker import DatabaseClient
+
+# Pause in typing after which the search tab runs the query
+SEARCH_DELAY_MS = 10
+
+# Fetches papers in a given order: (organiser, sort field or None, descending)
+PaperQuery = Callable[[ResearchPaperOrganiser, Optional[str], bool], Iterator[Paper]]
+
+
+class PaperTableModel(QAbstractTableModel):
+    """Table of papers read from the database a page at a time.
+
+    Rows are pulled from a streaming query only as the view scrolls down to
+    them, and sorting re-runs the query with an SQL ORDER BY, so opening a
+    large library costs one page of rows rather than the whole table. The
+    queries run on the database thread; a new query cancels the previous
+    one, and the current rows stay until its first page arrives.
+    """
+
+    HEADERS = ["ID", "Authors", "Year", "Journal", "Title"]
+    FIELDS = ["id", "authors", "year", "journal", "title"]
+    PAGE_SIZE = 200
+
+    # Emitted with the exception when a query fails
+    error = pyqtSignal(object)
+    # Emitted when the first page of a new query is shown
+    loaded = pyqtSignal()
+
+    def __init__(self, client: DatabaseClient, parent=None):
+        super().__init__(parent)
+        self._client = client
+        self._query: Optional[PaperQuery] = None
+        self._rows: Optional[Iterator[Paper]] = None
+        self._papers: List[Paper] = []
+        self._sort: Optional[str] = None
+        self._descending = False
+        self._job: Optional[int] = None
+
+    def set_query(self, query: Optional[PaperQuery]) -> None:
+        self._cancel()
+        self._query = query
+        if query is None:
+            self._show(None, [])
+            return
+        sort, descending, page_size = self._sort, self._descending, self.PAGE_SIZE
+
+        def open_query(organiser, progress):
+            rows = query(organiser, sort, descending)
+            return rows, list(itertools.islice(rows, page_size))
+
+        self._job = self._client.submit(open_query, self._opened, self._failed)
+
+    def refresh(self) -> None:
+        self.set_query(self._query)
+
+    def _opened(self, result) -> None:
+        self._job = None
+        self._show(*result)
+        self.loaded.emit()
+
+    def _show(self, rows: Optional[Iterator[Paper]], papers: List[Paper]) -> None:
+        self.beginResetModel()
+        self._close_rows()
+        self._rows = rows if len(papers) == self.PAGE_SIZE else None
+        self._papers = papers
+        self.endResetModel()
+        if rows is not None and self._rows is None:
+            self._close(rows)
+
+    def _failed(self, error: Exception) -> None:
+        self._job = None
+        self.error.emit(error)
+
+    def _cancel(self) -> None:
+        if self._job is not None:
+            self._client.cancel(self._job)
+            self._job = None
+
+    def _close_rows(self) -> None:
+        if self._rows is not None:
+            self._close(self._rows)
+            self._rows = None
+
+    def _close(self, rows: Iterator[Paper]) -> None:
+        # Closing the generator releases its SQLite cursor, which only the
+        # database thread may touch
+        self._client.submit(lambda organiser, progress: rows.close())
+
+    def paper(self, row: int) -> Paper:
+        return self._papers[row]
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._papers)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        value = getattr(self._papers[index.row()], self.FIELDS[index.column()])
+        return "" if value is None else str(value)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if (
+            orientation == Qt.Orientation.Horizontal
+            and role == Qt.ItemDataRole.DisplayRole
+        ):
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def canFetchMore(self, parent=QModelIndex()) -> bool:
+        return not parent.isValid() and self._rows is not None and self._job is None
+
+    def fetchMore(self, parent=QModelIndex()) -> None:
+        if not self.canFetchMore(parent):
+            return
+        rows, page_size = self._rows, self.PAGE_SIZE
+        self._job = self._client.submit(
+            lambda organiser, progress: list(itertools.islice(rows, page_size)),
+            self._fetched,
+            self._failed,
+        )
+
+    def _fetched(self, batch: List[Paper]) -> None:
+        self._job = None
+        if len(batch) < self.PAGE_SIZE:
+            self._close_rows()
+        if batch:
+            first = len(self._papers)
+            self.beginInsertRows(QModelIndex(), first, first + len(batch) - 1)
+            self._papers.extend(batch)
+            self.endInsertRows()
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder) -> None:
+        # Column -1 restores the query's own order (e.g. relevance)
+        self._sort = self.FIELDS[column] if 0 <= column < len(self.FIELDS) else None
+        self._descending = order == Qt.SortOrder.DescendingOrder
+        self.refresh()
 
 
 class MainWindow(QMainWindow):
@@ -28,9 +170,19 @@ class MainWindow(QMainWindow):
         # config = get_config()
         # self.organiser = ResearchPaperOrganiser(config["db_path"], config["pdf_dir"])
         self.organiser = RPO
+        # Every query runs on a worker thread with its own connection, so
+        # the window stays responsive while the database is busy
+        self.database = DatabaseClient(RPO.config, self)
 
         self.init_ui()
 
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setMaximumWidth(200)
+        self.progress_bar.hide()
+        self.statusBar().addPermanentWidget(self.progress_bar)
+        self.database.busy.connect(self.show_busy)
+        self.database.progress.connect(self.show_progress)
+
     def init_ui(self):
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
@@ -68,6 +220,10 @@ class MainWindow(QMainWindow):
         add_button.clicked.connect(self.add_paper)
         add_layout.addWidget(add_button)
 
+        import_button = QPushButton("Import BibTeX File")
+        import_button.clicked.connect(self.import_bibtex_file)
+        add_layout.addWidget(import_button)
+
         tabs.addTab(add_tab, "Add Paper")
 
         # Search Tab
@@ -76,18 +232,22 @@ class MainWindow(QMainWindow):
 
         search_input_layout = QHBoxLayout()
         self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Search as you type")
+        # Searches once typing pauses; each search also cancels the one
+        # still running for the previous text
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DELAY_MS)
+        self.search_timer.timeout.connect(self.search_papers)
+        self.search_input.textChanged.connect(self.search_timer.start)
+        self.search_input.returnPressed.connect(self.search_papers)
         search_button = QPushButton("Search")
         search_button.clicked.connect(self.search_papers)
         search_input_layout.addWidget(self.search_input)
         search_input_layout.addWidget(search_button)
         search_layout.addLayout(search_input_layout)
 
-        self.search_results = QTableWidget()
-        self.search_results.setColumnCount(5)
-        self.search_results.setHorizontalHeaderLabels(
-            ["ID", "Authors", "Year", "Journal", "Title"]
-        )
-        self.search_results.cellDoubleClicked.connect(self.open_paper)
+        self.search_results = self.create_paper_table()
         search_layout.addWidget(self.search_results)
 
         tabs.addTab(search_tab, "Search Papers")
@@ -100,16 +260,44 @@ class MainWindow(QMainWindow):
         list_button.clicked.connect(self.list_all_papers)
         list_layout.addWidget(list_button)
 
-        self.papers_list = QTableWidget()
-        self.papers_list.setColumnCount(5)
-        self.papers_list.setHorizontalHeaderLabels(
-            ["ID", "Authors", "Year", "Journal", "Title"]
-        )
-        self.papers_list.cellDoubleClicked.connect(self.open_paper)
+        self.papers_list = self.create_paper_table()
         list_layout.addWidget(self.papers_list)
 
         tabs.addTab(list_tab, "List All Papers")
 
+    def create_paper_table(self) -> QTableView:
+        table = QTableView()
+        model = PaperTableModel(self.database, table)
+        model.error.connect(self.show_error)
+        # Sized from the first page only, never from the whole library
+        model.loaded.connect(table.resizeColumnsToContents)
+        table.setModel(model)
+        table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
+        # Fixed row heights and interactive column widths, so Qt never has
+        # to measure every cell of a large table
+        table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        table.verticalHeader().hide()
+        header = table.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
+        header.setStretchLastSection(True)
+        # No sort indicator until a header is clicked keeps the query's order
+        header.setSortIndicator(-1, Qt.SortOrder.AscendingOrder)
+        table.setSortingEnabled(True)
+        table.doubleClicked.connect(self.open_paper)
+        return table
+
+    def show_error(self, error: Exception):
+        QMessageBox.warning(self, "Error", str(error))
+
+    def show_busy(self, busy: bool):
+        # Indeterminate until a task reports how far it has got
+        self.progress_bar.setRange(0, 0)
+        self.progress_bar.setVisible(busy)
+
+    def show_progress(self, done: int, total: int):
+        self.progress_bar.setRange(0, total)
+        self.progress_bar.setValue(done)
+
     def browse_file(self):
         file_name, _ = QFileDialog.getOpenFileName(
             self, "Select PDF File", "", "PDF Files (*.pdf)"
@@ -117,46 +305,79 @@ class MainWindow(QMainWindow):
         if file_name:
             self.file_input.setText(file_name)
 
+    def keywords(self):
+        return [
+            keyword.strip()
+            for keyword in self.keywords_input.text().split(",")
+            if keyword.strip()
+        ]
+
     def add_paper(self):
         bibtex = self.bibtex_input.toPlainText()
         file_path = self.file_input.text()
-        keywords = [
-            keyword.strip() for keyword in self.keywords_input.text().split(",")
-        ]
+        keywords = self.keywords()
+        self.database.submit(
+            lambda organiser, progress: organiser.add_paper(bibtex, file_path, keywords),
+            self.paper_added,
+            self.show_error,
+        )
+
+    def paper_added(self, result):
+        QMessageBox.information(self, "Success", "Paper added successfully.")
+        self.bibtex_input.clear()
+        self.file_input.clear()
+        self.keywords_input.clear()
+        self.papers_list.model().refresh()
+
+    def import_bibtex_file(self):
+        file_name, _ = QFileDialog.getOpenFileName(
+            self, "Select BibTeX File", "", "BibTeX Files (*.bib)"
+        )
+        if not file_name:
+            return
+        keywords = self.keywords()
+        self.database.submit(
+            lambda organiser, progress: organiser.import_bibtex_file(
+                file_name, keywords, progress=progress
+            ),
+            self.bibtex_imported,
+            self.show_error,
+            report_progress=True,
+        )
 
-        try:
-            self.organiser.add_paper(bibtex, file_path, keywords)
-            QMessageBox.information(self, "Success", "Paper added successfully.")
-            self.bibtex_input.clear()
-            self.file_input.clear()
-            self.keywords_input.clear()
-        except ValueError as e:
-            QMessageBox.warning(self, "Error", str(e))
+    def bibtex_imported(self, report):
+        message = f"Imported {report.added} papers in {report.elapsed:.2f}s."
+        if report.errors:
+            message += f"\n{len(report.errors)} entries could not be imported."
+        QMessageBox.information(self, "Import finished", message)
+        self.papers_list.model().refresh()
 
     def search_papers(self):
+        self.search_timer.stop()
         query = self.search_input.text()
-        results = self.organiser.search_papers(query)
-        self.populate_table(self.search_results, results)
+        self.search_results.model().set_query(
+            lambda organiser, sort, descending: organiser.iter_search(
+                query, sort=sort, descending=descending
+            )
+        )
 
     def list_all_papers(self):
-        papers = self.organiser.list_all_papers()
-        self.populate_table(self.papers_list, papers)
-
-    def populate_table(self, table, papers):
-        table.setRowCount(0)
-        for row, paper in enumerate(papers):
-            table.insertRow(row)
-            for col, value in enumerate(paper[:5]):  # Exclude file_path
-                item = QTableWidgetItem(str(value))
-                item.setFlags(
-                    item.flags() & ~Qt.ItemFlag.ItemIsEditable
-                )  # Make item read-only
-                table.setItem(row, col, item)
-        table.resizeColumnsToContents()
-
-    def open_paper(self, row, column):
-        paper_id = int(self.sender().item(row, 0).text())
-        self.organiser.open_paper(paper_id)
+        self.papers_list.model().set_query(
+            lambda organiser, sort, descending: organiser.iter_papers(
+                sort=sort, descending=descending
+            )
+        )
+
+    def open_paper(self, index: QModelIndex):
+        paper_id = self.sender().model().paper(index.row()).id
+        self.database.submit(
+            lambda organiser, progress: organiser.open_paper(paper_id),
+            on_error=self.show_error,
+        )
+
+    def closeEvent(self, event):
+        self.database.close()
+        super().closeEvent(event)
 
 
 def run_gui(RPO: ResearchPaperOrganiser):
@@ -0,0 +1,708 @@
+import sqlite3
+from typing import Callable, Dict, List, Tuple
+
+from .fuzzy import index_terms
+
+# Tables that hang off papers. Their rows follow a paper when it is deleted
+# or renumbered, so no code path has to touch them by hand
+PAPER_CHILD_TABLES = {
+    "paper_authors": """
+        CREATE TABLE IF NOT EXISTS {name} (
+            paper_id INTEGER,
+            author_id INTEGER,
+            FOREIGN KEY (paper_id) REFERENCES papers (id)
+                ON DELETE CASCADE ON UPDATE CASCADE,
+            FOREIGN KEY (author_id) REFERENCES authors (id)
+        )
+    """,
+    "paper_keywords": """
+        CREATE TABLE IF NOT EXISTS {name} (
+            paper_id INTEGER,
+            keyword_id INTEGER,
+            FOREIGN KEY (paper_id) REFERENCES papers (id)
+                ON DELETE CASCADE ON UPDATE CASCADE,
+            FOREIGN KEY (keyword_id) REFERENCES keywords (id)
+        )
+    """,
+    "bibtex_entries": """
+        CREATE TABLE IF NOT EXISTS {name} (
+            paper_id INTEGER,
+            bibtex TEXT,
+            FOREIGN KEY (paper_id) REFERENCES papers (id)
+                ON DELETE CASCADE ON UPDATE CASCADE
+        )
+    """,
+}
+# Columns of each child table that must point at an existing row
+PAPER_CHILD_REFERENCES = {
+    "paper_authors": {"paper_id": "papers", "author_id": "authors"},
+    "paper_keywords": {"paper_id": "papers", "keyword_id": "keywords"},
+    "bibtex_entries": {"paper_id": "papers"},
+}
+
+
+def column_names(cursor: sqlite3.Cursor, table: str) -> List[str]:
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [row[1] for row in cursor.fetchall()]
+
+
+# Every migration must also cope with databases created before schema
+# versions were tracked, which start at version 0 whatever they contain
+
+
+def create_tables(cursor: sqlite3.Cursor) -> None:
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS papers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT,
+            year INTEGER,
+            file_path TEXT,
+            journal TEXT
+        )
+    """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS authors (
+            id INTEGER PRIMARY KEY,
+            name TEXT
+        )
+    """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS keywords (
+            id INTEGER PRIMARY KEY,
+            keyword TEXT
+        )
+    """
+    )
+    for name, create in PAPER_CHILD_TABLES.items():
+        cursor.execute(create.format(name=name))
+
+    # The journal column was added after the first release
+    if "journal" not in column_names(cursor, "papers"):
+        cursor.execute("ALTER TABLE papers ADD COLUMN journal TEXT")
+
+
+def cascade_paper_deletes(cursor: sqlite3.Cursor) -> None:
+    cursor.execute("PRAGMA foreign_key_list(paper_authors)")
+    if not any(row[6] == "CASCADE" for row in cursor.fetchall()):
+        # Recreate tables from databases created before deletions cascaded,
+        # dropping rows that already point at nothing
+        for name, create in PAPER_CHILD_TABLES.items():
+            cursor.execute(create.format(name=f"new_{name}"))
+            valid = " AND ".join(
+                f"{column} IN (SELECT id FROM {parent})"
+                for column, parent in PAPER_CHILD_REFERENCES[name].items()
+            )
+            cursor.execute(f"INSERT INTO new_{name} SELECT * FROM {name} WHERE {valid}")
+            cursor.execute(f"DROP TABLE {name}")
+            cursor.execute(f"ALTER TABLE new_{name} RENAME TO {name}")
+
+    # Without these every cascaded delete or renumber scans the table
+    for name in PAPER_CHILD_TABLES:
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{name}_paper_id ON {name} (paper_id)"
+        )
+
+
+def _merge_duplicates(
+    cursor: sqlite3.Cursor, table: str, column: str, link_table: str, link_column: str
+) -> None:
+    # Point links at the oldest row of every name, then drop the copies
+    cursor.execute(f"DROP TABLE IF EXISTS temp.{table}_map")
+    cursor.execute(
+        f"""
+        CREATE TEMP TABLE {table}_map AS
+        SELECT t.id AS old_id, k.keep_id
+        FROM {table} t
+        JOIN (SELECT {column}, MIN(id) AS keep_id FROM {table} GROUP BY {column}) k
+            ON t.{column} = k.{column}
+        WHERE t.id != k.keep_id
+        """
+    )
+    cursor.execute(f"CREATE UNIQUE INDEX temp.{table}_map_old ON {table}_map (old_id)")
+    cursor.execute(
+        f"""
+        UPDATE {link_table}
+        SET {link_column} = (SELECT keep_id FROM {table}_map WHERE old_id = {link_column})
+        WHERE {link_column} IN (SELECT old_id FROM {table}_map)
+        """
+    )
+    cursor.execute(f"DELETE FROM {table} WHERE id IN (SELECT old_id FROM {table}_map)")
+    cursor.execute(f"DROP TABLE temp.{table}_map")
+
+    # Merging can leave a paper linked to the same name twice
+    cursor.execute(
+        f"""
+        DELETE FROM {link_table} WHERE rowid NOT IN (
+            SELECT MIN(rowid) FROM {link_table} GROUP BY paper_id, {link_column}
+        )
+        """
+    )
+
+
+def unique_names_and_link_indexes(cursor: sqlite3.Cursor) -> None:
+    _merge_duplicates(cursor, "authors", "name", "paper_authors", "author_id")
+    _merge_duplicates(cursor, "keywords", "keyword", "paper_keywords", "keyword_id")
+
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_authors_name ON authors (name)")
+    cursor.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_keywords_keyword ON keywords (keyword)"
+    )
+    # (paper_id, x_id) serves lookups by paper and keeps links unique,
+    # (x_id, paper_id) covers lookups of every paper by an author or keyword
+    for link_table, link_column in (
+        ("paper_authors", "author_id"),
+        ("paper_keywords", "keyword_id"),
+    ):
+        cursor.execute(f"DROP INDEX IF EXISTS idx_{link_table}_paper_id")
+        cursor.execute(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{link_table}_paper "
+            f"ON {link_table} (paper_id, {link_column})"
+        )
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{link_table}_{link_column} "
+            f"ON {link_table} ({link_column}, paper_id)"
+        )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_papers_year_title ON papers (year DESC, title)"
+    )
+
+
+def bibtex_identity_columns(cursor: sqlite3.Cursor) -> None:
+    columns = column_names(cursor, "bibtex_entries")
+    for column in ("content_hash", "doi", "citation_key"):
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE bibtex_entries ADD COLUMN {column} TEXT")
+    _backfill_bibtex_identity(cursor)
+
+    cursor.execute(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_bibtex_entries_content_hash
+        ON bibtex_entries (content_hash)
+        """
+    )
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_bibtex_entries_doi ON bibtex_entries (doi)")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_bibtex_entries_citation_key "
+        "ON bibtex_entries (citation_key)"
+    )
+
+
+def _backfill_bibtex_identity(cursor: sqlite3.Cursor) -> None:
+    # Backfill in batches; entries that do not parse keep a NULL hash, and
+    # exact duplicates that slipped in earlier keep theirs NULL too so the
+    # unique index can be built. `rpo dedupe` still finds both by DOI,
+    # citation key and title.
+    cursor.execute("SELECT 1 FROM bibtex_entries WHERE content_hash IS NULL LIMIT 1")
+    if cursor.fetchone() is None:
+        return
+
+    from bibtexparser.bparser import BibTexParser
+
+    from .bibtex import entry_identity
+
+    parser = BibTexParser(common_strings=True)
+    parser.expect_multiple_parse = True
+    seen = set()
+    last = 0
+    while True:
+        cursor.execute(
+            """
+            SELECT rowid, bibtex FROM bibtex_entries
+            WHERE rowid > ? AND content_hash IS NULL ORDER BY rowid LIMIT 1000
+            """,
+            (last,),
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        updates = []
+        for rowid, bibtex in rows:
+            last = rowid
+            try:
+                entries = parser.parse(bibtex or "").entries
+            except Exception:
+                entries = []
+            if not entries:
+                continue
+            content_hash, doi, key = entry_identity(entries.pop())
+            entries.clear()
+            if content_hash in seen:
+                content_hash = None
+            seen.add(content_hash)
+            updates.append((content_hash, doi or None, key or None, rowid))
+        cursor.executemany(
+            """
+            UPDATE bibtex_entries SET content_hash = ?, doi = ?, citation_key = ?
+            WHERE rowid = ?
+            """,
+            updates,
+        )
+
+
+def pdf_files_table(cursor: sqlite3.Cursor) -> None:
+    # What index_pdfs last saw of each paper's PDF, so unchanged files are
+    # skipped. The text itself lives in the pdf_fts index under the same id,
+    # which stays put when papers are renumbered
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS pdf_files (
+            id INTEGER PRIMARY KEY,
+            paper_id INTEGER NOT NULL UNIQUE,
+            file_path TEXT NOT NULL,
+            mtime_ns INTEGER,
+            size INTEGER,
+            content_hash TEXT,
+            error TEXT,
+            FOREIGN KEY (paper_id) REFERENCES papers (id)
+                ON DELETE CASCADE ON UPDATE CASCADE
+        )
+    """
+    )
+
+
+def author_positions(cursor: sqlite3.Cursor) -> None:
+    # Author order is lost by GROUP_CONCAT and by the link index, which is
+    # sorted by author id. Links were always written in BibTeX order, so
+    # the order of their rowids is the author order
+    if "position" not in column_names(cursor, "paper_authors"):
+        cursor.execute("ALTER TABLE paper_authors ADD COLUMN position INTEGER")
+    cursor.execute("DROP TABLE IF EXISTS temp.author_positions")
+    cursor.execute(
+        """
+        CREATE TEMP TABLE author_positions AS
+        SELECT rowid AS link, ROW_NUMBER() OVER (PARTITION BY paper_id ORDER BY rowid) - 1
+            AS position
+        FROM paper_authors
+        """
+    )
+    cursor.execute(
+        "CREATE UNIQUE INDEX temp.author_positions_link ON author_positions (link)"
+    )
+    cursor.execute(
+        """
+        UPDATE paper_authors
+        SET position = (SELECT position FROM author_positions WHERE link = paper_authors.rowid)
+        WHERE position IS NULL
+        """
+    )
+    cursor.execute("DROP TABLE temp.author_positions")
+    # Reads a paper's authors in order without sorting
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_paper_authors_position "
+        "ON paper_authors (paper_id, position, author_id)"
+    )
+
+
+# The authors of a paper as written in its listing, in BibTeX order
+AUTHORS_OF_PAPER = """
+    (SELECT GROUP_CONCAT(name, ' and ') FROM (
+        SELECT a.name FROM paper_authors pa JOIN authors a ON a.id = pa.author_id
+        WHERE pa.paper_id = {paper}
+        ORDER BY pa.position
+    ))
+"""
+# Short label of an author string, as ResearchPaperOrganiser.format_authors
+# makes it: "A", "A & B" or "A et al."
+AUTHOR_LABEL = """
+    CASE
+        WHEN {authors} IS NULL THEN ''
+        WHEN instr({authors}, ' and ') = 0 THEN {authors}
+        WHEN instr(substr({authors}, instr({authors}, ' and ') + 5), ' and ') = 0
+            THEN replace({authors}, ' and ', ' & ')
+        ELSE substr({authors}, 1, instr({authors}, ' and ') - 1) || ' et al.'
+    END
+"""
+AUTHOR_SORT_KEY = "COALESCE(lower({authors}), '')"
+
+
+def paper_display_columns(cursor: sqlite3.Cursor) -> None:
+    # Listings read the author columns straight from papers. Triggers keep
+    # them up to date: links and names refresh the author string, which in
+    # turn refreshes the label and sort key
+    columns = column_names(cursor, "papers")
+    for column, definition in (
+        ("authors", "TEXT"),
+        ("author_label", "TEXT NOT NULL DEFAULT ''"),
+        ("author_sort", "TEXT NOT NULL DEFAULT ''"),
+    ):
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE papers ADD COLUMN {column} {definition}")
+
+    cursor.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS papers_author_label AFTER UPDATE OF authors ON papers
+        BEGIN
+            UPDATE papers SET
+                author_label = {AUTHOR_LABEL.format(authors="new.authors")},
+                author_sort = {AUTHOR_SORT_KEY.format(authors="new.authors")}
+            WHERE id = new.id;
+        END
+        """
+    )
+    # Renumbering moves links along with their paper and its columns, so
+    # changes of paper_id need no refresh
+    for name, event, paper in (
+        ("insert", "INSERT", "new.paper_id"),
+        ("delete", "DELETE", "old.paper_id"),
+        ("update", "UPDATE OF author_id, position", "new.paper_id"),
+    ):
+        cursor.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS paper_authors_display_{name}
+            AFTER {event} ON paper_authors
+            BEGIN
+                UPDATE papers SET authors = {AUTHORS_OF_PAPER.format(paper=paper)}
+                WHERE id = {paper};
+            END
+            """
+        )
+    cursor.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS authors_display_update AFTER UPDATE OF name ON authors
+        BEGIN
+            UPDATE papers SET authors = {AUTHORS_OF_PAPER.format(paper="papers.id")}
+            WHERE id IN (SELECT paper_id FROM paper_authors WHERE author_id = new.id);
+        END
+        """
+    )
+
+    cursor.execute(f"UPDATE papers SET authors = {AUTHORS_OF_PAPER.format(paper='papers.id')}")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_papers_author_sort ON papers (author_sort)"
+    )
+
+
+# Facets counted from a table linked to papers: the table, with a
+# paper_count column kept by triggers, its name column, the link table and
+# the link table's column pointing at the table
+FACET_COUNTS = {
+    "author": ("authors", "name", "paper_authors", "author_id"),
+    "keyword": ("keywords", "keyword", "paper_keywords", "keyword_id"),
+}
+
+
+def facet_counts(cursor: sqlite3.Cursor) -> None:
+    # Papers per author and per keyword, so the most frequent ones over the
+    # whole library are read off an index instead of counted from the links
+    for table, name, link_table, link_column in FACET_COUNTS.values():
+        if "paper_count" not in column_names(cursor, table):
+            cursor.execute(
+                f"ALTER TABLE {table} ADD COLUMN paper_count INTEGER NOT NULL DEFAULT 0"
+            )
+        for trigger, event, changes in (
+            ("insert", "INSERT", [("new", "+")]),
+            ("delete", "DELETE", [("old", "-")]),
+            ("update", f"UPDATE OF {link_column}", [("old", "-"), ("new", "+")]),
+        ):
+            updates = " ".join(
+                f"UPDATE {table} SET paper_count = paper_count {sign} 1 "
+                f"WHERE id = {row}.{link_column};"
+                for row, sign in changes
+            )
+            cursor.execute(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS {link_table}_count_{trigger}
+                AFTER {event} ON {link_table}
+                BEGIN
+                    {updates}
+                END
+                """
+            )
+        cursor.execute(
+            f"""
+            UPDATE {table} SET paper_count = (
+                SELECT COUNT(*) FROM {link_table} WHERE {link_column} = {table}.id
+            )
+            """
+        )
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{table}_paper_count "
+            f"ON {table} (paper_count DESC, {name})"
+        )
+    # Journal filters ignore case, as the journal facet does
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_papers_journal ON papers (journal COLLATE NOCASE, year)"
+    )
+
+
+def fuzzy_terms(cursor: sqlite3.Cursor) -> None:
+    # The words of author names and titles and their trigrams, for
+    # typo-tolerant search (see fuzzy.py)
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS fuzzy_terms (
+            id INTEGER PRIMARY KEY,
+            term TEXT NOT NULL UNIQUE,
+            trigram_count INTEGER NOT NULL
+        )
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS fuzzy_trigrams (
+            trigram TEXT NOT NULL,
+            term_id INTEGER NOT NULL REFERENCES fuzzy_terms (id) ON DELETE CASCADE,
+            PRIMARY KEY (trigram, term_id)
+        ) WITHOUT ROWID
+        """
+    )
+    cursor.execute("SELECT name FROM authors")
+    names = [name for (name,) in cursor.fetchall()]
+    cursor.execute("SELECT title FROM papers")
+    index_terms(cursor, names + [title for (title,) in cursor.fetchall()])
+
+
+def watched_files(cursor: sqlite3.Cursor) -> None:
+    # The PDFs and .bib files `rpo watch` has seen, so that a rescan only
+    # reads files added or changed since. match_key is the normalised file
+    # name PDFs are matched to citation keys and DOIs by; matched is set
+    # once a PDF belongs to a paper
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS watched_files (
+            path TEXT PRIMARY KEY,
+            mtime_ns INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            match_key TEXT,
+            matched INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_watched_files_unmatched "
+        "ON watched_files (match_key) WHERE matched = 0"
+    )
+
+
+def file_path_index(cursor: sqlite3.Cursor) -> None:
+    # Papers are found by their PDF's path in the content-addressed store
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_papers_file_path ON papers (file_path)")
+
+
+def bibtex_text_hash(cursor: sqlite3.Cursor) -> None:
+    # The SHA-256 of each entry as written, so that entries imported again
+    # are recognised before they are parsed
+    from .bibtex import text_hash
+
+    if "text_hash" not in column_names(cursor, "bibtex_entries"):
+        cursor.execute("ALTER TABLE bibtex_entries ADD COLUMN text_hash TEXT")
+    last = 0
+    while True:
+        cursor.execute(
+            """
+            SELECT rowid, bibtex FROM bibtex_entries
+            WHERE rowid > ? AND text_hash IS NULL ORDER BY rowid LIMIT 1000
+            """,
+            (last,),
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        last = rows[-1][0]
+        cursor.executemany(
+            "UPDATE bibtex_entries SET text_hash = ? WHERE rowid = ?",
+            [(text_hash(bibtex), rowid) for rowid, bibtex in rows if bibtex is not None],
+        )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_bibtex_entries_text_hash ON bibtex_entries (text_hash)"
+    )
+
+
+def bulk_author_links(cursor: sqlite3.Cursor) -> None:
+    # Rebuilding a paper's author string on every link made adding a paper
+    # quadratic in its number of authors. Writers inserting a paper's links
+    # put a row in bulk_author_links for the time being, so the triggers
+    # skip them, and then build the string once (see
+    # ResearchPaperOrganiser._insert_author_links). Edits made any other way
+    # still refresh it. The row never outlives the writer's transaction
+    cursor.execute("CREATE TABLE IF NOT EXISTS bulk_author_links (id INTEGER PRIMARY KEY)")
+    for name, event, paper in (
+        ("insert", "INSERT", "new.paper_id"),
+        ("delete", "DELETE", "old.paper_id"),
+        ("update", "UPDATE OF author_id, position", "new.paper_id"),
+    ):
+        cursor.execute(f"DROP TRIGGER IF EXISTS paper_authors_display_{name}")
+        cursor.execute(
+            f"""
+            CREATE TRIGGER paper_authors_display_{name}
+            AFTER {event} ON paper_authors
+            WHEN NOT EXISTS (SELECT 1 FROM bulk_author_links)
+            BEGIN
+                UPDATE papers SET authors = {AUTHORS_OF_PAPER.format(paper=paper)}
+                WHERE id = {paper};
+            END
+            """
+        )
+
+
+def decoded_paper_fields(cursor: sqlite3.Cursor) -> None:
+    # Titles, journals and author names are stored as typeset since
+    # parse_entry: LaTeX accents decoded and braces dropped (see
+    # bibtex.latex_to_unicode and author_names). Papers stored before are
+    # brought in line, so that "Schr{\"o}dinger, Erwin" and "Schrödinger,
+    # Erwin" are one author. A paper whose fields match its stored entry
+    # decoded is left alone; otherwise its fields hold the entry's values
+    # as written, @string macros expanded, and are decoded
+    from .bibtex import author_names, latex_to_unicode, parse_entry
+
+    cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'papers_fts'")
+    has_search_index = cursor.fetchone()[0] > 0
+    # The link triggers are paused, as in ResearchPaperOrganiser.add_paper
+    cursor.execute("INSERT OR IGNORE INTO bulk_author_links (id) VALUES (1)")
+    unlinked = set()
+    last = 0
+    while True:
+        cursor.execute(
+            """
+            SELECT p.id, p.title, p.journal, (
+                SELECT bibtex FROM bibtex_entries WHERE paper_id = p.id ORDER BY rowid LIMIT 1
+            )
+            FROM papers p WHERE p.id > ? ORDER BY p.id LIMIT 1000
+            """,
+            (last,),
+        )
+        papers = cursor.fetchall()
+        if not papers:
+            break
+        cursor.execute(
+            """
+            SELECT pa.paper_id, pa.author_id, a.name
+            FROM paper_authors pa JOIN authors a ON a.id = pa.author_id
+            WHERE pa.paper_id > ? AND pa.paper_id <= ?
+            ORDER BY pa.paper_id, pa.position
+            """,
+            (last, papers[-1][0]),
+        )
+        links: Dict[int, List[Tuple[int, str]]] = {}
+        for paper_id, author_id, name in cursor.fetchall():
+            links.setdefault(paper_id, []).append((author_id, name))
+        last = papers[-1][0]
+
+        terms = []
+        for paper_id, title, journal, bibtex in papers:
+            entry = (parse_entry(bibtex) if bibtex else None) or {}
+            title = title or ""
+            journal = journal or ""
+            names = [name for _, name in links.get(paper_id, [])]
+            new_title = title
+            if latex_to_unicode(entry.get("title", "")) != title:
+                new_title = latex_to_unicode(title)
+            new_journal = journal
+            if latex_to_unicode(entry.get("journal", "")) != journal:
+                new_journal = latex_to_unicode(journal)
+            new_names = names
+            if author_names(entry.get("author", "")) != names:
+                new_names = author_names(" and ".join(names))
+            if (new_title, new_journal, new_names) == (title, journal, names):
+                continue
+
+            cursor.execute(
+                "UPDATE papers SET title = ?, journal = ? WHERE id = ?",
+                (new_title, new_journal, paper_id),
+            )
+            if new_names != names:
+                unlinked.update(author_id for author_id, _ in links.get(paper_id, []))
+                cursor.execute("DELETE FROM paper_authors WHERE paper_id = ?", (paper_id,))
+                for position, name in enumerate(new_names):
+                    cursor.execute("INSERT OR IGNORE INTO authors (name) VALUES (?)", (name,))
+                    cursor.execute("SELECT id FROM authors WHERE name = ?", (name,))
+                    cursor.execute(
+                        """
+                        INSERT OR IGNORE INTO paper_authors (paper_id, author_id, position)
+                        VALUES (?, ?, ?)
+                        """,
+                        (paper_id, cursor.fetchone()[0], position),
+                    )
+                cursor.execute(
+                    f"UPDATE papers SET authors = {AUTHORS_OF_PAPER.format(paper='papers.id')} "
+                    "WHERE id = ?",
+                    (paper_id,),
+                )
+            if has_search_index:
+                cursor.execute(
+                    "UPDATE papers_fts SET title = ?, author = ?, journal = ? WHERE rowid = ?",
+                    (new_title, " ".join(new_names), new_journal, paper_id),
+                )
+            terms += [new_title] + new_names
+        index_terms(cursor, terms)
+    cursor.execute("DELETE FROM bulk_author_links")
+    # Names no paper is written with any more
+    cursor.executemany(
+        """
+        DELETE FROM authors
+        WHERE id = ? AND NOT EXISTS (SELECT 1 FROM paper_authors WHERE author_id = authors.id)
+        """,
+        [(author_id,) for author_id in unlinked],
+    )
+
+
+# Applied in order; a database at user_version N has had the first N run.
+# Never edit or reorder released migrations, only append new ones.
+MIGRATIONS: List[Callable[[sqlite3.Cursor], None]] = [
+    create_tables,
+    cascade_paper_deletes,
+    unique_names_and_link_indexes,
+    bibtex_identity_columns,
+    pdf_files_table,
+    author_positions,
+    paper_display_columns,
+    facet_counts,
+    fuzzy_terms,
+    watched_files,
+    file_path_index,
+    bibtex_text_hash,
+    bulk_author_links,
+    decoded_paper_fields,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> List[str]:
+    """Bring the database up to SCHEMA_VERSION and return what was applied.
+
+    Each migration runs in its own transaction together with the version
+    bump, so an interrupted upgrade resumes where it stopped.
+    """
+    version = schema_version(conn)
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(
+            f"The database schema (version {version}) is newer than this "
+            f"version of rpo supports ({SCHEMA_VERSION})."
+        )
+    applied = []
+    if version == SCHEMA_VERSION:
+        return applied
+
+    # Table rebuilds must not trigger cascades, and the pragma cannot
+    # change inside a transaction
+    conn.execute("PRAGMA foreign_keys = OFF")
+    try:
+        cursor = conn.cursor()
+        for number in range(version + 1, SCHEMA_VERSION + 1):
+            migration = MIGRATIONS[number - 1]
+            # Taking the write lock up front makes a second process opening
+            # the library wait here, and then find the work done
+            conn.execute("BEGIN IMMEDIATE")
+            if schema_version(conn) >= number:
+                conn.rollback()
+                continue
+            try:
+                migration(cursor)
+                cursor.execute(f"PRAGMA user_version = {number}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            applied.append(migration.__name__)
+    finally:
+        conn.execute("PRAGMA foreign_keys = ON")
+    return applied
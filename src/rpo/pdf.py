@@ -0,0 +1,63 @@
+import hashlib
+import shutil
+import subprocess
+from typing import Callable, Optional, Tuple
+
+# Turns the PDF at a path into plain text
+Extractor = Callable[[str], str]
+
+
+def pypdf_text(path: str) -> str:
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    return "\n".join(page.extract_text() or "" for page in reader.pages)
+
+
+def pdftotext_text(path: str) -> str:
+    result = subprocess.run(
+        ["pdftotext", "-q", "-enc", "UTF-8", path, "-"], capture_output=True, check=True
+    )
+    return result.stdout.decode("utf-8", "replace")
+
+
+def find_extractor() -> Optional[Extractor]:
+    # pypdf is pure Python; poppler's pdftotext is faster but not always there
+    try:
+        import pypdf  # noqa: F401
+    except ImportError:
+        pass
+    else:
+        return pypdf_text
+    if shutil.which("pdftotext"):
+        return pdftotext_text
+    return None
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def extract_pdf(
+    path: str, known_hash: Optional[str], extract: Extractor
+) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """Return (content hash, text, error) for one PDF.
+
+    Runs in a worker process. The text is None when the content hash equals
+    known_hash, i.e. the file was touched or moved but not changed, or when
+    extraction failed, in which case error says why.
+    """
+    try:
+        content_hash = file_hash(path)
+    except OSError as e:
+        return None, None, str(e)
+    if content_hash == known_hash:
+        return content_hash, None, None
+    try:
+        return content_hash, extract(path), None
+    except Exception as e:
+        return content_hash, None, str(e) or type(e).__name__
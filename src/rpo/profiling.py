@@ -0,0 +1,399 @@
+import atexit
+import builtins
+import contextlib
+import functools
+import sqlite3
+import sys
+import threading
+import time
+import types
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional, TextIO
+
+from .config import profile_destination
+
+# Opt-in instrumentation of ResearchPaperOrganiser. An organiser opened while
+# a profiler is active has its connection and cursor replaced by proxies that
+# time every SQL statement and count its rows, and its public methods
+# wrapped to time them; organisers opened without one are left untouched, so
+# profiling costs nothing when it is off.
+#
+# Time is split the way a flat profile splits it: each operation's self time
+# excludes the operations it calls, SQLite's time is its own row, and so is
+# importing modules, e.g. bibtexparser the first time an entry is parsed.
+# This module itself is only imported when profiling is asked for.
+
+# Name of the time spent inside SQLite, among the operations
+SQL_OPERATION = "sqlite"
+# Name of the time spent explaining statements, kept apart so that the
+# profiler's own cost is not counted towards the operations it times
+EXPLAIN_OPERATION = "explain query plan"
+# Events kept for the JSON trace; aggregates keep counting past this
+MAX_TRACE_EVENTS = 100000
+# Statements EXPLAIN QUERY PLAN applies to
+_EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+@dataclass
+class OperationStats:
+    calls: int = 0
+    total: float = 0.0
+    self_time: float = 0.0
+
+
+@dataclass
+class StatementStats:
+    calls: int = 0
+    total: float = 0.0
+    rows: int = 0
+    plan: List[str] = field(default_factory=list)
+
+
+class _Frame:
+    __slots__ = ("name", "start", "children")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = time.perf_counter()
+        self.children = 0.0
+
+
+class Profiler:
+    """Timings of operations, SQL statements and imports across threads."""
+
+    def __init__(self) -> None:
+        self.operations: Dict[str, OperationStats] = {}
+        self.statements: Dict[str, StatementStats] = {}
+        self.events: List[Dict[str, Any]] = []
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._import: Optional[Callable[..., Any]] = None
+
+    # Recording
+
+    def _stack(self) -> List[_Frame]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _enter(self, name: str) -> _Frame:
+        frame = _Frame(name)
+        self._stack().append(frame)
+        return frame
+
+    def _exit(self, frame: _Frame, call: bool = True, **details: Any) -> float:
+        # Steps of a generator and fetches of rows add to the time of a call
+        # made before, and are too many to be events of their own
+        elapsed = time.perf_counter() - frame.start
+        stack = self._stack()
+        stack.pop()
+        if stack:
+            stack[-1].children += elapsed
+        with self._lock:
+            stats = self.operations.setdefault(frame.name, OperationStats())
+            stats.calls += call
+            stats.total += elapsed
+            stats.self_time += elapsed - frame.children
+            if call and len(self.events) < MAX_TRACE_EVENTS:
+                self.events.append(
+                    dict(
+                        name=frame.name,
+                        start_ms=(frame.start - self.started) * 1000,
+                        ms=elapsed * 1000,
+                        depth=len(stack),
+                        thread=threading.get_ident(),
+                        **details,
+                    )
+                )
+        return elapsed
+
+    @contextlib.contextmanager
+    def operation(self, name: str) -> Iterator[None]:
+        frame = self._enter(name)
+        try:
+            yield
+        finally:
+            self._exit(frame)
+
+    def _record_statement(
+        self, sql: str, elapsed: float, rows: int, execution: bool, plan: Optional[List[str]]
+    ) -> None:
+        with self._lock:
+            stats = self.statements.setdefault(sql, StatementStats())
+            stats.calls += execution
+            stats.total += elapsed
+            stats.rows += rows
+            if plan is not None:
+                stats.plan = plan
+
+    def _explained(self, sql: str) -> bool:
+        with self._lock:
+            return sql in self.statements
+
+    # Installing
+
+    def instrument(self, organiser: Any) -> None:
+        """Time the organiser's SQL and public methods from now on."""
+        import inspect
+
+        organiser.conn = ProfiledConnection(organiser.conn, self)
+        organiser.cursor = organiser.conn.cursor()
+        for name in dir(type(organiser)):
+            attribute = inspect.getattr_static(organiser, name)
+            if name.startswith("_") or not inspect.isfunction(attribute):
+                continue
+            setattr(organiser, name, self._wrap(name, getattr(organiser, name)))
+
+    def _wrap(self, name: str, method: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(method)
+        def timed(*args: Any, **kwargs: Any) -> Any:
+            frame = self._enter(name)
+            try:
+                result = method(*args, **kwargs)
+            finally:
+                self._exit(frame)
+            if isinstance(result, types.GeneratorType):
+                return self._timed_generator(name, result)
+            return result
+
+        return timed
+
+    def _timed_generator(self, name: str, generator: Iterator[Any]) -> Iterator[Any]:
+        # The time spent producing each item counts towards the operation,
+        # not the time the caller spends between items
+        try:
+            while True:
+                frame = self._enter(name)
+                try:
+                    item = next(generator)
+                except StopIteration:
+                    return
+                finally:
+                    self._exit(frame, call=False)
+                yield item
+        finally:
+            generator.close()
+
+    def _timed_import(self, name: str, *args: Any, **kwargs: Any) -> Any:
+        # Only imports that load a module, outermost first: the modules it
+        # imports in turn count towards it
+        level = kwargs.get("level", args[3] if len(args) > 3 else 0)
+        assert self._import is not None
+        if level or name in sys.modules or getattr(self._local, "importing", False):
+            return self._import(name, *args, **kwargs)
+        self._local.importing = True
+        frame = self._enter(f"import {name}")
+        try:
+            return self._import(name, *args, **kwargs)
+        finally:
+            self._exit(frame)
+            self._local.importing = False
+
+    def start_timing_imports(self) -> None:
+        if self._import is None:
+            self._import = builtins.__import__
+            builtins.__import__ = functools.partial(Profiler._timed_import, self)
+
+    def stop_timing_imports(self) -> None:
+        if self._import is not None:
+            builtins.__import__ = self._import
+            self._import = None
+
+    # Reporting
+
+    def summary(self, limit: int = 20) -> str:
+        """The operations and SQL statements that took longest, as tables."""
+        wall = time.perf_counter() - self.started
+        lines = [
+            f"Profile of {wall * 1000:.1f} ms",
+            "",
+            f"{'Operation':<36}{'Calls':>8}{'Total ms':>11}{'Self ms':>11}",
+        ]
+        operations = sorted(self.operations.items(), key=lambda item: -item[1].self_time)
+        for name, stats in operations[:limit]:
+            lines.append(
+                f"{name[:35]:<36}{stats.calls:>8}{stats.total * 1000:>11.2f}"
+                f"{stats.self_time * 1000:>11.2f}"
+            )
+        lines += ["", f"{'SQL statement':<56}{'Calls':>8}{'Rows':>9}{'Total ms':>11}"]
+        statements = sorted(self.statements.items(), key=lambda item: -item[1].total)
+        for sql, stats in statements[:limit]:
+            lines.append(
+                f"{_one_line(sql)[:55]:<56}{stats.calls:>8}{stats.rows:>9}"
+                f"{stats.total * 1000:>11.2f}"
+            )
+            lines += [f"    {step}" for step in stats.plan]
+        return "\n".join(lines)
+
+    def trace(self) -> Dict[str, Any]:
+        """Everything recorded, for json.dump."""
+        return {
+            "wall_ms": (time.perf_counter() - self.started) * 1000,
+            "operations": {
+                name: dict(calls=s.calls, total_ms=s.total * 1000, self_ms=s.self_time * 1000)
+                for name, s in self.operations.items()
+            },
+            "statements": [
+                dict(asdict(s), sql=sql, total_ms=s.total * 1000)
+                for sql, s in self.statements.items()
+            ],
+            "events": self.events,
+        }
+
+    def report(self, destination: str = "-", stream: Optional[TextIO] = None) -> None:
+        # "-" prints the summary, anything else is the file for the trace
+        if destination == "-":
+            print(self.summary(), file=stream or sys.stderr)
+            return
+        import json
+
+        with open(destination, "w") as f:
+            json.dump(self.trace(), f, indent=1)
+
+
+def _one_line(sql: str) -> str:
+    return " ".join(sql.split())
+
+
+class ProfiledCursor:
+    """A sqlite3 cursor that records the time and rows of its statements."""
+
+    def __init__(self, cursor: sqlite3.Cursor, profiler: Profiler):
+        self._cursor = cursor
+        self._profiler = profiler
+        self._sql = ""
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cursor, name)
+
+    def __iter__(self) -> "ProfiledCursor":
+        return self
+
+    def _explain(self, sql: str, params: Any) -> Optional[List[str]]:
+        # Once per distinct statement, before it runs
+        if self._profiler._explained(sql) or not sql.lstrip().upper().startswith(_EXPLAINABLE):
+            return None
+        try:
+            with self._profiler.operation(EXPLAIN_OPERATION):
+                rows = self._cursor.connection.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+                plan = rows.fetchall()
+        except (sqlite3.Error, ValueError):
+            return []
+        depth = {0: -1}
+        steps = []
+        for node, parent, _, detail in plan:
+            depth[node] = depth.get(parent, -1) + 1
+            steps.append("  " * depth[node] + detail)
+        return steps
+
+    def _run(self, sql: str, run: Callable[[], Any], params: Any) -> "ProfiledCursor":
+        plan = self._explain(sql, params)
+        self._sql = sql
+        frame = self._profiler._enter(SQL_OPERATION)
+        try:
+            run()
+        finally:
+            elapsed = self._profiler._exit(frame, sql=_one_line(sql)[:200])
+            rows = max(self._cursor.rowcount, 0)
+            self._profiler._record_statement(sql, elapsed, rows, True, plan)
+        return self
+
+    def execute(self, sql: str, params: Any = ()) -> "ProfiledCursor":
+        return self._run(sql, lambda: self._cursor.execute(sql, params), params)
+
+    def executemany(self, sql: str, rows: Any) -> "ProfiledCursor":
+        rows = list(rows)
+        return self._run(
+            sql, lambda: self._cursor.executemany(sql, rows), rows[0] if rows else ()
+        )
+
+    def executescript(self, script: str) -> "ProfiledCursor":
+        return self._run(script, lambda: self._cursor.executescript(script), ())
+
+    def _fetch(self, fetch: Callable[[], Any], count: Callable[[Any], int]) -> Any:
+        frame = self._profiler._enter(SQL_OPERATION)
+        try:
+            result = fetch()
+        finally:
+            elapsed = self._profiler._exit(frame, call=False)
+        self._profiler._record_statement(self._sql, elapsed, count(result), False, None)
+        return result
+
+    def __next__(self) -> Any:
+        return self._fetch(lambda: next(self._cursor), lambda row: 1)
+
+    def fetchone(self) -> Any:
+        return self._fetch(self._cursor.fetchone, lambda row: row is not None)
+
+    def fetchmany(self, size: int = 1) -> List[Any]:
+        return self._fetch(lambda: self._cursor.fetchmany(size), len)
+
+    def fetchall(self) -> List[Any]:
+        return self._fetch(self._cursor.fetchall, len)
+
+
+class ProfiledConnection:
+    """A sqlite3 connection whose cursors are ProfiledCursors."""
+
+    def __init__(self, conn: sqlite3.Connection, profiler: Profiler):
+        self._conn = conn
+        self._profiler = profiler
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._conn, name)
+
+    def __enter__(self) -> "ProfiledConnection":
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> Any:
+        return self._conn.__exit__(*exc_info)
+
+    def cursor(self) -> ProfiledCursor:
+        return ProfiledCursor(self._conn.cursor(), self._profiler)
+
+    def execute(self, sql: str, params: Any = ()) -> ProfiledCursor:
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql: str, rows: Any) -> ProfiledCursor:
+        return self.cursor().executemany(sql, rows)
+
+    def executescript(self, script: str) -> ProfiledCursor:
+        return self.cursor().executescript(script)
+
+
+_active: Optional[Profiler] = None
+_checked_environment = False
+
+
+def enable(destination: str = "-") -> Profiler:
+    """Profile every organiser opened from now on, reporting at exit to
+    destination: "-" for a summary on stderr, else a file for a JSON trace."""
+    global _active
+    if _active is None:
+        _active = Profiler()
+        _active.start_timing_imports()
+        atexit.register(_active.report, destination)
+    return _active
+
+
+def active() -> Optional[Profiler]:
+    """The profiler organisers should use, if profiling is on.
+
+    Turned on by enable() or, the first time this is asked, by RPO_PROFILE.
+    """
+    global _checked_environment
+    if _active is None and not _checked_environment:
+        _checked_environment = True
+        destination = profile_destination()
+        if destination is not None:
+            enable(destination)
+    return _active
+
+
+def operation(name: str) -> ContextManager[None]:
+    # Times a step outside the organiser, such as printing, when profiling
+    profiler = active()
+    return profiler.operation(name) if profiler is not None else contextlib.nullcontext()
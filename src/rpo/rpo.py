@@ -1,14 +1,155 @@
 import sqlite3
+from array import array
+from collections import OrderedDict
 from pathlib import Path
-from typing import List, Tuple, Optional, Dict
-from dataclasses import dataclass
+from typing import (
+    TYPE_CHECKING,
+    Any, Callable, List, Tuple, Optional, Dict, Iterable, Iterator, Sequence, Set, TextIO
+)
+from dataclasses import dataclass, field
 import subprocess
 import platform
+import contextlib
+import itertools
 import os
-import textwrap
-import bibtexparser
+import re
+import sys
+import time
 
-from .config import Config
+from .bibtex import (
+    MONTHS,
+    author_names,
+    entry_identity,
+    entry_key,
+    iter_entries,
+    latex_to_unicode,
+    match_key,
+    may_use_macros,
+    normalise_title,
+    parse_entry,
+    text_hash,
+)
+from .config import Config, profile_destination
+from .database import MAX_SQL_VARIABLES, connect
+from .display import print_papers
+from .fuzzy import index_terms, similar_terms
+from .migrations import AUTHORS_OF_PAPER, AUTHOR_SORT_KEY, FACET_COUNTS, migrate
+from .pdf import Extractor, extract_pdf, file_hash, find_extractor
+
+if TYPE_CHECKING:
+    from .store import PdfStore
+
+# Number of entries written per transaction by import_bibtex_file
+IMPORT_CHUNK_SIZE = 1000
+DUPLICATE_ENTRY = "A paper with this BibTeX entry already exists in the database."
+# Rows fetched from SQLite at a time when streaming papers
+FETCH_SIZE = 500
+# Page size used by --page when no --limit is given
+PAGE_SIZE = 50
+# Paper fields that listings and searches can be sorted by
+SORT_COLUMNS = {
+    "id": "p.id",
+    "authors": "p.author_sort",
+    "year": "p.year",
+    "journal": "p.journal",
+    "title": "p.title",
+}
+# Columns iter_export can produce
+EXPORT_COLUMNS = {
+    "id": "p.id",
+    "title": "p.title",
+    # Separated by " and ", as in BibTeX
+    "authors": "p.authors",
+    "year": "p.year",
+    "journal": "p.journal",
+    # Separated by "; "
+    "keywords": """(
+        SELECT GROUP_CONCAT(k.keyword, '; ')
+        FROM paper_keywords pk JOIN keywords k ON k.id = pk.keyword_id
+        WHERE pk.paper_id = p.id
+    )""",
+    "doi": "b.doi",
+    "citation_key": "b.citation_key",
+    "file_path": "p.file_path",
+    "bibtex": "b.bibtex",
+}
+# Characters stripped from BibTeX text before duplicate comparison
+WHITESPACE = " \t\r\n"
+
+# Search prefixes accepted in queries (e.g. "author:smith") and the
+# full-text index column each one maps to
+SEARCH_FIELDS = {
+    "title": "title",
+    "author": "author",
+    "authors": "author",
+    "keyword": "keyword",
+    "keywords": "keyword",
+    "journal": "journal",
+    "year": "year",
+    "bibtex": "bibtex",
+    # Searched in the text of the PDFs rather than in papers_fts
+    "text": "text",
+    "pdf": "text",
+}
+# For each full-text index: the tables to query and the expression giving
+# the id of the paper a matching row belongs to
+SEARCH_INDEXES = {
+    "papers_fts": ("papers_fts", "papers_fts.rowid"),
+    "pdf_fts": ("pdf_fts JOIN pdf_files f ON f.id = pdf_fts.rowid", "f.paper_id"),
+}
+# PDFs whose text is written per transaction by index_pdfs
+PDF_INDEX_BATCH = 50
+# bm25 weights for the papers_fts columns, in declaration order, used as
+# the index's default rank function
+SEARCH_WEIGHTS = (10.0, 5.0, 5.0, 2.0, 1.0, 0.5)
+# Searches matching more papers than this are shown in list order instead
+# of by relevance: ranking costs time for every match and says little about
+# a large share of the library
+RANK_LIMIT = 2000
+# Files `rpo watch` picks up, by extension
+WATCHED_EXTENSIONS = (".bib", ".pdf")
+# Rows check_library looks for that belong to nothing, as (table, rows):
+# the rows that point at a missing parent, or that nothing points at
+ORPHANS = {
+    "paper_authors without a paper": ("paper_authors", "paper_id NOT IN (SELECT id FROM papers)"),
+    "paper_authors without an author": (
+        "paper_authors", "author_id NOT IN (SELECT id FROM authors)"
+    ),
+    "paper_keywords without a paper": (
+        "paper_keywords", "paper_id NOT IN (SELECT id FROM papers)"
+    ),
+    "paper_keywords without a keyword": (
+        "paper_keywords", "keyword_id NOT IN (SELECT id FROM keywords)"
+    ),
+    "bibtex_entries without a paper": (
+        "bibtex_entries", "paper_id NOT IN (SELECT id FROM papers)"
+    ),
+    "pdf_files without a paper": ("pdf_files", "paper_id NOT IN (SELECT id FROM papers)"),
+    "authors without papers": ("authors", "id NOT IN (SELECT author_id FROM paper_authors)"),
+    "keywords without papers": ("keywords", "id NOT IN (SELECT keyword_id FROM paper_keywords)"),
+    "search index rows without a paper": ("papers_fts", "rowid NOT IN (SELECT id FROM papers)"),
+    "PDF text without a PDF": ("pdf_fts", "rowid NOT IN (SELECT id FROM pdf_files)"),
+}
+# Threads stat-ing PDFs at once; on a network file system most of the time
+# goes to waiting for the server. Each is handed CHECK_CHUNK files at a
+# time, as handing them over one by one costs more than a local stat
+CHECK_THREADS = 16
+CHECK_CHUNK = 100
+# Distinct PDFs moved into the store per transaction by move_to_store
+STORE_BATCH = 200
+# Number of recent search results kept by each organiser
+SEARCH_CACHE_SIZE = 32
+# Fields whose words fuzzy terms ("armstong~") are matched against, how
+# many of the most similar words each one stands for, and how much less
+# similar than the closest one those may be
+FUZZY_FIELDS = ("title", "author")
+FUZZY_EXPANSIONS = 5
+FUZZY_MARGIN = 0.8
+# Facets counted by facets(), and how many values of each but the year it
+# returns by default
+FACETS = ("year", "journal", "author", "keyword")
+FACET_LIMIT = 10
+_SEARCH_TOKEN = re.compile(r'(?:(\w+):)?("[^"]*"?|\S+)')
 
 
 @dataclass
@@ -21,97 +162,355 @@ class Paper:
     file_path: str
 
 
+@dataclass
+class PaperDetails:
+    id: int
+    title: str
+    year: int
+    journal: str
+    file_path: str
+    # In BibTeX order
+    authors: List[str]
+    keywords: List[str]
+    bibtex: Optional[str]
+
+
+@dataclass(frozen=True)
+class SearchFilters:
+    """Conditions on paper fields that narrow a listing or search.
+
+    They are checked on the papers table through its year and journal
+    indexes, so a search only matches text within the papers they keep.
+    Journals are compared ignoring case.
+    """
+
+    year_from: Optional[int] = None
+    year_to: Optional[int] = None
+    journal: Optional[str] = None
+
+    def sql(self) -> Tuple[str, Tuple]:
+        # Conditions on papers p, "" if there are none
+        conditions: List[str] = []
+        params: Tuple = ()
+        if self.year_from is not None:
+            conditions.append("p.year >= ?")
+            params += (self.year_from,)
+        if self.year_to is not None:
+            conditions.append("p.year <= ?")
+            params += (self.year_to,)
+        if self.journal is not None:
+            conditions.append("p.journal = ? COLLATE NOCASE")
+            params += (self.journal,)
+        return " AND ".join(conditions), params
+
+
+NO_FILTERS = SearchFilters()
+
+
+@dataclass
+class ImportReport:
+    added: int = 0
+    # (entry number, citation key, error message) for every rejected entry
+    errors: List[Tuple[int, str, str]] = field(default_factory=list)
+    # The same for entries added whose PDF could not be put in the store;
+    # they point at the PDF as it was given
+    unstored: List[Tuple[int, str, str]] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def entries_per_second(self) -> float:
+        total = self.added + len(self.errors)
+        return total / self.elapsed if self.elapsed > 0 else 0.0
+
+
+@dataclass
+class PdfIndexReport:
+    indexed: int = 0
+    unchanged: int = 0
+    # (paper id, file path) of PDFs that could not be found
+    missing: List[Tuple[int, str]] = field(default_factory=list)
+    # (paper id, file path, error message) of PDFs that could not be read
+    errors: List[Tuple[int, str, str]] = field(default_factory=list)
+    elapsed: float = 0.0
+
+
+@dataclass
+class WatchReport:
+    added: int = 0
+    # PDFs given to papers already in the library
+    linked: int = 0
+    # Entries of new or changed .bib files already in the library
+    known: int = 0
+    # Files unchanged since the last scan, and not read
+    unchanged: int = 0
+    # PDFs found under the folder that no entry has been matched to yet
+    unmatched: int = 0
+    # (file path, citation key, error message) for every rejected entry or
+    # unreadable .bib file
+    errors: List[Tuple[str, str, str]] = field(default_factory=list)
+    elapsed: float = 0.0
+
+
+@dataclass
+class LibraryCheck:
+    # Problems PRAGMA quick_check found in the database file itself
+    database: List[str] = field(default_factory=list)
+    files: int = 0
+    # (paper id, file path, error message) of PDFs that cannot be found or read
+    missing: List[Tuple[int, str, str]] = field(default_factory=list)
+    # (paper id, file path) of PDFs whose content changed since index_pdfs
+    # read them, found only when hashing
+    changed: List[Tuple[int, str]] = field(default_factory=list)
+    # Number of rows of each kind in ORPHANS that were found
+    orphans: Dict[str, int] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not (self.database or self.missing or self.changed or any(self.orphans.values()))
+
+
+@dataclass
+class StoreReport:
+    # Distinct PDFs moved into the store, and how many of them had content
+    # already there
+    files: int = 0
+    duplicates: int = 0
+    # Size of those PDFs, of their distinct content, and how much the store
+    # grew by (nothing for hard links)
+    bytes_total: int = 0
+    bytes_unique: int = 0
+    bytes_stored: int = 0
+    # (file path, error message) of PDFs that could not be read
+    errors: List[Tuple[str, str]] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def bytes_saved(self) -> int:
+        # Space the copies of identical PDFs took, now stored once
+        return self.bytes_total - self.bytes_unique
+
+
+@dataclass
+class DuplicateGroup:
+    paper_ids: List[int]
+    # Why the papers were grouped, e.g. "same DOI 10.1000/xyz"
+    reasons: List[str]
+
+
 class ResearchPaperOrganiser:
     def __init__(self, config: Config):
-        self.conn: sqlite3.Connection = sqlite3.connect(config.db_path)
+        self.config = config
+        self.conn: sqlite3.Connection = connect(config.db_path)
         self.cursor: sqlite3.Cursor = self.conn.cursor()
-        # self.pdf_dir: Path = Path(pdf_dir)
+        # The profiler is only imported once profiling is asked for
+        if profile_destination() is not None or f"{__package__}.profiling" in sys.modules:
+            from . import profiling
+
+            profiler = profiling.active()
+            if profiler is not None:
+                profiler.instrument(self)
+        # Recent ranked_search results by search plan, valid while
+        # _data_token() is unchanged
+        self._search_cache: "OrderedDict[Tuple, Optional[Sequence[int]]]" = OrderedDict()
+        self._cache_token: Optional[Tuple[int, int]] = None
+        # Where PDFs are kept by content, if the configuration names a store
+        self.store: "Optional[PdfStore]" = None
+        if config.pdf_store:
+            from .store import PdfStore
+
+            self.store = PdfStore(config.pdf_store, config.store_mode)
         self.setup_database()
-        self.update_database_schema()
+        self.setup_search_index()
+        self.setup_text_index()
 
     def setup_database(self) -> None:
-        self.cursor.execute(
+        migrate(self.conn)
+
+    def setup_search_index(self) -> None:
+        self.cursor.execute("SELECT sql FROM sqlite_master WHERE name = 'papers_fts'")
+        row = self.cursor.fetchone()
+        if row is not None:
+            if "prefix" in row[0]:
+                self.has_search_index = True
+                return
+            # Indexes from before prefix indexes were added are rebuilt once
+            self.cursor.execute("DROP TABLE papers_fts")
+
+        try:
+            # The prefix indexes make one- to three-letter prefixes, as typed
+            # in the first keystrokes of a search, a single lookup instead of
+            # a merge of every matching term
+            self.cursor.execute(
+                """
+                CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5 (
+                    title, author, keyword, journal, year, bibtex,
+                    tokenize = 'unicode61 remove_diacritics 2',
+                    prefix = '1 2 3'
+                )
             """
-            CREATE TABLE IF NOT EXISTS papers (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT,
-                year INTEGER,
-                file_path TEXT,
-                journal TEXT
             )
-        """
-        )
+        except sqlite3.OperationalError as e:
+            if "fts5" not in str(e):
+                raise
+            # Everything but search still works; search_papers reports it
+            self.has_search_index = False
+            return
+        self.has_search_index = True
+
+        # Rows are written by the add paths, deletions and renumbering are
+        # mirrored from the papers table
         self.cursor.execute(
             """
-            CREATE TABLE IF NOT EXISTS authors (
-                id INTEGER PRIMARY KEY,
-                name TEXT
-            )
+            CREATE TRIGGER IF NOT EXISTS papers_fts_delete AFTER DELETE ON papers
+            BEGIN
+                DELETE FROM papers_fts WHERE rowid = old.id;
+            END
         """
         )
         self.cursor.execute(
             """
-            CREATE TABLE IF NOT EXISTS paper_authors (
-                paper_id INTEGER,
-                author_id INTEGER,
-                FOREIGN KEY (paper_id) REFERENCES papers (id),
-                FOREIGN KEY (author_id) REFERENCES authors (id)
-            )
+            CREATE TRIGGER IF NOT EXISTS papers_fts_renumber AFTER UPDATE OF id ON papers
+            BEGIN
+                UPDATE papers_fts SET rowid = new.id WHERE rowid = old.id;
+            END
         """
         )
+
+        self.cursor.execute(
+            "INSERT INTO papers_fts (papers_fts, rank) VALUES ('rank', ?)",
+            (f"bm25({', '.join(map(str, SEARCH_WEIGHTS))})",),
+        )
+        # Backfill papers added before the index existed
         self.cursor.execute(
             """
-            CREATE TABLE IF NOT EXISTS keywords (
-                id INTEGER PRIMARY KEY,
-                keyword TEXT
-            )
+            INSERT INTO papers_fts (rowid, title, author, keyword, journal, year, bibtex)
+            SELECT p.id, p.title, a.names, k.keywords, p.journal, p.year, b.bibtex
+            FROM papers p
+            LEFT JOIN (
+                SELECT pa.paper_id, GROUP_CONCAT(a.name, ' ') AS names
+                FROM paper_authors pa JOIN authors a ON pa.author_id = a.id
+                GROUP BY pa.paper_id
+            ) a ON p.id = a.paper_id
+            LEFT JOIN (
+                SELECT pk.paper_id, GROUP_CONCAT(k.keyword, ' ') AS keywords
+                FROM paper_keywords pk JOIN keywords k ON pk.keyword_id = k.id
+                GROUP BY pk.paper_id
+            ) k ON p.id = k.paper_id
+            LEFT JOIN (
+                SELECT paper_id, GROUP_CONCAT(bibtex, ' ') AS bibtex
+                FROM bibtex_entries GROUP BY paper_id
+            ) b ON p.id = b.paper_id
         """
         )
+        self.conn.commit()
+
+    def setup_text_index(self) -> None:
+        # Text of the PDFs, written by index_pdfs. Rows are keyed by
+        # pdf_files.id rather than paper id so renumbering papers never
+        # rewrites this, by far the largest, index
+        if not self.has_search_index:
+            return
+        self.cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'pdf_fts'")
+        if self.cursor.fetchone()[0] > 0:
+            return
         self.cursor.execute(
             """
-            CREATE TABLE IF NOT EXISTS paper_keywords (
-                paper_id INTEGER,
-                keyword_id INTEGER,
-                FOREIGN KEY (paper_id) REFERENCES papers (id),
-                FOREIGN KEY (keyword_id) REFERENCES keywords (id)
+            CREATE VIRTUAL TABLE pdf_fts USING fts5 (
+                text, tokenize = 'unicode61 remove_diacritics 2'
             )
         """
         )
+        # pdf_files rows go with their paper through the foreign key cascade
         self.cursor.execute(
             """
-            CREATE TABLE IF NOT EXISTS bibtex_entries (
-                paper_id INTEGER,
-                bibtex TEXT,
-                FOREIGN KEY (paper_id) REFERENCES papers (id)
-            )
+            CREATE TRIGGER IF NOT EXISTS pdf_fts_delete AFTER DELETE ON pdf_files
+            BEGIN
+                DELETE FROM pdf_fts WHERE rowid = old.id;
+            END
         """
         )
         self.conn.commit()
 
+    def _index_papers(
+        self, rows: List[Tuple[int, str, int, str, List[str], List[str], str]]
+    ) -> None:
+        index_terms(
+            self.cursor, [text for row in rows for text in itertools.chain([row[1]], row[4])]
+        )
+        if not self.has_search_index:
+            return
+        self.cursor.executemany(
+            """
+            INSERT INTO papers_fts (rowid, title, author, keyword, journal, year, bibtex)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (
+                    paper_id,
+                    title,
+                    " ".join(authors),
+                    " ".join(keywords),
+                    journal,
+                    year,
+                    bibtex,
+                )
+                for paper_id, title, year, journal, authors, keywords, bibtex in rows
+            ],
+        )
+
     def parse_bibtex(self, bibtex: str) -> Dict[str, str]:
+        bib_data = parse_entry(bibtex)
+        if bib_data is not None:
+            return bib_data
+
+        # Only what parse_entry leaves alone needs bibtexparser, imported
+        # here so commands that never parse BibTeX start faster
+        import bibtexparser
+
         bib_database = bibtexparser.loads(bibtex)
         if not bib_database.entries:
             raise ValueError("Invalid BibTeX entry")
         return bib_database.entries[0]
 
-    def add_paper(self, bibtex: str, file_path: str, keywords: List[str]) -> None:
-        # Check for duplicate BibTeX entry
+    def paper_fields(self, bib_data: Dict[str, str]) -> Tuple[str, int, List[str], str]:
+        # As shown in listings: LaTeX accents decoded and braces dropped
+        title = latex_to_unicode(bib_data.get("title", ""))
+        year = int(bib_data.get("year", 0))
+        authors = author_names(bib_data.get("author", ""))
+        journal = latex_to_unicode(bib_data.get("journal", ""))
+        return title, year, authors, journal
+
+    def is_duplicate(self, content_hash: str) -> bool:
         self.cursor.execute(
-            "SELECT COUNT(*) FROM bibtex_entries WHERE bibtex = ?", (bibtex,)
+            "SELECT 1 FROM bibtex_entries WHERE content_hash = ?", (content_hash,)
         )
-        if self.cursor.fetchone()[0] > 0:
-            raise ValueError(
-                "A paper with this BibTeX entry already exists in the database."
-            )
+        return self.cursor.fetchone() is not None
+
+    def _known_entries(self) -> Tuple[Set[str], Set[str]]:
+        # Content hashes and text hashes of the entries already stored
+        self.cursor.execute("SELECT content_hash, text_hash FROM bibtex_entries")
+        rows = self.cursor.fetchall()
+        return {row[0] for row in rows if row[0]}, {row[1] for row in rows if row[1]}
 
+    def add_paper(self, bibtex: str, file_path: str, keywords: List[str]) -> None:
+        bibtex = bibtex.strip(WHITESPACE)
+        # An entry stored before as written is a duplicate without parsing it
+        written = text_hash(bibtex)
+        self.cursor.execute("SELECT 1 FROM bibtex_entries WHERE text_hash = ?", (written,))
+        if self.cursor.fetchone() is not None:
+            raise ValueError(DUPLICATE_ENTRY)
         bib_data = self.parse_bibtex(bibtex)
 
-        title = bib_data.get("title", "")
-        year = int(bib_data.get("year", 0))
-        authors = [
-            author.strip() for author in bib_data.get("author", "").split(" and ")
-        ]
-        journal = bib_data.get("journal", "")
+        # Check for duplicate BibTeX entry
+        content_hash, doi, citation_key = entry_identity(bib_data)
+        if self.is_duplicate(content_hash):
+            raise ValueError(DUPLICATE_ENTRY)
+
+        title, year, authors, journal = self.paper_fields(bib_data)
+        (file_path,), errors = self._keep_in_store([str(file_path)])
+        if errors:
+            raise OSError(f"Could not store the PDF {errors[0][1]}")
 
         # Add paper
         self.cursor.execute(
@@ -121,16 +520,14 @@ class ResearchPaperOrganiser:
         paper_id = self.cursor.lastrowid
 
         # Add authors
-        for author in authors:
+        links = []
+        for position, author in enumerate(authors):
             self.cursor.execute(
                 "INSERT OR IGNORE INTO authors (name) VALUES (?)", (author,)
             )
             self.cursor.execute("SELECT id FROM authors WHERE name = ?", (author,))
-            author_id = self.cursor.fetchone()[0]
-            self.cursor.execute(
-                "INSERT INTO paper_authors (paper_id, author_id) VALUES (?, ?)",
-                (paper_id, author_id),
-            )
+            links.append((paper_id, self.cursor.fetchone()[0], position))
+        self._insert_author_links(links, [paper_id])
 
         # Add keywords
         for keyword in keywords:
@@ -140,115 +537,1047 @@ class ResearchPaperOrganiser:
             self.cursor.execute("SELECT id FROM keywords WHERE keyword = ?", (keyword,))
             keyword_id = self.cursor.fetchone()[0]
             self.cursor.execute(
-                "INSERT INTO paper_keywords (paper_id, keyword_id) VALUES (?, ?)",
+                "INSERT OR IGNORE INTO paper_keywords (paper_id, keyword_id) VALUES (?, ?)",
                 (paper_id, keyword_id),
             )
 
         # Add bibtex
         self.cursor.execute(
-            "INSERT INTO bibtex_entries (paper_id, bibtex) VALUES (?, ?)",
-            (paper_id, bibtex),
+            """
+            INSERT INTO bibtex_entries
+                (paper_id, bibtex, content_hash, doi, citation_key, text_hash)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (paper_id, bibtex, content_hash, doi or None, citation_key or None, written),
         )
 
+        self._index_papers([(paper_id, title, year, journal, authors, keywords, bibtex)])
+
         self.conn.commit()
 
-    def remove_paper(self, paper_id: int) -> None:
-        # Start a transaction
-        self.conn.execute("BEGIN TRANSACTION")
-        try:
-            # Check if paper exists
-            self.cursor.execute("SELECT COUNT(*) FROM papers WHERE id = ?", (paper_id,))
-            if self.cursor.fetchone()[0] == 0:
-                raise ValueError(f"No paper found with ID {paper_id}")
+    def _load_ids(self, table: str, column: str) -> Dict[str, int]:
+        self.cursor.execute(f"SELECT {column}, MIN(id) FROM {table} GROUP BY {column}")
+        return dict(self.cursor.fetchall())
+
+    def _reload_ids(self, author_ids: Dict[str, int], keyword_ids: Dict[str, int]) -> None:
+        # Ids created by a rolled back transaction are gone again
+        author_ids.clear()
+        author_ids.update(self._load_ids("authors", "name"))
+        keyword_ids.clear()
+        keyword_ids.update(self._load_ids("keywords", "keyword"))
 
-            # Remove paper and related entries
-            self.cursor.execute("DELETE FROM papers WHERE id = ?", (paper_id,))
+    def _resolve_ids(
+        self, table: str, column: str, names: Iterable[str], ids: Dict[str, int]
+    ) -> None:
+        # Insert every name not yet in the lookup map and record the new ids
+        missing = list({name for name in names if name not in ids})
+        if not missing:
+            return
+        self.cursor.executemany(
+            f"INSERT OR IGNORE INTO {table} ({column}) VALUES (?)", [(name,) for name in missing]
+        )
+        for start in range(0, len(missing), MAX_SQL_VARIABLES):
+            batch = missing[start : start + MAX_SQL_VARIABLES]
+            placeholders = ", ".join("?" * len(batch))
             self.cursor.execute(
-                "DELETE FROM paper_authors WHERE paper_id = ?", (paper_id,)
+                f"SELECT {column}, MIN(id) FROM {table} "
+                f"WHERE {column} IN ({placeholders}) GROUP BY {column}",
+                batch,
             )
-            self.cursor.execute(
-                "DELETE FROM paper_keywords WHERE paper_id = ?", (paper_id,)
+            ids.update(self.cursor.fetchall())
+
+    def _insert_author_links(
+        self, links: List[Tuple[int, int, int]], paper_ids: List[int]
+    ) -> None:
+        # Insert (paper id, author id, position) links of the papers with
+        # the triggers that refresh their author strings paused, then build
+        # each paper's string once: refreshing it per link is quadratic in
+        # the number of authors
+        self.cursor.execute("INSERT OR IGNORE INTO bulk_author_links (id) VALUES (1)")
+        try:
+            self.cursor.executemany(
+                """
+                INSERT OR IGNORE INTO paper_authors (paper_id, author_id, position)
+                VALUES (?, ?, ?)
+                """,
+                links,
             )
+        finally:
+            self.cursor.execute("DELETE FROM bulk_author_links")
+        self.cursor.executemany(
+            f"UPDATE papers SET authors = {AUTHORS_OF_PAPER.format(paper='papers.id')} "
+            "WHERE id = ?",
+            [(paper_id,) for paper_id in paper_ids],
+        )
+
+    def _insert_papers(
+        self,
+        rows: List[
+            Tuple[str, int, str, str, List[str], List[str], str, Tuple[str, str, str, str]]
+        ],
+        author_ids: Dict[str, int],
+        keyword_ids: Dict[str, int],
+    ) -> None:
+        # Write a batch of parsed entries; the caller owns the transaction
+        self._resolve_ids("authors", "name", (a for r in rows for a in r[4]), author_ids)
+        self._resolve_ids(
+            "keywords", "keyword", (k for r in rows for k in r[5]), keyword_ids
+        )
+
+        paper_authors = []
+        paper_keywords = []
+        bibtex_entries = []
+        search_rows = []
+        for title, year, journal, file_path, authors, keywords, bibtex, identity in rows:
             self.cursor.execute(
-                "DELETE FROM bibtex_entries WHERE paper_id = ?", (paper_id,)
+                "INSERT INTO papers (title, year, file_path, journal) VALUES (?, ?, ?, ?)",
+                (title, year, file_path, journal),
+            )
+            paper_id = self.cursor.lastrowid
+            paper_authors.extend(
+                (paper_id, author_ids[a], position) for position, a in enumerate(authors)
             )
+            paper_keywords.extend((paper_id, keyword_ids[k]) for k in keywords)
+            content_hash, doi, citation_key, written = identity
+            bibtex_entries.append(
+                (paper_id, bibtex, content_hash, doi or None, citation_key or None, written)
+            )
+            search_rows.append((paper_id, title, year, journal, authors, keywords, bibtex))
 
-            # Get all papers with id greater than the removed paper
-            self.cursor.execute(
-                "SELECT id FROM papers WHERE id > ? ORDER BY id", (paper_id,)
+        self._insert_author_links(paper_authors, [row[0] for row in search_rows])
+        self.cursor.executemany(
+            "INSERT OR IGNORE INTO paper_keywords (paper_id, keyword_id) VALUES (?, ?)",
+            paper_keywords,
+        )
+        self.cursor.executemany(
+            """
+            INSERT INTO bibtex_entries
+                (paper_id, bibtex, content_hash, doi, citation_key, text_hash)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            bibtex_entries,
+        )
+        self._index_papers(search_rows)
+
+    def _flush_import(self, pending, author_ids, keyword_ids, report) -> None:
+        if self.store is not None:
+            stored, errors = self._keep_in_store([row[3] for _, _, row in pending])
+            for i, message in errors:
+                report.unstored.append(pending[i][:2] + (message,))
+            pending = [
+                (index, key, row[:3] + (path,) + row[4:])
+                for (index, key, row), path in zip(pending, stored)
+            ]
+        try:
+            self._insert_papers([row for _, _, row in pending], author_ids, keyword_ids)
+            self.conn.commit()
+            report.added += len(pending)
+            return
+        except sqlite3.Error:
+            self.conn.rollback()
+            self._reload_ids(author_ids, keyword_ids)
+
+        # Retry entry by entry so one bad row doesn't reject the whole chunk
+        for index, key, row in pending:
+            try:
+                self._insert_papers([row], author_ids, keyword_ids)
+                self.conn.commit()
+                report.added += 1
+            except sqlite3.Error as e:
+                self.conn.rollback()
+                self._reload_ids(author_ids, keyword_ids)
+                report.errors.append((index, key, str(e)))
+
+    def _parse_entries(
+        self, f: TextIO, keywords: List[str], known: Set[str]
+    ) -> Iterator[Tuple[int, str, Optional[Tuple], Optional[str]]]:
+        # (entry number, citation key, row for _insert_papers, error) for
+        # every entry of a BibTeX stream; the row is None if it is invalid,
+        # or if known holds the entry's text hash, which needs no parsing
+
+        # Only entries parse_entry cannot handle go to bibtexparser, with a
+        # single parser for the whole file: building one is far more
+        # expensive than parsing an entry, and it remembers @string macros
+        parser = None
+        strings: Dict[str, str] = MONTHS
+
+        index = 0
+        for entry_type, text in iter_entries(f):
+            if entry_type in ("comment", "preamble"):
+                continue
+            if entry_type == "string":
+                parser = parser or self._bibtex_parser()
+                try:
+                    parser.parse(text)
+                except Exception:
+                    pass
+                # The macros defined so far, months included, expanded
+                strings = dict(parser.bib_database.strings)
+                continue
+
+            index += 1
+            text = text.strip(WHITESPACE)
+            written = text_hash(text)
+            if written in known and (strings is MONTHS or not may_use_macros(text)):
+                yield index, entry_key(text), None, DUPLICATE_ENTRY
+                continue
+            key = ""
+            try:
+                bib_data = parse_entry(text, strings)
+                if bib_data is None:
+                    parser = parser or self._bibtex_parser()
+                    entries = parser.parse(text).entries
+                    if not entries:
+                        raise ValueError("Invalid BibTeX entry")
+                    bib_data = entries.pop()
+                    entries.clear()
+                key = bib_data.get("ID", "")
+                identity = entry_identity(bib_data) + (written,)
+                title, year, authors, journal = self.paper_fields(bib_data)
+            except Exception as e:
+                yield index, key, None, str(e)
+                continue
+            entry_keywords = [
+                k.strip() for k in re.split(r"[,;]", bib_data.get("keywords", "")) if k.strip()
+            ]
+            row = (
+                title,
+                year,
+                journal,
+                self.entry_file_path(bib_data),
+                authors,
+                list(dict.fromkeys(keywords + entry_keywords)),
+                text,
+                identity,
             )
-            papers_to_update = self.cursor.fetchall()
+            yield index, key, row, None
 
-            # Update paper ids and related entries
-            for (old_id,) in papers_to_update:
-                new_id = old_id - 1
+    @staticmethod
+    def _bibtex_parser() -> Any:
+        # Imported here so that files parse_entry handles never load it
+        from bibtexparser.bparser import BibTexParser
 
-                # Update papers table
-                self.cursor.execute(
-                    "UPDATE papers SET id = ? WHERE id = ?", (new_id, old_id)
-                )
+        parser = BibTexParser(common_strings=True)
+        parser.expect_multiple_parse = True
+        return parser
 
-                # Update paper_authors table
-                self.cursor.execute(
-                    "UPDATE paper_authors SET paper_id = ? WHERE paper_id = ?",
-                    (new_id, old_id),
-                )
+    def import_bibtex_file(
+        self,
+        path: str,
+        keywords: Optional[List[str]] = None,
+        chunk_size: int = IMPORT_CHUNK_SIZE,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> ImportReport:
+        # progress, if given, is called with (bytes read, file size) after
+        # every chunk is committed
+        start = time.perf_counter()
+        report = ImportReport()
+        keywords = keywords or []
 
-                # Update paper_keywords table
-                self.cursor.execute(
-                    "UPDATE paper_keywords SET paper_id = ? WHERE paper_id = ?",
-                    (new_id, old_id),
-                )
+        author_ids = self._load_ids("authors", "name")
+        keyword_ids = self._load_ids("keywords", "keyword")
+        seen, known = self._known_entries()
 
-                # Update bibtex_entries table
-                self.cursor.execute(
-                    "UPDATE bibtex_entries SET paper_id = ? WHERE paper_id = ?",
-                    (new_id, old_id),
+        pending = []
+        with open(path, "r", encoding="utf-8") as f:
+            size = os.fstat(f.fileno()).st_size
+            for index, key, row, error in self._parse_entries(f, keywords, known):
+                if error is None and row[7][0] in seen:
+                    error = DUPLICATE_ENTRY
+                if error is not None:
+                    report.errors.append((index, key, error))
+                    continue
+                seen.add(row[7][0])
+                known.add(row[7][3])
+                pending.append((index, key, row))
+                if len(pending) >= chunk_size:
+                    self._flush_import(pending, author_ids, keyword_ids, report)
+                    pending = []
+                    if progress:
+                        progress(min(f.buffer.tell(), size), size)
+
+        if pending:
+            self._flush_import(pending, author_ids, keyword_ids, report)
+        if progress:
+            progress(size, size)
+
+        report.elapsed = time.perf_counter() - start
+        return report
+
+    def entry_file_path(self, bib_data: Dict[str, str]) -> str:
+        # JabRef and Zotero store attachments as "description:path:type"
+        file_field = bib_data.get("file", "")
+        parts = file_field.split(":")
+        if len(parts) >= 3:
+            return ":".join(parts[1:-1])
+        return file_field
+
+    def index_pdfs(
+        self,
+        jobs: Optional[int] = None,
+        force: bool = False,
+        extract: Optional[Extractor] = None,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> PdfIndexReport:
+        """Extract the text of every paper's PDF into the pdf_fts index.
+
+        Files whose path, size and modification time are unchanged since
+        the last run are skipped, as are files that were touched or moved
+        without their content changing. Extraction runs in a pool of jobs
+        processes, one per core by default. progress, if given, is called
+        with (PDFs done, PDFs to do) after every batch is committed.
+        """
+        start = time.perf_counter()
+        report = PdfIndexReport()
+        self._require_search_index()
+        if extract is None:
+            extract = find_extractor()
+        if extract is None:
+            raise RuntimeError(
+                "Extracting text from PDFs needs pypdf (pip install pypdf) "
+                "or poppler's pdftotext."
+            )
+
+        # Papers whose file was unset since the last run lose their text
+        self.cursor.execute(
+            """
+            DELETE FROM pdf_files WHERE paper_id IN (
+                SELECT id FROM papers WHERE COALESCE(file_path, '') = ''
+            )
+            """
+        )
+        self.conn.commit()
+
+        self.cursor.execute(
+            """
+            SELECT p.id, p.file_path, f.file_path, f.mtime_ns, f.size, f.content_hash, f.error
+            FROM papers p LEFT JOIN pdf_files f ON f.paper_id = p.id
+            WHERE COALESCE(p.file_path, '') != ''
+            ORDER BY p.id
+            """
+        )
+        todo = []
+        for paper_id, path, known_path, mtime_ns, size, content_hash, error in (
+            self.cursor.fetchall()
+        ):
+            try:
+                stat = os.stat(os.path.expanduser(path))
+            except OSError:
+                # Kept in the index: the file may be on a drive that is not
+                # mounted right now
+                report.missing.append((paper_id, path))
+                continue
+            unchanged = (known_path, mtime_ns, size) == (path, stat.st_mtime_ns, stat.st_size)
+            if unchanged and error is None and not force:
+                report.unchanged += 1
+                continue
+            # Failed files are extracted again whatever their hash
+            known_hash = None if force or error is not None else content_hash
+            todo.append((paper_id, path, stat.st_mtime_ns, stat.st_size, known_hash))
+
+        paths = [os.path.expanduser(path) for _, path, _, _, _ in todo]
+        hashes = [known_hash for _, _, _, _, known_hash in todo]
+        jobs = min(jobs or os.cpu_count() or 1, len(todo))
+        executor = None
+        if jobs > 1:
+            # Imported here: it is slow to import and few commands need it
+            from concurrent.futures import ProcessPoolExecutor
+
+            executor = ProcessPoolExecutor(jobs)
+        try:
+            if executor is None:
+                results = map(extract_pdf, paths, hashes, itertools.repeat(extract))
+            else:
+                results = executor.map(
+                    extract_pdf, paths, hashes, itertools.repeat(extract), chunksize=4
                 )
+            done = 0
+            for batch in iter(lambda: list(itertools.islice(results, PDF_INDEX_BATCH)), []):
+                for (paper_id, path, mtime_ns, size, _), result in zip(
+                    todo[done : done + len(batch)], batch
+                ):
+                    self._store_pdf(paper_id, path, mtime_ns, size, result, report)
+                self.conn.commit()
+                done += len(batch)
+                if progress:
+                    progress(done, len(todo))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        if progress:
+            progress(len(todo), len(todo))
+
+        report.elapsed = time.perf_counter() - start
+        return report
+
+    def _store_pdf(
+        self,
+        paper_id: int,
+        path: str,
+        mtime_ns: int,
+        size: int,
+        result: Tuple[Optional[str], Optional[str], Optional[str]],
+        report: PdfIndexReport,
+    ) -> None:
+        content_hash, text, error = result
+        self.cursor.execute(
+            """
+            INSERT INTO pdf_files (paper_id, file_path, mtime_ns, size, content_hash, error)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (paper_id) DO UPDATE SET
+                file_path = excluded.file_path,
+                mtime_ns = excluded.mtime_ns,
+                size = excluded.size,
+                content_hash = excluded.content_hash,
+                error = excluded.error
+            """,
+            (paper_id, path, mtime_ns, size, content_hash, error),
+        )
+        if text is None and error is None:
+            report.unchanged += 1
+            return
+        self.cursor.execute("SELECT id FROM pdf_files WHERE paper_id = ?", (paper_id,))
+        (file_id,) = self.cursor.fetchone()
+        # Text of a file that can no longer be read is out of date
+        self.cursor.execute("DELETE FROM pdf_fts WHERE rowid = ?", (file_id,))
+        if error is not None:
+            report.errors.append((paper_id, path, error))
+            return
+        self.cursor.execute("INSERT INTO pdf_fts (rowid, text) VALUES (?, ?)", (file_id, text))
+        report.indexed += 1
+
+    @staticmethod
+    def _walk_folder(root: str) -> Iterator[Tuple[str, os.stat_result]]:
+        # (path, stat) of every watched file under root, skipping hidden
+        # files and folders; os.scandir saves a stat call per folder entry
+        folders = [root]
+        while folders:
+            try:
+                entries = list(os.scandir(folders.pop()))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        folders.append(entry.path)
+                    elif entry.name.lower().endswith(WATCHED_EXTENSIONS):
+                        yield entry.path, entry.stat()
+                except OSError:
+                    continue
+
+    def scan_folder(
+        self,
+        root: str,
+        keywords: Optional[List[str]] = None,
+        chunk_size: int = IMPORT_CHUNK_SIZE,
+    ) -> WatchReport:
+        """Add the papers of the .bib files and PDFs under root.
+
+        Files whose size and modification time are the same as at the last
+        scan are not read again. Entries of new and changed .bib files not
+        in the library yet are added chunk_size at a time, each with the PDF
+        its file field names or, failing that, the PDF under root named
+        after its citation key or DOI. New PDFs no entry claims are given to
+        papers without a file that have that citation key or DOI, or kept
+        for the entries of later scans.
+        """
+        start = time.perf_counter()
+        report = WatchReport()
+        keywords = keywords or []
+        root = os.path.abspath(os.path.expanduser(root))
+        if not os.path.isdir(root):
+            raise NotADirectoryError(f"No such folder: {root}")
+
+        self.cursor.execute("SELECT path, mtime_ns, size FROM watched_files")
+        known = {path: (mtime_ns, size) for path, mtime_ns, size in self.cursor.fetchall()}
+        bibs, pdfs, found = [], [], set()
+        for path, stat in self._walk_folder(root):
+            found.add(path)
+            state = (stat.st_mtime_ns, stat.st_size)
+            if known.get(path) == state:
+                report.unchanged += 1
+            elif path.lower().endswith(".bib"):
+                bibs.append((path, state))
+            else:
+                pdfs.append((path, state))
+
+        # A PDF that changed keeps the paper it was matched to
+        self.cursor.executemany(
+            """
+            INSERT INTO watched_files (path, mtime_ns, size, match_key) VALUES (?, ?, ?, ?)
+            ON CONFLICT (path) DO UPDATE SET mtime_ns = excluded.mtime_ns, size = excluded.size
+            """,
+            [
+                (path, mtime_ns, size, match_key(os.path.splitext(os.path.basename(path))[0]))
+                for path, (mtime_ns, size) in pdfs
+            ],
+        )
+        # Deleted files are forgotten, so they are read again if they return
+        self.cursor.executemany(
+            "DELETE FROM watched_files WHERE path = ?",
+            [
+                (path,)
+                for path in known
+                if path not in found and path.startswith(os.path.join(root, ""))
+            ],
+        )
+        self.conn.commit()
 
-            # Reset the auto-increment counter
+        self.cursor.execute(
+            "SELECT match_key, path FROM watched_files WHERE matched = 0 AND match_key IS NOT NULL"
+        )
+        unmatched = dict(self.cursor.fetchall())
+        if bibs:
+            author_ids = self._load_ids("authors", "name")
+            keyword_ids = self._load_ids("keywords", "keyword")
+            seen, known = self._known_entries()
+        for path, (mtime_ns, size) in sorted(bibs):
+            imported = ImportReport()
+            matched: List[str] = []
+            pending = []
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    for index, key, row, error in self._parse_entries(f, keywords, known):
+                        if error == DUPLICATE_ENTRY or error is None and row[7][0] in seen:
+                            report.known += 1
+                            continue
+                        if error is not None:
+                            imported.errors.append((index, key, error))
+                            continue
+                        seen.add(row[7][0])
+                        known.add(row[7][3])
+                        pdf = self._entry_pdf(row, os.path.dirname(path), unmatched)
+                        if pdf is not None:
+                            matched.append(pdf)
+                            row = row[:3] + (pdf,) + row[4:]
+                        pending.append((index, key, row))
+                        if len(pending) >= chunk_size:
+                            self._flush_import(pending, author_ids, keyword_ids, imported)
+                            pending = []
+            except (OSError, UnicodeDecodeError) as e:
+                # Not read again until it changes
+                imported.errors.append((0, "", str(e)))
+            if pending:
+                self._flush_import(pending, author_ids, keyword_ids, imported)
+            report.added += imported.added
+            report.errors.extend(
+                (path, key, message) for _, key, message in imported.errors + imported.unstored
+            )
+            self.cursor.executemany(
+                "UPDATE watched_files SET matched = 1 WHERE path = ?", [(pdf,) for pdf in matched]
+            )
             self.cursor.execute(
-                "UPDATE sqlite_sequence SET seq = (SELECT MAX(id) FROM papers) WHERE name = 'papers'"
+                """
+                INSERT INTO watched_files (path, mtime_ns, size) VALUES (?, ?, ?)
+                ON CONFLICT (path) DO UPDATE SET mtime_ns = excluded.mtime_ns, size = excluded.size
+                """,
+                (path, mtime_ns, size),
             )
+            self.conn.commit()
+
+        if unmatched and (bibs or pdfs):
+            self._link_pdfs(unmatched, report)
+        report.unmatched = len(unmatched)
+        report.elapsed = time.perf_counter() - start
+        return report
+
+    def _entry_pdf(self, row: Tuple, folder: str, unmatched: Dict[str, str]) -> Optional[str]:
+        # The PDF of a new entry: the file its file field names, if there is
+        # one, else an unmatched PDF named after its citation key or DOI
+        file_path = row[3]
+        if file_path:
+            path = os.path.join(folder, os.path.expanduser(file_path))
+            if os.path.isfile(path):
+                path = os.path.abspath(path)
+                name = match_key(os.path.splitext(os.path.basename(path))[0])
+                if unmatched.get(name) == path:
+                    del unmatched[name]
+                return path
+        _, doi, citation_key, _ = row[7]
+        for name in (match_key(citation_key), match_key(doi)):
+            if name and name in unmatched:
+                return unmatched.pop(name)
+        return None
+
+    def _link_pdfs(self, unmatched: Dict[str, str], report: WatchReport) -> None:
+        # Give unmatched PDFs to the papers without a file they are named after
+        self.cursor.execute(
+            """
+            SELECT p.id, b.citation_key, b.doi
+            FROM papers p JOIN bibtex_entries b ON b.paper_id = p.id
+            WHERE COALESCE(p.file_path, '') = ''
+            """
+        )
+        links = []
+        for paper_id, citation_key, doi in self.cursor.fetchall():
+            for name in (match_key(citation_key or ""), match_key(doi or "")):
+                if name and name in unmatched:
+                    links.append((paper_id, unmatched.pop(name)))
+                    break
+        if not links:
+            return
+        stored, errors = self._keep_in_store([path for _, path in links])
+        report.errors.extend((links[i][1], "", message) for i, message in errors)
+        self.cursor.executemany(
+            "UPDATE papers SET file_path = ? WHERE id = ?",
+            [(path, id) for (id, _), path in zip(links, stored)],
+        )
+        self.cursor.executemany(
+            "UPDATE watched_files SET matched = 1 WHERE path = ?", [(path,) for _, path in links]
+        )
+        self.conn.commit()
+        report.linked += len(links)
+
+    def _orphan_checks(self) -> Dict[str, Tuple[str, str]]:
+        # The ORPHANS whose tables exist; the search indexes may not
+        self.cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        tables = {name for (name,) in self.cursor.fetchall()}
+        return {kind: check for kind, check in ORPHANS.items() if check[0] in tables}
 
-            # Commit the transaction
+    @classmethod
+    def _check_files(
+        cls, rows: List[Tuple[int, str, Optional[str]]]
+    ) -> List[Tuple[int, str, Optional[str], bool]]:
+        # Runs in a thread
+        return [cls._check_file(*row) for row in rows]
+
+    @staticmethod
+    def _check_file(
+        paper_id: int, path: str, known_hash: Optional[str]
+    ) -> Tuple[int, str, Optional[str], bool]:
+        # (paper id, path, error, changed) of one paper's PDF
+        try:
+            full_path = os.path.expanduser(path)
+            if not os.path.isfile(full_path):
+                return paper_id, path, "not found", False
+            if known_hash is None:
+                return paper_id, path, None, False
+            return paper_id, path, None, file_hash(full_path) != known_hash
+        except OSError as e:
+            return paper_id, path, e.strerror or str(e), False
+
+    def check_library(
+        self,
+        hash_files: bool = False,
+        threads: int = CHECK_THREADS,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> LibraryCheck:
+        """Look for missing PDFs, orphaned rows and a damaged database file.
+
+        Every paper's file path is checked from a pool of threads, and with
+        hash_files each PDF that index_pdfs has read is hashed again to find
+        the ones whose content changed. Orphaned rows are counted with one
+        query per kind. progress, if given, is called with (files checked,
+        files to check) as the file checks complete. Nothing is changed;
+        see repair_library.
+        """
+        start = time.perf_counter()
+        check = LibraryCheck()
+        self.cursor.execute("PRAGMA quick_check")
+        check.database = [row[0] for row in self.cursor.fetchall() if row[0] != "ok"]
+        for kind, (table, condition) in self._orphan_checks().items():
+            self.cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE {condition}")
+            check.orphans[kind] = self.cursor.fetchone()[0]
+
+        # Only hashes of the file the paper still points at are compared
+        self.cursor.execute(
+            f"""
+            SELECT p.id, p.file_path, {"f.content_hash" if hash_files else "NULL"}
+            FROM papers p LEFT JOIN pdf_files f
+                ON f.paper_id = p.id AND f.file_path = p.file_path AND f.error IS NULL
+            WHERE COALESCE(p.file_path, '') != ''
+            ORDER BY p.id
+            """
+        )
+        files = self.cursor.fetchall()
+        check.files = len(files)
+        from concurrent.futures import ThreadPoolExecutor
+
+        chunks = [files[i : i + CHECK_CHUNK] for i in range(0, len(files), CHECK_CHUNK)]
+        done = 0
+        with ThreadPoolExecutor(max(1, threads)) as executor:
+            for results in executor.map(self._check_files, chunks):
+                for paper_id, path, error, changed in results:
+                    if error is not None:
+                        check.missing.append((paper_id, path, error))
+                    elif changed:
+                        check.changed.append((paper_id, path))
+                done += len(results)
+                if progress:
+                    progress(done, len(files))
+
+        check.elapsed = time.perf_counter() - start
+        return check
+
+    def repair_library(self, vacuum: bool = False) -> Dict[str, int]:
+        """Delete the orphaned rows check_library counts.
+
+        Returns the number of rows deleted of each kind. Missing PDFs are
+        left for the user to find. With vacuum the database file is rebuilt
+        afterwards, giving the space of deleted rows back to the file system.
+        """
+        deleted = {}
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Links first, so that authors and keywords they held are orphans
+            for kind, (table, condition) in self._orphan_checks().items():
+                self.cursor.execute(f"DELETE FROM {table} WHERE {condition}")
+                deleted[kind] = self.cursor.rowcount
             self.conn.commit()
-            print(
-                f"Paper with ID {paper_id} removed and remaining paper IDs reordered."
-            )
+        except Exception:
+            self.conn.rollback()
+            raise
+        if vacuum:
+            self.compact_library()
+        return deleted
 
-        except Exception as e:
+    def compact_library(self) -> None:
+        """Rebuild the database file, deleting nothing.
+
+        Gives the space of rows deleted earlier back to the file system.
+        """
+        self.conn.execute("VACUUM")
+
+    def _keep_in_store(self, paths: List[str]) -> Tuple[List[str], List[Tuple[int, str]]]:
+        # The paths new papers should point at: the PDFs' paths in the store,
+        # hashed from a pool of threads, if there is one. Paths that could
+        # not be stored are kept as given, and returned with their error as
+        # (index, message)
+        if self.store is None:
+            return paths, []
+        from .store import hash_files
+
+        stored = list(paths)
+        todo = []
+        for i, path in enumerate(paths):
+            if not path:
+                continue
+            # Relative to the working directory, as the user meant them
+            path = os.path.abspath(os.path.expanduser(path))
+            if self.store.contains(path):
+                stored[i] = path
+            else:
+                todo.append((i, path))
+        errors = []
+        hashes = hash_files([path for _, path in todo])
+        for (i, path), (digest, error) in zip(todo, hashes):
+            try:
+                if digest is None:
+                    raise OSError(error)
+                stored[i] = self.store.put(path, digest)[0]
+            except OSError as e:
+                errors.append((i, f"{paths[i]}: {e.strerror or e}"))
+        return stored, errors
+
+    def papers_with_pdf(self, digest: str) -> List[int]:
+        """Ids of the papers whose PDF in the store has this SHA-256."""
+        if self.store is None:
+            return []
+        self.cursor.execute(
+            "SELECT id FROM papers WHERE file_path = ? ORDER BY id", (self.store.path_for(digest),)
+        )
+        return [paper_id for (paper_id,) in self.cursor.fetchall()]
+
+    def move_to_store(
+        self,
+        threads: Optional[int] = None,
+        remove_originals: bool = False,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> StoreReport:
+        """Move the PDFs of every paper into the store.
+
+        Files are hashed STORE_BATCH at a time from a pool of threads and
+        stored once per content; the papers pointing at them are updated in
+        one transaction per batch. With remove_originals the files are
+        deleted once the papers point at the store. progress, if given, is
+        called with (files done, files to do) after every batch. threads
+        defaults to store.HASH_THREADS.
+        """
+        if self.store is None:
+            raise RuntimeError("No PDF store is configured; set pdf_store with `rpo config`.")
+        from .store import HASH_THREADS, hash_files
+
+        threads = threads or HASH_THREADS
+        start = time.perf_counter()
+        report = StoreReport()
+        self.cursor.execute(
+            "SELECT file_path, id FROM papers WHERE COALESCE(file_path, '') != '' ORDER BY id"
+        )
+        # Papers by the file they point at, however its path was written
+        papers: Dict[str, List[int]] = {}
+        for path, paper_id in self.cursor.fetchall():
+            path = os.path.abspath(os.path.expanduser(path))
+            if not self.store.contains(path):
+                papers.setdefault(path, []).append(paper_id)
+        paths = list(papers)
+        seen: Set[str] = set()
+
+        for done in range(0, len(paths), STORE_BATCH):
+            batch = paths[done : done + STORE_BATCH]
+            stored = []
+            for path, (digest, error) in zip(batch, hash_files(batch, threads)):
+                try:
+                    if digest is None:
+                        raise OSError(error)
+                    size = os.path.getsize(path)
+                    target, grown = self.store.put(path, digest)
+                    stat = os.stat(target)
+                except OSError as e:
+                    report.errors.append((path, e.strerror or str(e)))
+                    continue
+                report.files += 1
+                report.bytes_total += size
+                report.bytes_stored += grown
+                if digest in seen:
+                    report.duplicates += 1
+                else:
+                    seen.add(digest)
+                    report.bytes_unique += size
+                stored.append((path, target, digest, stat))
+
+            for path, target, digest, stat in stored:
+                for paper_id in papers[path]:
+                    self.cursor.execute(
+                        "UPDATE papers SET file_path = ? WHERE id = ?", (target, paper_id)
+                    )
+                    # The text index_pdfs extracted is still that of the file
+                    self.cursor.execute(
+                        """
+                        UPDATE pdf_files SET file_path = ?, mtime_ns = ?, size = ?
+                        WHERE paper_id = ? AND content_hash = ?
+                        """,
+                        (target, stat.st_mtime_ns, stat.st_size, paper_id, digest),
+                    )
+            self.conn.commit()
+            if remove_originals:
+                for path, target, _, _ in stored:
+                    with contextlib.suppress(OSError):
+                        os.remove(path)
+            if progress:
+                progress(min(done + STORE_BATCH, len(paths)), len(paths))
+
+        report.elapsed = time.perf_counter() - start
+        return report
+
+    def find_duplicates(self) -> List[DuplicateGroup]:
+        # One pass over the library, linking papers that share a content
+        # hash, DOI, citation key or normalised title and year
+        parent: Dict[int, int] = {}
+
+        def root(paper_id: int) -> int:
+            while parent[paper_id] != paper_id:
+                parent[paper_id] = parent[parent[paper_id]]
+                paper_id = parent[paper_id]
+            return paper_id
+
+        first_seen: Dict[Tuple[str, str], int] = {}
+        reasons: List[Tuple[int, str]] = []
+        self.cursor.execute(
+            """
+            SELECT b.paper_id, b.content_hash, b.doi, b.citation_key, p.title, p.year
+            FROM bibtex_entries b JOIN papers p ON p.id = b.paper_id
+            ORDER BY b.paper_id
+            """
+        )
+        for paper_id, content_hash, doi, citation_key, title, year in self.cursor.fetchall():
+            parent.setdefault(paper_id, paper_id)
+            title = normalise_title(title or "")
+            for reason, value in (
+                ("identical BibTeX", content_hash),
+                ("same DOI", doi),
+                ("same citation key", citation_key),
+                ("same title and year", title and f"{title} ({year})"),
+            ):
+                if not value:
+                    continue
+                other = first_seen.setdefault((reason, value), paper_id)
+                if other != paper_id:
+                    parent[root(paper_id)] = root(other)
+                    if reason in ("same DOI", "same citation key"):
+                        reason = f"{reason} {value}"
+                    reasons.append((paper_id, reason))
+
+        groups: Dict[int, DuplicateGroup] = {}
+        for paper_id in parent:
+            group = groups.setdefault(root(paper_id), DuplicateGroup([], []))
+            group.paper_ids.append(paper_id)
+        for paper_id, label in reasons:
+            group = groups[root(paper_id)]
+            if label not in group.reasons:
+                group.reasons.append(label)
+        return [group for group in groups.values() if len(group.paper_ids) > 1]
+
+    def remove_paper(self, paper_id: int) -> None:
+        if not self.remove_papers([paper_id]):
+            raise ValueError(f"No paper found with ID {paper_id}")
+
+    def remove_papers(self, paper_ids: Iterable[int]) -> List[int]:
+        # Returns the ids that existed and were removed
+        paper_ids = sorted(set(paper_ids))
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            removed = []
+            for start in range(0, len(paper_ids), MAX_SQL_VARIABLES):
+                batch = paper_ids[start : start + MAX_SQL_VARIABLES]
+                placeholders = ", ".join("?" * len(batch))
+                self.cursor.execute(
+                    f"SELECT id FROM papers WHERE id IN ({placeholders})", batch
+                )
+                removed.extend(id for (id,) in self.cursor.fetchall())
+                # Authors, keywords and BibTeX rows go with the paper
+                self.cursor.execute(
+                    f"DELETE FROM papers WHERE id IN ({placeholders})", batch
+                )
+
+            if removed and not self.config.stable_ids:
+                self._renumber_papers()
+
+            self.conn.commit()
+        except Exception:
             # If any error occurs, roll back the transaction
             self.conn.rollback()
-            print(f"An error occurred: {e}")
             raise
+        return sorted(removed)
 
-    def get_paper_details(self, paper_id: int) -> Optional[Paper]:
+    def _renumber_papers(self) -> int:
+        # Give papers dense ids 1..N in their current order with two set-based
+        # updates; going through negative ids avoids clashes half way through
+        self.cursor.execute("DROP TABLE IF EXISTS temp.renumber_map")
         self.cursor.execute(
             """
-            SELECT p.title, p.year, p.file_path, p.journal, GROUP_CONCAT(DISTINCT a.name), 
-                   GROUP_CONCAT(DISTINCT k.keyword), b.bibtex
-            FROM papers p
-            LEFT JOIN paper_authors pa ON p.id = pa.paper_id
-            LEFT JOIN authors a ON pa.author_id = a.id
-            LEFT JOIN paper_keywords pk ON p.id = pk.paper_id
-            LEFT JOIN keywords k ON pk.keyword_id = k.id
-            LEFT JOIN bibtex_entries b ON p.id = b.paper_id
-            WHERE p.id = ?
-            GROUP BY p.id
-        """,
-            (paper_id,),
-        )
-        return self.cursor.fetchone()
-
-    def update_database_schema(self) -> None:
+            CREATE TEMP TABLE renumber_map AS
+            SELECT old_id, new_id FROM (
+                SELECT id AS old_id, ROW_NUMBER() OVER (ORDER BY id) AS new_id
+                FROM papers
+            )
+            WHERE old_id != new_id
+            """
+        )
+        self.cursor.execute("CREATE UNIQUE INDEX temp.renumber_map_old ON renumber_map (old_id)")
+        self.cursor.execute(
+            """
+            UPDATE papers
+            SET id = -(SELECT new_id FROM renumber_map WHERE old_id = papers.id)
+            WHERE id IN (SELECT old_id FROM renumber_map)
+            """
+        )
+        renumbered = self.cursor.rowcount
+        self.cursor.execute("UPDATE papers SET id = -id WHERE id < 0")
+        self.cursor.execute("DROP TABLE temp.renumber_map")
+
+        # Reset the auto-increment counter
+        self.cursor.execute(
+            "UPDATE sqlite_sequence SET seq = COALESCE((SELECT MAX(id) FROM papers), 0) WHERE name = 'papers'"
+        )
+        return renumbered
+
+    def renumber_papers(self) -> int:
+        self.conn.execute("BEGIN IMMEDIATE")
         try:
-            self.cursor.execute("SELECT journal FROM papers LIMIT 1")
-        except sqlite3.OperationalError:
-            # Journal column doesn't exist, so add it
-            self.cursor.execute("ALTER TABLE papers ADD COLUMN journal TEXT")
+            renumbered = self._renumber_papers()
             self.conn.commit()
-            print("Database schema updated to include 'journal' column.")
+        except Exception:
+            self.conn.rollback()
+            raise
+        return renumbered
+
+    def rebuild_display_cache(self) -> int:
+        # Recompute every paper's author columns, the paper counts of authors
+        # and keywords, and the words fuzzy search corrects to, from scratch
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.cursor.execute(
+                f"UPDATE papers SET authors = {AUTHORS_OF_PAPER.format(paper='papers.id')}"
+            )
+            rebuilt = self.cursor.rowcount
+            for table, _, link_table, link_column in FACET_COUNTS.values():
+                self.cursor.execute(
+                    f"""
+                    UPDATE {table} SET paper_count = (
+                        SELECT COUNT(*) FROM {link_table} WHERE {link_column} = {table}.id
+                    )
+                    """
+                )
+            self.cursor.execute("DELETE FROM fuzzy_trigrams")
+            self.cursor.execute("DELETE FROM fuzzy_terms")
+            self.cursor.execute("SELECT name FROM authors")
+            names = [name for (name,) in self.cursor.fetchall()]
+            self.cursor.execute("SELECT title FROM papers")
+            index_terms(self.cursor, names + [title for (title,) in self.cursor.fetchall()])
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return rebuilt
+
+    def check_display_cache(self) -> List[int]:
+        """Ids of papers whose stored author columns are out of date."""
+        stale = []
+        for id, authors, label, sort_key_ok, expected in self.conn.execute(
+            f"""
+            SELECT id, authors, author_label,
+                   author_sort = {AUTHOR_SORT_KEY.format(authors="expected")},
+                   expected
+            FROM (
+                SELECT id, authors, author_label, author_sort,
+                       {AUTHORS_OF_PAPER.format(paper="papers.id")} AS expected
+                FROM papers
+            )
+            ORDER BY id
+            """
+        ):
+            if authors != expected or label != self.format_authors(expected) or not sort_key_ok:
+                stale.append(id)
+        return stale
+
+    def get_paper_details(self, paper_id: int) -> Optional[PaperDetails]:
+        details = self.get_papers_details([paper_id])
+        return details[0] if details else None
+
+    def get_papers_details(self, paper_ids: Iterable[int]) -> List[PaperDetails]:
+        """Details of many papers, in the order given; unknown ids are skipped.
+
+        Papers, authors and keywords are each read with one indexed query
+        per batch of ids rather than joined, which would multiply a paper's
+        authors by its keywords.
+        """
+        paper_ids = list(dict.fromkeys(paper_ids))
+        details: Dict[int, PaperDetails] = {}
+        for start in range(0, len(paper_ids), MAX_SQL_VARIABLES):
+            batch = paper_ids[start : start + MAX_SQL_VARIABLES]
+            placeholders = ", ".join("?" * len(batch))
+            for id, title, year, journal, file_path, bibtex in self.conn.execute(
+                f"""
+                SELECT p.id, p.title, p.year, p.journal, p.file_path, b.bibtex
+                FROM papers p LEFT JOIN bibtex_entries b ON b.paper_id = p.id
+                WHERE p.id IN ({placeholders})
+                """,
+                batch,
+            ):
+                details[id] = PaperDetails(id, title, year, journal, file_path, [], [], bibtex)
+            for paper_id, name in self.conn.execute(
+                f"""
+                SELECT pa.paper_id, a.name
+                FROM paper_authors pa JOIN authors a ON a.id = pa.author_id
+                WHERE pa.paper_id IN ({placeholders})
+                ORDER BY pa.paper_id, pa.position
+                """,
+                batch,
+            ):
+                details[paper_id].authors.append(name)
+            for paper_id, keyword in self.conn.execute(
+                f"""
+                SELECT pk.paper_id, k.keyword
+                FROM paper_keywords pk JOIN keywords k ON k.id = pk.keyword_id
+                WHERE pk.paper_id IN ({placeholders})
+                ORDER BY pk.paper_id, pk.rowid
+                """,
+                batch,
+            ):
+                details[paper_id].keywords.append(keyword)
+        return [details[id] for id in paper_ids if id in details]
 
     def get_paper_file_path(self, paper_id: int) -> Optional[str]:
         self.cursor.execute("SELECT file_path FROM papers WHERE id = ?", (paper_id,))
@@ -276,108 +1605,486 @@ class ResearchPaperOrganiser:
         except Exception as e:
             print(f"Error opening file: {e}")
 
-    def format_authors(self, authors: str) -> str:
+    def format_authors(self, authors: Optional[str]) -> str:
+        # Stored names never contain " and ", which joins them in the
+        # authors column, so splitting on it matches migrations.AUTHOR_LABEL
+        if not authors:
+            return ""
         author_list = authors.split(" and ")
         if len(author_list) > 2:
             return f"{author_list[0]} et al."
         return " & ".join(author_list)
 
-    def list_all_papers(self) -> List[Paper]:
-        self.cursor.execute(
-            """
-            SELECT p.id, 
-                   GROUP_CONCAT(a.name, ' and ') as authors,
-                   p.year, 
-                   p.journal, 
-                   p.title,
-                   p.file_path
+    # Columns shared by every list and search query, in Paper field order.
+    # The author label is kept up to date by triggers
+    PAPER_COLUMNS = "p.id, p.author_label, p.year, p.journal, p.title, p.file_path"
+
+    def _stream_papers(self, sql: str, params: Tuple) -> Iterator[Paper]:
+        # A cursor of its own, so callers can use the organiser while
+        # iterating, and rows are formatted only as they are consumed
+        cursor = self.conn.execute(sql, params)
+        try:
+            while True:
+                rows = cursor.fetchmany(FETCH_SIZE)
+                if not rows:
+                    return
+                for row in rows:
+                    yield Paper(*row)
+        finally:
+            try:
+                cursor.close()
+            except sqlite3.ProgrammingError:
+                # The connection was closed while the stream was still open
+                pass
+
+    def _limit_clause(
+        self, limit: Optional[int], page: Optional[int]
+    ) -> Tuple[str, Tuple]:
+        if page is not None:
+            limit = limit or PAGE_SIZE
+            return "LIMIT ? OFFSET ?", (limit, (page - 1) * limit)
+        if limit is not None:
+            return "LIMIT ?", (limit,)
+        return "", ()
+
+    def _order_clause(self, sort: Optional[str], descending: bool, default: str) -> str:
+        if sort is None:
+            return f"ORDER BY {default}"
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort papers by {sort!r}")
+        direction = "DESC" if descending else "ASC"
+        return f"ORDER BY {SORT_COLUMNS[sort]} {direction}, {default}"
+
+    @staticmethod
+    def _where_clause(conditions: Iterable[Tuple[str, Tuple]]) -> Tuple[str, Tuple]:
+        # "WHERE" and the conditions that are not empty, with their parameters
+        conditions = [(sql, params) for sql, params in conditions if sql]
+        if not conditions:
+            return "", ()
+        return (
+            "WHERE " + " AND ".join(f"({sql})" for sql, _ in conditions),
+            tuple(param for _, params in conditions for param in params),
+        )
+
+    def iter_papers(
+        self,
+        limit: Optional[int] = None,
+        after: Optional[int] = None,
+        page: Optional[int] = None,
+        sort: Optional[str] = None,
+        descending: bool = False,
+        filters: SearchFilters = NO_FILTERS,
+    ) -> Iterator[Paper]:
+        # Papers ordered by year (newest first) and title unless sorted by
+        # another field. `after` continues from the given paper id without
+        # counting the rows before it
+        conditions = [filters.sql()]
+        order = self._order_clause(sort, descending, "p.year DESC, p.title, p.id")
+        if after is not None:
+            if sort is not None:
+                raise ValueError(
+                    "Listings can only continue after a paper in the default order"
+                )
+            self.cursor.execute("SELECT year, title FROM papers WHERE id = ?", (after,))
+            row = self.cursor.fetchone()
+            if row is None:
+                raise ValueError(f"No paper found with ID {after}")
+            year, title = row
+            conditions.append(
+                (
+                    """
+                    p.year < ?
+                    OR (p.year = ? AND p.title > ?)
+                    OR (p.year = ? AND p.title = ? AND p.id > ?)
+                    """,
+                    (year, year, title, year, title, after),
+                )
+            )
+        where, params = self._where_clause(conditions)
+        limit_clause, limit_params = self._limit_clause(limit, page)
+        return self._stream_papers(
+            f"""
+            SELECT {self.PAPER_COLUMNS}
             FROM papers p
-            LEFT JOIN paper_authors pa ON p.id = pa.paper_id
-            LEFT JOIN authors a ON pa.author_id = a.id
-            GROUP BY p.id
-            ORDER BY p.year DESC, p.title
-            """
+            {where}
+            {order}
+            {limit_clause}
+            """,
+            params + limit_params,
         )
-        papers = self.cursor.fetchall()
-        return [
-            Paper(id, self.format_authors(authors), year, journal, title, file_path)
-            for id, authors, year, journal, title, file_path in papers
+
+    def list_all_papers(self) -> List[Paper]:
+        return list(self.iter_papers())
+
+    # Kept here for callers of the organiser API
+    print_papers = staticmethod(print_papers)
+
+    def search_plan(self, query: str, fuzzy: bool = False) -> Tuple[Tuple[str, str], ...]:
+        """Turn free text into (index, FTS5 query) pairs a paper must all match.
+
+        Every term becomes a prefix match and "field:term" restricts it to
+        one column; "text:" terms search the PDFs. The first pair ranks the
+        results, so text terms, being the more specific, come first. A term
+        ending in "~", or any term if fuzzy, also matches the author and
+        title words most similar to it, so typos and missing accents are
+        forgiven.
+        """
+        metadata, text = [], []
+        for field_name, token in _SEARCH_TOKEN.findall(query):
+            column = SEARCH_FIELDS.get(field_name.lower())
+            if field_name and column is None:
+                token = f"{field_name} {token}"
+            words = re.findall(r"\w+", token)
+            if not words:
+                continue
+            phrase = '"' + " ".join(words) + '"*'
+            if (fuzzy or token.endswith("~")) and column in (None, *FUZZY_FIELDS):
+                phrase = " AND ".join(self._fuzzy_match(word, column) for word in words)
+                metadata.append(phrase)
+            elif column == "text":
+                text.append(phrase)
+            else:
+                metadata.append(f"{column} : {phrase}" if column else phrase)
+        plan = []
+        if text:
+            plan.append(("pdf_fts", " AND ".join(text)))
+        if metadata:
+            plan.append(("papers_fts", " AND ".join(metadata)))
+        return tuple(plan)
+
+    def _fuzzy_match(self, word: str, column: Optional[str]) -> str:
+        # The word as typed, or one of the indexed words resembling it
+        terms = similar_terms(self.conn, word, FUZZY_EXPANSIONS)
+        similar = [
+            f'"{term}"' for term, score in terms if score >= terms[0][1] * FUZZY_MARGIN
         ]
+        columns = column or "{" + " ".join(FUZZY_FIELDS) + "}"
+        exact = f'{column} : "{word}"*' if column else f'"{word}"*'
+        if not similar:
+            return exact
+        return f"({exact} OR {columns} : ({' OR '.join(similar)}))"
 
-    def print_papers(self, papers: List[Paper]) -> None:
-        if not papers:
-            print("No papers found.")
-            return
+    def similar_terms(self, word: str, limit: int = FUZZY_EXPANSIONS) -> List[Tuple[str, float]]:
+        """Author and title words resembling word, most similar first.
 
-        # Define column widths
-        id_width = 4
-        authors_width = 30
-        year_width = 6
-        journal_width = 20
-        title_width = 50
+        Similarity is the share of trigrams two words have in common once
+        case and accents are folded, from 0 to 1; words below 0.3 are left
+        out. Found through the trigram index, not by comparing every word.
+        """
+        return similar_terms(self.conn, word, limit)
 
-        # Print header
-        print(
-            f"{'ID':<{id_width}} {'Authors':<{authors_width}} {'Year':<{year_width}} {'Journal':<{journal_width}} {'Title'}"
-        )
-        print(
-            "-"
-            * (4 + id_width + authors_width + year_width + journal_width + title_width)
+    def build_search_query(self, query: str) -> str:
+        return dict(self.search_plan(query)).get("papers_fts", "")
+
+    @staticmethod
+    def _matching_ids_sql(index: str) -> str:
+        tables, paper_id = SEARCH_INDEXES[index]
+        return f"SELECT {paper_id} FROM {tables} WHERE {index} MATCH ?"
+
+    @staticmethod
+    def _ranked_matches_sql(index: str) -> str:
+        tables, paper_id = SEARCH_INDEXES[index]
+        return (
+            f"SELECT {paper_id} AS paper_id, {index}.rank AS rank "
+            f"FROM {tables} WHERE {index} MATCH ?"
         )
 
-        # Print each paper
-        for paper in papers:
-            # Truncate authors if too long
-            authors = paper.authors
-            if len(authors) > authors_width:
-                authors = authors[: authors_width - 3] + "..."
+    def _plan_filters(self, plan: Tuple[Tuple[str, str], ...]) -> Tuple[str, Tuple]:
+        # Conditions for papers p to match every index of the plan. The
+        # unary + keeps SQLite from looking up each match by id
+        conditions = [f"+p.id IN ({self._matching_ids_sql(index)})" for index, _ in plan]
+        return " AND ".join(conditions), tuple(match for _, match in plan)
 
-            # Truncate journal if too long
-            journal = paper.journal
-            if len(journal) > journal_width:
-                journal = journal[: journal_width - 3] + "..."
+    def _require_search_index(self) -> None:
+        if not self.has_search_index:
+            raise RuntimeError(
+                "Search needs SQLite's FTS5 extension, which this Python's "
+                "sqlite3 module was built without."
+            )
+
+    def _data_token(self) -> Tuple[int, int]:
+        # data_version changes when another connection commits, total_changes
+        # when this one writes (add, import, remove, renumber, ...)
+        version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        return version, self.conn.total_changes
+
+    def ranked_search(
+        self, plan: Tuple[Tuple[str, str], ...], filters: SearchFilters = NO_FILTERS
+    ) -> Optional[Sequence[int]]:
+        """Ids of the papers matching a search plan, best match first.
+
+        Returns None if more than RANK_LIMIT papers match; those results are
+        listed in list order instead. Results are cached until the database
+        changes, so retyping or deleting back to an earlier query is free.
+        """
+        token = self._data_token()
+        if token != self._cache_token:
+            self._search_cache.clear()
+            self._cache_token = token
+        key = (plan, filters)
+        if key in self._search_cache:
+            self._search_cache.move_to_end(key)
+            return self._search_cache[key]
 
-            # Wrap title
-            wrapped_title = textwrap.wrap(paper.title, width=title_width)
+        # Counting stops at the limit, so broad queries cost next to nothing
+        index, match = plan[0]
+        if filters == NO_FILTERS:
+            (count,) = self.conn.execute(
+                f"SELECT COUNT(*) FROM ({self._matching_ids_sql(index)} LIMIT ?)",
+                (match, RANK_LIMIT + 1),
+            ).fetchone()
+        else:
+            where, params = self._where_clause([filters.sql(), self._plan_filters(plan[:1])])
+            (count,) = self.conn.execute(
+                f"SELECT COUNT(*) FROM (SELECT p.id FROM papers p {where} LIMIT ?)",
+                params + (RANK_LIMIT + 1,),
+            ).fetchone()
+        paper_ids = self._ranked_ids(plan, filters) if count <= RANK_LIMIT else None
 
-            # Print first line
-            print(
-                f"{paper.id:<{id_width}} {authors:<{authors_width}} {paper.year:<{year_width}} {journal:<{journal_width}} {wrapped_title[0]}"
+        self._search_cache[key] = paper_ids
+        if len(self._search_cache) > SEARCH_CACHE_SIZE:
+            self._search_cache.popitem(last=False)
+        return paper_ids
+
+    def _ranked_ids(
+        self, plan: Tuple[Tuple[str, str], ...], filters: SearchFilters
+    ) -> Sequence[int]:
+        # Sorted here rather than in SQL, which would build every result
+        # column before sorting; ties fall back to list order. Matches come
+        # first: with filters SQLite would otherwise match the text anew
+        # for every paper they keep
+        (index, match), rest = plan[0], plan[1:]
+        where, params = self._where_clause([self._plan_filters(rest), filters.sql()])
+        rows = self.conn.execute(
+            f"""
+            SELECT h.paper_id, h.rank, p.year, p.title
+            FROM ({self._ranked_matches_sql(index)}) h
+            CROSS JOIN papers p ON p.id = h.paper_id
+            {where}
+            """,
+            (match,) + params,
+        ).fetchall()
+        # SQLite sorts NULL first, so last when descending
+        rows.sort(
+            key=lambda row: (
+                row[1],
+                row[2] is None,
+                -(row[2] or 0),
+                row[3] is not None,
+                row[3] or "",
+                row[0],
             )
+        )
+        return array("q", (row[0] for row in rows))
 
-            # Print remaining lines of title, if any
-            for line in wrapped_title[1:]:
-                print(
-                    f"{'':<{id_width}} {'':<{authors_width}} {'':<{year_width}} {'':<{journal_width}} {line}"
+    def _papers_by_id(self, paper_ids: Sequence[int]) -> Iterator[Paper]:
+        # Papers in the order of paper_ids, read FETCH_SIZE at a time
+        for start in range(0, len(paper_ids), FETCH_SIZE):
+            chunk = tuple(paper_ids[start : start + FETCH_SIZE])
+            placeholders = ", ".join("?" * len(chunk))
+            rows = {
+                row[0]: row
+                for row in self.conn.execute(
+                    f"SELECT {self.PAPER_COLUMNS} FROM papers p "
+                    f"WHERE p.id IN ({placeholders})",
+                    chunk,
                 )
+            }
+            for paper_id in chunk:
+                if paper_id in rows:
+                    yield Paper(*rows[paper_id])
 
-            print()  # Add a blank line between papers
+    def iter_search(
+        self,
+        query: str,
+        limit: Optional[int] = None,
+        page: Optional[int] = None,
+        sort: Optional[str] = None,
+        descending: bool = False,
+        filters: SearchFilters = NO_FILTERS,
+        fuzzy: bool = False,
+    ) -> Iterator[Paper]:
+        # Results ordered by relevance unless sorted by a paper field
+        plan = self.search_plan(query, fuzzy)
+        if not plan:
+            return self.iter_papers(
+                limit=limit, page=page, sort=sort, descending=descending, filters=filters
+            )
+        self._require_search_index()
 
-    def search_papers(self, query: str) -> List[Paper]:
-        self.cursor.execute(
-            """
-            SELECT p.id, 
-                   GROUP_CONCAT(a.name, ' and ') as authors,
-                   p.year, 
-                   p.journal, 
-                   p.title,
-                   p.file_path
-            FROM papers p
-            LEFT JOIN paper_authors pa ON p.id = pa.paper_id
-            LEFT JOIN authors a ON pa.author_id = a.id
-            LEFT JOIN paper_keywords pk ON p.id = pk.paper_id
-            LEFT JOIN keywords k ON pk.keyword_id = k.id
-            WHERE p.title LIKE ? OR a.name LIKE ? OR k.keyword LIKE ?
-            GROUP BY p.id
-            ORDER BY p.year DESC, p.title
+        if sort is None:
+            paper_ids = self.ranked_search(plan, filters)
+            if paper_ids is not None:
+                if page is not None:
+                    limit = limit or PAGE_SIZE
+                    paper_ids = paper_ids[(page - 1) * limit : page * limit]
+                elif limit is not None:
+                    paper_ids = paper_ids[:limit]
+                return self._papers_by_id(paper_ids)
+            # Too many matches to rank: walk the papers in list order by
+            # index and keep the matches, so the first page is ready as soon
+            # as it is found
+            where, params = self._where_clause([self._plan_filters(plan), filters.sql()])
+            limit_clause, limit_params = self._limit_clause(limit, page)
+            return self._stream_papers(
+                f"""
+                SELECT {self.PAPER_COLUMNS}
+                FROM papers p
+                {where}
+                ORDER BY p.year DESC, p.title, p.id
+                {limit_clause}
+                """,
+                params + limit_params,
+            )
+
+        (index, match), rest = plan[0], plan[1:]
+        where, params = self._where_clause([self._plan_filters(rest), filters.sql()])
+        order = self._order_clause(sort, descending, "h.rank, p.year DESC, p.title, p.id")
+        limit_clause, limit_params = self._limit_clause(limit, page)
+        return self._stream_papers(
+            f"""
+            SELECT {self.PAPER_COLUMNS}
+            FROM ({self._ranked_matches_sql(index)}) h
+            CROSS JOIN papers p ON p.id = h.paper_id
+            {where}
+            {order}
+            {limit_clause}
             """,
-            ("%" + query + "%", "%" + query + "%", "%" + query + "%"),
+            (match,) + params + limit_params,
         )
-        papers = self.cursor.fetchall()
-        return [
-            Paper(id, self.format_authors(authors), year, journal, title, file_path)
-            for id, authors, year, journal, title, file_path in papers
-        ]
+
+    def iter_export(
+        self,
+        columns: Sequence[str],
+        query: Optional[str] = None,
+        keyword: Optional[str] = None,
+    ) -> Iterator[Tuple]:
+        """Stream rows of EXPORT_COLUMNS for every paper, in id order.
+
+        query keeps the papers a search would find, keyword those with
+        that keyword. Rows are read FETCH_SIZE at a time, so memory use does
+        not grow with the library.
+        """
+        unknown = [column for column in columns if column not in EXPORT_COLUMNS]
+        if unknown:
+            raise ValueError(f"Cannot export {', '.join(unknown)}")
+        conditions, params = [], ()
+        plan = self.search_plan(query) if query else ()
+        if plan:
+            self._require_search_index()
+            where, params = self._plan_filters(plan)
+            conditions.append(where)
+        if keyword is not None:
+            conditions.append(
+                """
+                p.id IN (
+                    SELECT pk.paper_id FROM paper_keywords pk
+                    JOIN keywords k ON k.id = pk.keyword_id
+                    WHERE k.keyword = ?
+                )
+                """
+            )
+            params += (keyword,)
+        cursor = self.conn.execute(
+            f"""
+            SELECT {", ".join(EXPORT_COLUMNS[column] for column in columns)}
+            FROM papers p LEFT JOIN bibtex_entries b ON b.paper_id = p.id
+            {"WHERE " + " AND ".join(conditions) if conditions else ""}
+            ORDER BY p.id
+            """,
+            params,
+        )
+        try:
+            while True:
+                rows = cursor.fetchmany(FETCH_SIZE)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            try:
+                cursor.close()
+            except sqlite3.ProgrammingError:
+                pass
+
+    def search_papers(self, query: str) -> List[Paper]:
+        return list(self.iter_search(query))
+
+    def facets(
+        self,
+        query: Optional[str] = None,
+        filters: SearchFilters = NO_FILTERS,
+        names: Sequence[str] = FACETS,
+        limit: int = FACET_LIMIT,
+        fuzzy: bool = False,
+    ) -> Dict[str, List[Tuple[Any, int]]]:
+        """Numbers of papers per year, journal, author and keyword.
+
+        Counts cover the papers a search for query finds among those kept by
+        filters, or the whole library. Every year is listed, newest first;
+        of the other facets the `limit` most frequent values, most frequent
+        first. Journals differing only in case are counted as one.
+        """
+        unknown = [name for name in names if name not in FACETS]
+        if unknown:
+            raise ValueError(f"Unknown facets {', '.join(unknown)}")
+        plan = self.search_plan(query, fuzzy) if query else ()
+        conditions = [filters.sql()]
+        if plan:
+            self._require_search_index()
+            # Driven by the matches of the first index, which are fewer than
+            # the papers they would otherwise be looked up for
+            (index, match), rest = plan[0], plan[1:]
+            tables, paper_id = SEARCH_INDEXES[index]
+            papers = f"{tables} CROSS JOIN papers p ON p.id = {paper_id}"
+            conditions += [(f"{index} MATCH ?", (match,)), self._plan_filters(rest)]
+        else:
+            papers = "papers p"
+        where, params = self._where_clause(conditions)
+
+        facets = {}
+        for name in names:
+            if name == "year":
+                sql = f"""
+                    SELECT p.year, COUNT(*) FROM {papers} {where}
+                    GROUP BY p.year ORDER BY p.year DESC
+                """
+                facet_params = params
+            elif name == "journal":
+                sql = f"""
+                    SELECT MIN(p.journal), COUNT(*) AS count FROM {papers} {where}
+                    GROUP BY p.journal COLLATE NOCASE
+                    ORDER BY count DESC, 1 LIMIT ?
+                """
+                facet_params = params + (limit,)
+            elif not where:
+                # Kept up to date by triggers, and read in order off an index
+                table, column = FACET_COUNTS[name][:2]
+                sql = f"""
+                    SELECT {column}, paper_count FROM {table} WHERE paper_count > 0
+                    ORDER BY paper_count DESC, {column} LIMIT ?
+                """
+                facet_params = (limit,)
+            else:
+                table, column, link_table, link_column = FACET_COUNTS[name]
+                sql = f"""
+                    SELECT t.{column}, l.count
+                    FROM (
+                        SELECT l.{link_column} AS id, COUNT(*) AS count
+                        FROM {papers} CROSS JOIN {link_table} l ON l.paper_id = p.id
+                        {where}
+                        GROUP BY l.{link_column}
+                    ) l
+                    JOIN {table} t ON t.id = l.id
+                    ORDER BY l.count DESC, t.{column} LIMIT ?
+                """
+                facet_params = params + (limit,)
+            facets[name] = self.conn.execute(sql, facet_params).fetchall()
+        return facets
 
     def close(self):
+        # A cursor still holding a statement would keep the connection open
+        # after close(), and with it the WAL file, until it is collected.
+        # Closing twice is harmless, as it was before the cursor was closed
+        with contextlib.suppress(sqlite3.ProgrammingError):
+            self.cursor.close()
         self.conn.close()
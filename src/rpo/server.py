@@ -0,0 +1,206 @@
+import itertools
+import json
+import os
+import signal
+import socket
+import socketserver
+import sqlite3
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from .config import SOCKET_FILE, Config
+
+# `rpo serve` keeps an organiser open behind a Unix domain socket. Every
+# request is one line of JSON naming a command, its arguments and the
+# database it is meant for. The reply is one or more lines of JSON (papers
+# in chunks, a details record, {"ok": true} or {"error": message}) followed
+# by {"done": true}. Requests are answered one at a time by the one
+# organiser, which keeps its search cache and SQLite page cache between them
+
+# Papers per reply line
+CHUNK_SIZE = 500
+# Seconds the CLI waits for a reply before giving up on the server
+TIMEOUT = 30.0
+
+
+class ServerUnavailable(Exception):
+    """No server is running for this database; use it directly instead."""
+
+
+def request(
+    config: Config, message: Dict[str, Any], path: Path = SOCKET_FILE
+) -> Iterator[Dict[str, Any]]:
+    """Send a request and yield the replies.
+
+    Raises ServerUnavailable before the first reply if there is no server
+    serving config's database, and RuntimeError if the connection is lost
+    half way through.
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        raise ServerUnavailable("Unix domain sockets are not supported here")
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(TIMEOUT)
+    try:
+        try:
+            sock.connect(str(path))
+            sock.sendall(json.dumps(dict(message, db=str(config.db_path))).encode() + b"\n")
+            replies = sock.makefile("rb")
+            first = replies.readline()
+        except OSError as e:
+            raise ServerUnavailable(str(e))
+        if not first:
+            raise ServerUnavailable("The server closed the connection")
+        reply = json.loads(first)
+        if reply.get("unavailable"):
+            raise ServerUnavailable(reply["error"])
+
+        while not reply.get("done"):
+            yield reply
+            try:
+                line = replies.readline()
+            except OSError:
+                line = b""
+            if not line:
+                raise RuntimeError("Lost the connection to rpo serve.")
+            reply = json.loads(line)
+    finally:
+        sock.close()
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    server: "Server"
+
+    def handle(self) -> None:
+        try:
+            line = self.rfile.readline()
+            if not line:
+                return
+            try:
+                message = json.loads(line)
+                if message.get("db") != str(self.server.config.db_path):
+                    self.send(
+                        {
+                            "error": "The server is serving another database.",
+                            "unavailable": True,
+                        }
+                    )
+                else:
+                    self.server.answer(message, self.send)
+            except (ValueError, RuntimeError, KeyError, sqlite3.Error) as e:
+                self.send({"error": str(e)})
+            self.send({"done": True})
+        except OSError:
+            # The client went away, e.g. `rpo list | head`
+            pass
+
+    def send(self, reply: Dict[str, Any]) -> None:
+        self.wfile.write(json.dumps(reply).encode() + b"\n")
+
+
+class Server(socketserver.UnixStreamServer):
+    def __init__(self, config: Config, path: Path = SOCKET_FILE):
+        # Imported here so that the CLI can ask a server without loading it
+        from .rpo import ResearchPaperOrganiser
+
+        self.config = config
+        self.path = path
+        self.requests = 0
+        self.organiser = ResearchPaperOrganiser(config)
+        # Only the owner may connect
+        umask = os.umask(0o177)
+        try:
+            _remove_stale_socket(path)
+            super().__init__(str(path), RequestHandler)
+        except Exception:
+            self.organiser.close()
+            raise
+        finally:
+            os.umask(umask)
+
+    def answer(self, message: Dict[str, Any], send: Callable[[Dict[str, Any]], None]) -> None:
+        from .rpo import SearchFilters
+
+        self.requests += 1
+        organiser = self.organiser
+        command = message.get("command")
+        if command in ("list", "search"):
+            filters = SearchFilters(
+                message.get("year_from"), message.get("year_to"), message.get("journal")
+            )
+            if command == "list":
+                papers = organiser.iter_papers(
+                    limit=message.get("limit"),
+                    after=message.get("after"),
+                    page=message.get("page"),
+                    filters=filters,
+                )
+            else:
+                papers = organiser.iter_search(
+                    message["query"],
+                    limit=message.get("limit"),
+                    page=message.get("page"),
+                    filters=filters,
+                    fuzzy=message.get("fuzzy", False),
+                )
+            for chunk in iter(lambda: list(itertools.islice(papers, CHUNK_SIZE)), []):
+                send({"papers": [vars(paper) for paper in chunk]})
+            if message.get("facets"):
+                facets = organiser.facets(
+                    message.get("query"), filters, fuzzy=message.get("fuzzy", False)
+                )
+                send({"facets": facets})
+        elif command == "details":
+            details = organiser.get_paper_details(message["paper_id"])
+            send({"details": asdict(details) if details else None})
+        elif command == "add":
+            try:
+                organiser.add_paper(
+                    message["bibtex"], message["file"], message.get("keywords", [])
+                )
+            except OSError as e:
+                # A PDF that could not be stored, not the client going away
+                send({"error": str(e)})
+            else:
+                send({"ok": True})
+        else:
+            raise ValueError(f"Unknown command {command!r}")
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.organiser.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _remove_stale_socket(path: Path) -> None:
+    # A socket left behind by a server that died is removed; a live one
+    # means a server is already running
+    if not path.exists():
+        return
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(path))
+    except OSError:
+        path.unlink()
+    else:
+        raise RuntimeError(f"A server is already listening on {path}.")
+    finally:
+        sock.close()
+
+
+def serve(config: Config, path: Optional[Path] = None) -> None:
+    if not hasattr(socket, "AF_UNIX"):
+        raise RuntimeError("rpo serve needs Unix domain sockets, which this system lacks.")
+    server = Server(config, path or SOCKET_FILE)
+    # Stop cleanly, removing the socket, when killed
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    print(f"Serving {config.db_path} on {server.path}; press Ctrl+C to stop.", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
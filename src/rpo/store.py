@@ -0,0 +1,90 @@
+import errno
+import os
+from typing import Iterable, List, Optional, Tuple
+
+from .pdf import file_hash
+
+# A managed directory of PDFs named by the SHA-256 of their content, so that
+# a file added under several names is stored once and links survive the
+# originals moving. Files live under two levels of folders named after the
+# first characters of their hash, keeping each folder small.
+
+STORE_MODES = ("copy", "link")
+# Threads hashing files at once; hashlib releases the GIL while hashing, so
+# these use more than one core, and they overlap reads from slow drives
+HASH_THREADS = 8
+
+
+def hash_files(
+    paths: Iterable[str], threads: int = HASH_THREADS
+) -> List[Tuple[Optional[str], Optional[str]]]:
+    """(SHA-256, error) of every file, hashed from a pool of threads."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    def hash_one(path: str) -> Tuple[Optional[str], Optional[str]]:
+        try:
+            return file_hash(path), None
+        except OSError as e:
+            return None, e.strerror or str(e)
+
+    with ThreadPoolExecutor(max(1, threads)) as executor:
+        return list(executor.map(hash_one, paths))
+
+
+class PdfStore:
+    """A content-addressed directory of PDFs.
+
+    In "copy" mode files are copied into the store and made read-only; in
+    "link" mode they are hard-linked when the store is on the same file
+    system, which takes no space but lets edits to the original change the
+    stored file, and copied otherwise.
+    """
+
+    def __init__(self, root: str, mode: str = "copy"):
+        if mode not in STORE_MODES:
+            raise ValueError(f"Unknown store mode {mode}; use {' or '.join(STORE_MODES)}")
+        self.root = os.path.abspath(os.path.expanduser(root))
+        self.mode = mode
+
+    def path_for(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], f"{digest}.pdf")
+
+    def contains(self, path: str) -> bool:
+        return os.path.abspath(path).startswith(os.path.join(self.root, ""))
+
+    def put(self, path: str, digest: Optional[str] = None) -> Tuple[str, int]:
+        """Store the file at path; returns its path in the store and the
+        number of bytes the store grew by, 0 if the content was there."""
+        path = os.path.expanduser(path)
+        if digest is None:
+            digest = file_hash(path)
+        stored = self.path_for(digest)
+        if os.path.exists(stored):
+            return stored, 0
+        folder = os.path.dirname(stored)
+        os.makedirs(folder, exist_ok=True)
+        if self.mode == "link":
+            try:
+                # A link, unlike a copy, cannot be left half written
+                os.link(path, stored)
+                return stored, 0
+            except FileExistsError:
+                return stored, 0
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                    raise
+        # Copied under a temporary name and renamed, so a store file is
+        # always complete
+        import shutil
+        import tempfile
+
+        fd, temporary = tempfile.mkstemp(dir=folder, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as target, open(path, "rb") as source:
+                shutil.copyfileobj(source, target, 1 << 20)
+            os.chmod(temporary, 0o444)
+            os.replace(temporary, stored)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+        return stored, os.path.getsize(stored)
@@ -0,0 +1,155 @@
+import itertools
+import threading
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from PyQt6.QtCore import QObject, QThread, QMetaObject, Qt, pyqtSignal, pyqtSlot
+
+from .config import Config
+from .rpo import ResearchPaperOrganiser
+
+# Work run on the database thread: called with that thread's organiser and a
+# callback reporting (done, total) progress, and returns the job's result
+Task = Callable[[ResearchPaperOrganiser, Callable[[int, int], None]], Any]
+
+
+class DatabaseWorker(QObject):
+    """Runs tasks one at a time with a database connection of its own.
+
+    It lives on its own QThread, and opens its connection there on first
+    use because SQLite connections may only be used by the thread that
+    created them.
+    """
+
+    finished = pyqtSignal(int, object)
+    failed = pyqtSignal(int, object)
+    progress = pyqtSignal(int, int, int)
+
+    def __init__(self, config: Config):
+        super().__init__()
+        self.config = config
+        self.organiser: Optional[ResearchPaperOrganiser] = None
+        self._lock = threading.Lock()
+        self._running: Optional[int] = None
+        self._cancelled: Set[int] = set()
+
+    @pyqtSlot(int, object)
+    def run(self, job: int, task: Task) -> None:
+        with self._lock:
+            # Jobs run in the order they were submitted, so cancellations
+            # of earlier jobs can no longer matter
+            self._cancelled = {j for j in self._cancelled if j >= job}
+            if job in self._cancelled:
+                return
+            self._running = job
+        try:
+            if self.organiser is None:
+                self.organiser = ResearchPaperOrganiser(self.config)
+            result = task(
+                self.organiser, lambda done, total: self.progress.emit(job, done, total)
+            )
+        except Exception as e:
+            if self._finish(job):
+                self.failed.emit(job, e)
+        else:
+            if self._finish(job):
+                self.finished.emit(job, result)
+
+    def _finish(self, job: int) -> bool:
+        # False if the job was cancelled while it ran
+        with self._lock:
+            self._running = None
+            return job not in self._cancelled
+
+    def cancel(self, job: int) -> None:
+        # Called from the GUI thread. A running query is aborted with
+        # interrupt(), the one connection method that is safe to call from
+        # another thread; a queued job is skipped when its turn comes
+        with self._lock:
+            self._cancelled.add(job)
+            if self._running == job and self.organiser is not None:
+                self.organiser.conn.interrupt()
+
+    @pyqtSlot()
+    def close(self) -> None:
+        if self.organiser is not None:
+            self.organiser.close()
+            self.organiser = None
+
+
+class DatabaseClient(QObject):
+    """Submits tasks to a DatabaseWorker and calls back on the GUI thread.
+
+    Callbacks of a cancelled job are never called, so a superseded search
+    cannot overwrite the results of the one that replaced it.
+    """
+
+    busy = pyqtSignal(bool)
+    progress = pyqtSignal(int, int)
+    _submit = pyqtSignal(int, object)
+
+    def __init__(self, config: Config, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self._thread = QThread()
+        self.worker = DatabaseWorker(config)
+        self.worker.moveToThread(self._thread)
+        # The worker lives on another thread, so these are queued connections
+        self._submit.connect(self.worker.run)
+        self.worker.finished.connect(self._finished)
+        self.worker.failed.connect(self._failed)
+        self.worker.progress.connect(self._progress)
+        self._jobs: Dict[int, Tuple[Optional[Callable], Optional[Callable], bool]] = {}
+        self._job_ids = itertools.count(1)
+        self._thread.start()
+
+    def submit(
+        self,
+        task: Task,
+        on_result: Optional[Callable[[Any], None]] = None,
+        on_error: Optional[Callable[[Exception], None]] = None,
+        report_progress: bool = False,
+    ) -> int:
+        job = next(self._job_ids)
+        self._jobs[job] = (on_result, on_error, report_progress)
+        if len(self._jobs) == 1:
+            self.busy.emit(True)
+        self._submit.emit(job, task)
+        return job
+
+    def cancel(self, job: int) -> None:
+        # Only meant for read-only tasks: an interrupted write is rolled back
+        # by SQLite but the task gets no chance to clean up after itself
+        if job in self._jobs:
+            self.worker.cancel(job)
+            self._done(job)
+
+    def _done(self, job: int):
+        callbacks = self._jobs.pop(job, None)
+        if callbacks is not None and not self._jobs:
+            self.busy.emit(False)
+        return callbacks
+
+    def _finished(self, job: int, result: Any) -> None:
+        callbacks = self._done(job)
+        if callbacks and callbacks[0]:
+            callbacks[0](result)
+
+    def _failed(self, job: int, error: Exception) -> None:
+        callbacks = self._done(job)
+        if callbacks and callbacks[1]:
+            callbacks[1](error)
+
+    def _progress(self, job: int, done: int, total: int) -> None:
+        callbacks = self._jobs.get(job)
+        if callbacks and callbacks[2]:
+            self.progress.emit(done, total)
+
+    def close(self) -> None:
+        for job in list(self._jobs):
+            self.cancel(job)
+        # Close the connection on the thread that owns it, after any task
+        # still running there
+        QMetaObject.invokeMethod(
+            self.worker, "close", Qt.ConnectionType.BlockingQueuedConnection
+        )
+        self._thread.quit()
+        self._thread.wait()
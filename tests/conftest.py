@@ -0,0 +1,22 @@
+import pytest
+
+from rpo.config import Config
+from rpo.rpo import ResearchPaperOrganiser
+
+
+@pytest.fixture
+def organiser(tmp_path):
+    organiser = ResearchPaperOrganiser(Config(db_str=str(tmp_path / "papers.db")))
+    yield organiser
+    organiser.close()
+
+
+def make_entry(key: str, title: str, authors: str = "Smith, John", year: int = 2020) -> str:
+    return (
+        f"@article{{{key},\n"
+        f"  title = {{{title}}},\n"
+        f"  author = {{{authors}}},\n"
+        f"  year = {{{year}}},\n"
+        f"  journal = {{J. Chem. Phys.}}\n"
+        f"}}"
+    )
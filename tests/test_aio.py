@@ -0,0 +1,146 @@
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+
+from conftest import make_entry
+from rpo.aio import AsyncResearchPaperOrganiser
+from rpo.config import Config
+from rpo.rpo import ResearchPaperOrganiser
+
+
+@pytest.fixture
+def config(tmp_path):
+    config = Config(db_str=str(tmp_path / "papers.db"))
+    organiser = ResearchPaperOrganiser(config)
+    for i in range(30):
+        organiser.add_paper(make_entry(f"key{i}", f"Water cluster {i}"), f"{i}.pdf", ["water"])
+    organiser.close()
+    return config
+
+
+def run(config, body, readers=2):
+    async def main():
+        async with AsyncResearchPaperOrganiser(config, readers=readers) as library:
+            return await body(library)
+
+    return asyncio.run(main())
+
+
+def test_concurrent_searches(config):
+    async def body(library):
+        return await asyncio.gather(*[library.search_papers("water") for _ in range(10)])
+
+    results = run(config, body)
+    assert [len(papers) for papers in results] == [30] * 10
+
+
+def test_readers_see_committed_writes(config):
+    async def body(library):
+        await library.add_paper(make_entry("new", "Ice nucleation"), "new.pdf", ["ice"])
+        papers = await library.search_papers("ice")
+        details = await library.get_paper_details(papers[0].id)
+        await library.remove_paper(papers[0].id)
+        return papers, details, await library.search_papers("ice")
+
+    papers, details, after = run(config, body)
+    assert [paper.title for paper in papers] == ["Ice nucleation"]
+    assert details.keywords == ["ice"]
+    assert after == []
+
+
+def test_streams_hold_one_reader(config, monkeypatch):
+    monkeypatch.setattr("rpo.aio.FETCH_SIZE", 7)
+
+    async def body(library):
+        titles = [paper.title async for paper in library.iter_search("water", limit=20)]
+        # A stream left early gives its reader back
+        async for paper in library.iter_papers():
+            break
+        return titles, await library.list_all_papers()
+
+    titles, papers = run(config, body, readers=1)
+    assert len(titles) == 20
+    assert len(papers) == 30
+
+
+def test_reads_wait_for_a_free_reader(config, monkeypatch):
+    active = []
+    most = []
+    lock = threading.Lock()
+    search = ResearchPaperOrganiser.search_papers
+
+    def counted(organiser, query):
+        with lock:
+            active.append(query)
+            most.append(len(active))
+        try:
+            return search(organiser, query)
+        finally:
+            with lock:
+                active.remove(query)
+
+    monkeypatch.setattr(ResearchPaperOrganiser, "search_papers", counted)
+
+    async def body(library):
+        return await asyncio.gather(*[library.search_papers(f"cluster {i}") for i in range(12)])
+
+    run(config, body, readers=3)
+    assert max(most) <= 3
+
+
+def test_cancelled_read_is_interrupted(config, monkeypatch):
+    started = threading.Event()
+
+    def slow(organiser, query):
+        started.set()
+        # Runs until interrupted
+        organiser.conn.execute(
+            "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) "
+            "SELECT COUNT(*) FROM n"
+        ).fetchone()
+
+    monkeypatch.setattr(ResearchPaperOrganiser, "search_papers", slow)
+
+    async def body(library):
+        task = asyncio.ensure_future(library.search_papers("water"))
+        while not started.is_set():
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # The interrupted connection is back in the pool and still works
+        return await library.list_all_papers()
+
+    assert len(run(config, body, readers=1)) == 30
+
+
+def test_cancelled_write_completes(config):
+    async def body(library):
+        task = asyncio.ensure_future(
+            library.add_paper(make_entry("late", "Late arrival"), "late.pdf", [])
+        )
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return await library.search_papers("arrival")
+
+    assert [paper.title for paper in run(config, body)] == ["Late arrival"]
+
+
+def test_errors_reach_the_caller(config):
+    async def body(library):
+        with pytest.raises(ValueError):
+            await library.add_paper(make_entry("key0", "Water cluster 0"), "0.pdf", [])
+        with pytest.raises(sqlite3.OperationalError):
+            await library._read(lambda organiser: organiser.conn.execute("SELECT nothing"))
+        return await library.search_papers("water")
+
+    assert len(run(config, body)) == 30
+
+
+def test_needs_a_reader(config):
+    with pytest.raises(ValueError):
+        AsyncResearchPaperOrganiser(config, readers=0)
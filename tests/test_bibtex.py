@@ -0,0 +1,132 @@
+import io
+from pathlib import Path
+
+import pytest
+
+from rpo.bibtex import (
+    MONTHS,
+    author_names,
+    iter_entries,
+    latex_to_unicode,
+    parse_entry,
+    split_authors,
+)
+
+DATA = Path(__file__).parent / "data"
+
+
+def entries(text, chunk_size=1 << 16):
+    return list(iter_entries(io.StringIO(text), chunk_size=chunk_size))
+
+
+def test_nested_braces():
+    text = "@article{a, title = {The {DNA} of {{nested}} braces}}"
+    assert entries(text) == [("article", text)]
+
+
+def test_parenthesis_delimited_entry():
+    text = "@article(a, title = {x (y)})"
+    assert entries("junk " + text + " more") == [("article", text)]
+
+
+def test_stray_at_between_entries():
+    text = "% contact me@example.com\n@misc{a, title={x}}\nmail@host @book{b, title={y}}"
+    assert [t for t, _ in entries(text)] == ["misc", "book"]
+    assert entries(text)[1][1] == "@book{b, title={y}}"
+
+
+def test_unterminated_last_block():
+    text = "@article{a, title={x}}\n@article{b, title={y}\n"
+    result = entries(text)
+    assert result[0] == ("article", "@article{a, title={x}}")
+    assert result[1] == ("article", "@article{b, title={y}\n")
+
+
+def test_entries_spanning_chunk_boundaries():
+    blocks = [f"@article{{k{i}, title = {{Title {{{i}}}}}}}" for i in range(50)]
+    text = "\n\n".join(blocks)
+    for chunk_size in (1, 3, 7, 64):
+        assert [raw for _, raw in entries(text, chunk_size)] == blocks
+
+
+def test_string_and_comment_types_are_reported():
+    text = '@string{jcp = "J. Chem. Phys."}\n@comment{x}\n@ARTICLE{a, journal = jcp}'
+    assert [t for t, _ in entries(text)] == ["string", "comment", "article"]
+
+
+def test_parse_entry_agrees_with_bibtexparser():
+    from bibtexparser.bparser import BibTexParser
+
+    parser = BibTexParser(common_strings=True)
+    parser.expect_multiple_parse = True
+    strings = MONTHS
+    fast = 0
+    with open(DATA / "entries.bib", encoding="utf-8") as f:
+        for entry_type, text in iter_entries(f):
+            if entry_type == "string":
+                parser.parse(text)
+                strings = dict(parser.bib_database.strings)
+                continue
+            expected = parser.parse(text).entries.pop()
+            parsed = parse_entry(text, strings)
+            if parsed is not None:
+                fast += 1
+                assert parsed == expected
+    assert fast == 47
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "@article{k, journal = jcp}",
+        "@article{k, title = {x},\n  % a comment\n  year = {2000}}",
+        "@article{k, title = {x}} trailing text",
+        "@article{k, Title = {A}, title = {B}}",
+        "@article{k, title = {unbalanced}",
+        "@weird{k, title = {x}}",
+        "@article{k, title = {x}}\n@article{l, title = {y}}",
+    ],
+)
+def test_parse_entry_leaves_the_rest_to_bibtexparser(text):
+    assert parse_entry(text) is None
+
+
+def test_parse_entry_values():
+    text = '@Article(k,\n  Title = "A {B}" # " c\n     d",\n  month = DEC,\n  year = 1999,\n)'
+    assert parse_entry(text) == {
+        "title": "A {B} c\nd",
+        "month": "December",
+        "year": "1999",
+        "ENTRYTYPE": "article",
+        "ID": "k",
+    }
+    assert parse_entry("@article{k, month = jan}", strings=None) is None
+
+
+def test_latex_to_unicode():
+    assert latex_to_unicode('Schr{\\"o}dinger') == "Schrödinger"
+    assert latex_to_unicode("Erd\\H{o}s and R{\\'e}nyi") == "Erdős and Rényi"
+    assert latex_to_unicode("{\\v{C}}{\\'{\\i}}{\\v{z}}ek") == "Čížek"
+    assert latex_to_unicode("Gl\\\"{o}{\\ss} and {\\AA}ngstr\\\"om") == "Glöß and Ångström"
+    assert latex_to_unicode("The {DNA}\n   double~helix") == "The DNA double helix"
+    # Math and other commands keep their text and arguments
+    assert latex_to_unicode("R\\&D on \\emph{ab initio} {$\\alpha$}-helices") == (
+        "R&D on \\emph{ab initio} $\\alpha$-helices"
+    )
+
+
+def test_split_authors():
+    assert split_authors("Watson, James D and\n  Crick, Francis HC") == [
+        "Watson, James D",
+        "Crick, Francis HC",
+    ]
+    assert split_authors("{Barnes and Noble} AND Anderson, A and others") == [
+        "{Barnes and Noble}",
+        "Anderson, A",
+        "others",
+    ]
+    assert split_authors("") == []
+    assert author_names("{Barnes and Noble} and M{\\o}ller, C") == [
+        "Barnes & Noble",
+        "Møller, C",
+    ]
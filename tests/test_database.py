@@ -0,0 +1,58 @@
+from conftest import make_entry
+from rpo import rpo as rpo_module
+from rpo import migrations
+from rpo.config import Config
+from rpo.database import connect
+from rpo.migrations import SCHEMA_VERSION, migrate, schema_version
+from rpo.rpo import ResearchPaperOrganiser
+
+
+def test_connection_settings(organiser):
+    conn = organiser.conn
+    assert conn.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+    assert conn.execute("PRAGMA foreign_keys").fetchone() == (1,)
+    # NORMAL
+    assert conn.execute("PRAGMA synchronous").fetchone() == (1,)
+
+
+def test_readers_do_not_block_writers(organiser, monkeypatch):
+    for key in "abc":
+        organiser.add_paper(make_entry(key, f"Paper {key}"), f"{key}.pdf", [])
+    monkeypatch.setattr(rpo_module, "FETCH_SIZE", 1)
+    # A half-read listing keeps its read transaction open
+    papers = organiser.iter_papers()
+    first = next(papers)
+
+    other = ResearchPaperOrganiser(organiser.config)
+    other.add_paper(make_entry("d", "Paper d"), "d.pdf", [])
+    other.close()
+
+    # The listing carries on from the snapshot it started with
+    assert len([first, *papers]) == 3
+    assert len(organiser.list_all_papers()) == 4
+
+
+def test_migration_done_by_another_connection(tmp_path, monkeypatch):
+    path = tmp_path / "papers.db"
+    first, second = connect(path), connect(path)
+    # The second connection saw an empty database, then waited for the lock
+    # while the first migrated it
+    versions = iter([0])
+    monkeypatch.setattr(
+        migrations, "schema_version", lambda conn: next(versions, None) or schema_version(conn)
+    )
+    migrate(first)
+    versions = iter([0])
+    assert migrate(second) == []
+    assert schema_version(second) == SCHEMA_VERSION
+    first.close()
+    second.close()
+
+
+def test_close_checkpoints_the_wal(tmp_path):
+    organiser = ResearchPaperOrganiser(Config(db_str=str(tmp_path / "papers.db")))
+    organiser.add_paper(make_entry("a", "Paper a"), "a.pdf", [])
+    organiser.close()
+    # The file alone is the whole library, e.g. to be copied or moved
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["papers.db"]
+    organiser.close()
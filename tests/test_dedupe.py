@@ -0,0 +1,93 @@
+import pytest
+
+from conftest import make_entry
+from rpo.bibtex import content_hash, normalise_doi
+from rpo.config import Config
+from rpo.migrations import migrate
+from rpo.rpo import ResearchPaperOrganiser
+
+ENTRY = {
+    "ENTRYTYPE": "article",
+    "ID": "smith2020",
+    "title": "Water  models",
+    "author": "Smith, John",
+    "doi": "10.1000/ABC",
+}
+
+
+def test_content_hash_ignores_layout():
+    reordered = dict(reversed(list(ENTRY.items())))
+    spaced = dict(ENTRY, title="Water\n   models ", doi="https://doi.org/10.1000/abc")
+    assert content_hash(reordered) == content_hash(ENTRY)
+    assert content_hash(spaced) == content_hash(ENTRY)
+    assert content_hash(dict(ENTRY, ID="other")) != content_hash(ENTRY)
+    assert content_hash(dict(ENTRY, year="2020")) != content_hash(ENTRY)
+
+
+def test_normalise_doi():
+    assert normalise_doi(" https://dx.doi.org/10.1000/ABC ") == "10.1000/abc"
+    assert normalise_doi("doi:10.1/x") == "10.1/x"
+
+
+def test_reformatted_entry_is_a_duplicate(organiser):
+    organiser.add_paper(make_entry("a", "Water models"), "a.pdf", [])
+    reformatted = (
+        "@ARTICLE{a, journal={J. Chem. Phys.},\n\n year = {2020}, "
+        "AUTHOR={Smith,   John}, title =   {Water models}}"
+    )
+    with pytest.raises(ValueError, match="already exists"):
+        organiser.add_paper(reformatted, "b.pdf", [])
+
+
+def test_duplicate_check_uses_index(organiser):
+    plan = organiser.cursor.execute(
+        "EXPLAIN QUERY PLAN SELECT 1 FROM bibtex_entries WHERE content_hash = ?", ("x",)
+    ).fetchall()
+    assert "idx_bibtex_entries_content_hash" in plan[0][3]
+
+
+def test_find_duplicates(organiser):
+    organiser.add_paper(
+        "@article{a, title={Water models}, year={2020}, doi={10.1/x}}", "1.pdf", []
+    )
+    organiser.add_paper(
+        "@article{b, title={Other}, year={2020}, doi={https://doi.org/10.1/X}}", "2.pdf", []
+    )
+    organiser.add_paper("@article{c, title={Unique}, year={2020}}", "3.pdf", [])
+    organiser.add_paper("@misc{c, title={Unique too}, year={2021}}", "4.pdf", [])
+    organiser.add_paper("@article{d, title={Water-Models}, year={2020}}", "5.pdf", [])
+    organiser.add_paper("@article{e, title={Water models}, year={1999}}", "6.pdf", [])
+
+    groups = {tuple(g.paper_ids): g.reasons for g in organiser.find_duplicates()}
+    assert groups == {
+        (1, 2, 5): ["same DOI 10.1/x", "same title and year"],
+        (3, 4): ["same citation key c"],
+    }
+
+
+def test_existing_entries_are_backfilled(tmp_path):
+    path = tmp_path / "old.db"
+    organiser = ResearchPaperOrganiser(Config(db_str=str(path)))
+    organiser.add_paper(make_entry("a", "One"), "a.pdf", [])
+    organiser.add_paper(make_entry("b", "Two"), "b.pdf", [])
+    conn = organiser.conn
+    # Roll back to the schema before identity columns, with an exact
+    # duplicate and an unparsable entry that slipped in
+    conn.executescript(
+        """
+        DROP INDEX idx_bibtex_entries_content_hash;
+        UPDATE bibtex_entries SET content_hash = NULL, doi = NULL, citation_key = NULL;
+        INSERT INTO papers (title, year) VALUES ('One', 2020), ('Broken', 2020);
+        INSERT INTO bibtex_entries (paper_id, bibtex)
+            SELECT 3, bibtex FROM bibtex_entries WHERE paper_id = 1;
+        INSERT INTO bibtex_entries (paper_id, bibtex) VALUES (4, 'not bibtex');
+        PRAGMA user_version = 3;
+        """
+    )
+    assert migrate(conn)[0] == "bibtex_identity_columns"
+    rows = conn.execute(
+        "SELECT paper_id, content_hash IS NOT NULL, citation_key FROM bibtex_entries ORDER BY paper_id"
+    ).fetchall()
+    assert rows == [(1, 1, "a"), (2, 1, "b"), (3, 0, "a"), (4, 0, None)]
+    assert [g.paper_ids for g in organiser.find_duplicates()] == [[1, 3]]
+    organiser.close()
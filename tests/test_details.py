@@ -0,0 +1,43 @@
+from conftest import make_entry
+
+
+def test_details_keep_author_order(organiser):
+    # Author ids are assigned alphabetically here, the reverse of BibTeX order
+    organiser.add_paper(make_entry("a", "First", "Adams, A and Brown, B"), "a.pdf", [])
+    organiser.add_paper(
+        make_entry("b", "Second", "Zhou, Z and Brown, B and Adams, A"), "b.pdf", ["md", "dft"]
+    )
+    details = organiser.get_paper_details(2)
+    assert details.title == "Second"
+    assert details.authors == ["Zhou, Z", "Brown, B", "Adams, A"]
+    assert details.keywords == ["md", "dft"]
+    assert details.bibtex.startswith("@article{b,")
+    listed = {paper.id: paper.authors for paper in organiser.list_all_papers()}
+    assert listed[2] == "Zhou, Z et al."
+
+
+def test_collaboration_paper(organiser):
+    authors = [f"Author{n:03d}, A" for n in range(200, 0, -1)]
+    keywords = [f"kw{n}" for n in range(20)]
+    organiser.add_paper(make_entry("big", "Big", " and ".join(authors)), "big.pdf", keywords)
+    details = organiser.get_paper_details(1)
+    assert details.authors == authors
+    assert details.keywords == keywords
+
+
+def test_batch_details(organiser):
+    for key in "abc":
+        organiser.add_paper(make_entry(key, f"Paper {key}"), f"{key}.pdf", [key])
+    details = organiser.get_papers_details([3, 99, 1, 3])
+    assert [(d.id, d.title, d.keywords) for d in details] == [
+        (3, "Paper c", ["c"]),
+        (1, "Paper a", ["a"]),
+    ]
+    assert organiser.get_paper_details(99) is None
+
+
+def test_imported_author_order(organiser, tmp_path):
+    bib = tmp_path / "library.bib"
+    bib.write_text(make_entry("a", "One", "Young, Y and Old, O") + "\n")
+    organiser.import_bibtex_file(str(bib))
+    assert organiser.get_paper_details(1).authors == ["Young, Y", "Old, O"]
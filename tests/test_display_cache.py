@@ -0,0 +1,63 @@
+from conftest import make_entry
+
+
+def labels(organiser):
+    return {paper.id: paper.authors for paper in organiser.list_all_papers()}
+
+
+def test_labels_follow_links(organiser):
+    organiser.add_paper(make_entry("a", "One", "Smith, J"), "a.pdf", [])
+    organiser.add_paper(make_entry("b", "Two", "Smith, J and Doe, A"), "b.pdf", [])
+    organiser.add_paper(make_entry("c", "Three", "Lee, K and Doe, A and Smith, J"), "c.pdf", [])
+    assert labels(organiser) == {1: "Smith, J", 2: "Smith, J & Doe, A", 3: "Lee, K et al."}
+
+    organiser.conn.execute("UPDATE authors SET name = 'Smyth, J' WHERE name = 'Smith, J'")
+    organiser.conn.execute("DELETE FROM paper_authors WHERE paper_id = 3 AND position = 0")
+    assert labels(organiser) == {1: "Smyth, J", 2: "Smyth, J & Doe, A", 3: "Doe, A & Smyth, J"}
+    assert organiser.check_display_cache() == []
+
+
+def test_labels_survive_renumbering(organiser):
+    for key, authors in (("a", "Adams, A"), ("b", "Brown, B"), ("c", "Clark, C")):
+        organiser.add_paper(make_entry(key, key.upper(), authors), f"{key}.pdf", [])
+    organiser.remove_paper(1)
+    assert labels(organiser) == {1: "Brown, B", 2: "Clark, C"}
+    assert organiser.check_display_cache() == []
+
+
+def test_sort_by_authors(organiser):
+    for key, authors in (("a", "brown, B"), ("b", "Adams, A"), ("c", "Clark, C")):
+        organiser.add_paper(make_entry(key, key.upper(), authors), f"{key}.pdf", [])
+    papers = organiser.iter_papers(sort="authors")
+    assert [paper.authors for paper in papers] == ["Adams, A", "brown, B", "Clark, C"]
+
+
+def test_check_and_rebuild(organiser):
+    organiser.add_paper(make_entry("a", "One", "Smith, J and Doe, A"), "a.pdf", [])
+    organiser.add_paper(make_entry("b", "Two", "Lee, K"), "b.pdf", [])
+    organiser.conn.execute("UPDATE papers SET author_label = 'stale' WHERE id = 2")
+    organiser.conn.commit()
+    assert organiser.check_display_cache() == [2]
+    assert organiser.rebuild_display_cache() == 2
+    assert organiser.check_display_cache() == []
+    assert labels(organiser)[2] == "Lee, K"
+
+
+def test_many_authors(organiser, tmp_path):
+    authors = " and ".join(f"Author{n}, A" for n in range(300))
+    organiser.add_paper(make_entry("a", "One", authors), "a.pdf", [])
+    bib = tmp_path / "b.bib"
+    bib.write_text(make_entry("b", "Two", "Lee, K and " + authors))
+    organiser.import_bibtex_file(str(bib))
+    assert labels(organiser) == {1: "Author0, A et al.", 2: "Lee, K et al."}
+    assert organiser.check_display_cache() == []
+    # Only writers inserting links pause the triggers, and only meanwhile
+    assert organiser.conn.execute("SELECT COUNT(*) FROM bulk_author_links").fetchone() == (0,)
+
+
+def test_labels_of_names_written_before_decoding(organiser):
+    organiser.add_paper(make_entry("a", "One", "Lee, K"), "a.pdf", [])
+    # Split on " and " only, as the label triggers split the authors column
+    organiser.conn.execute("UPDATE authors SET name = 'Smith, J AND Doe, A'")
+    assert labels(organiser) == {1: "Smith, J AND Doe, A"}
+    assert organiser.check_display_cache() == []
@@ -0,0 +1,76 @@
+import csv
+import io
+import json
+
+import pytest
+
+from conftest import make_entry
+from rpo.export import export_papers
+
+
+@pytest.fixture
+def library(organiser):
+    organiser.add_paper(make_entry("a", "Quantum dots", "Smith, J and Doe, A"), "a.pdf", ["qd"])
+    organiser.add_paper(make_entry("b", "Water models", "Jones, A"), "b.pdf", ["md", "water"])
+    organiser.add_paper(make_entry("c", "Dots and lines", "Brown, T"), "c.pdf", ["qd"])
+    return organiser
+
+
+def test_bib_is_verbatim(library, tmp_path):
+    output = tmp_path / "out.bib"
+    assert export_papers(library, "bib", str(output)) == 3
+    assert output.read_text() == "".join(
+        make_entry(key, title, authors) + "\n\n"
+        for key, title, authors in (
+            ("a", "Quantum dots", "Smith, J and Doe, A"),
+            ("b", "Water models", "Jones, A"),
+            ("c", "Dots and lines", "Brown, T"),
+        )
+    )
+
+
+def test_jsonl(library, tmp_path):
+    output = tmp_path / "out.jsonl"
+    export_papers(library, "jsonl", str(output))
+    rows = [json.loads(line) for line in output.read_text().splitlines()]
+    assert rows[0] == {
+        "id": 1,
+        "title": "Quantum dots",
+        "authors": ["Smith, J", "Doe, A"],
+        "year": 2020,
+        "journal": "J. Chem. Phys.",
+        "keywords": ["qd"],
+        "doi": None,
+        "citation_key": "a",
+        "file_path": "a.pdf",
+    }
+    assert sorted(rows[1]["keywords"]) == ["md", "water"]
+
+
+def test_csv_to_stdout(library, capsys):
+    assert export_papers(library, "csv") == 3
+    rows = list(csv.DictReader(io.StringIO(capsys.readouterr().out)))
+    assert [row["title"] for row in rows] == ["Quantum dots", "Water models", "Dots and lines"]
+    assert rows[0]["authors"] == "Smith, J; Doe, A"
+
+
+def test_filters(library, tmp_path):
+    output = tmp_path / "out.jsonl"
+    assert export_papers(library, "jsonl", str(output), query="dots") == 2
+    assert export_papers(library, "jsonl", str(output), keyword="qd") == 2
+    assert export_papers(library, "jsonl", str(output), query="dots", keyword="md") == 0
+    assert export_papers(library, "jsonl", str(output), query="author:jones") == 1
+    assert json.loads(output.read_text())["title"] == "Water models"
+
+
+def test_parquet_needs_a_file(library):
+    with pytest.raises(ValueError, match="--output"):
+        export_papers(library, "parquet")
+
+
+def test_parquet(library, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    output = tmp_path / "out.parquet"
+    assert export_papers(library, "parquet", str(output)) == 3
+    table = pq.read_table(output)
+    assert table.column("authors").to_pylist()[0] == ["Smith, J", "Doe, A"]
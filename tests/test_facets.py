@@ -0,0 +1,88 @@
+import pytest
+
+from conftest import make_entry
+from rpo.rpo import SearchFilters
+
+
+def make_paper(key, title, authors, year, journal):
+    return (
+        f"@article{{{key},\n"
+        f"  title = {{{title}}},\n"
+        f"  author = {{{authors}}},\n"
+        f"  year = {{{year}}},\n"
+        f"  journal = {{{journal}}}\n"
+        f"}}"
+    )
+
+
+@pytest.fixture
+def library(organiser):
+    for key, title, authors, year, journal, keywords in (
+        ("a", "Water clusters", "Smith, J and Doe, A", 2010, "Nature", ["water", "md"]),
+        ("b", "Water dimers", "Smith, J", 2012, "nature", ["water"]),
+        ("c", "Ice surfaces", "Lee, K and Smith, J", 2012, "Science", ["ice", "md"]),
+        ("d", "Water in ice", "Doe, A", 2015, "J. Chem. Phys.", ["water", "ice"]),
+    ):
+        organiser.add_paper(
+            make_paper(key, title, authors, year, journal), f"{key}.pdf", keywords
+        )
+    return organiser
+
+
+def test_whole_library(library):
+    facets = library.facets()
+    assert facets["year"] == [(2015, 1), (2012, 2), (2010, 1)]
+    # Journals differing in case are one
+    assert facets["journal"][0][1] == 2
+    assert facets["journal"][0][0].lower() == "nature"
+    assert facets["author"] == [("Smith, J", 3), ("Doe, A", 2), ("Lee, K", 1)]
+    assert facets["keyword"] == [("water", 3), ("ice", 2), ("md", 2)]
+
+
+def test_search_and_filters(library):
+    facets = library.facets("water", SearchFilters(year_from=2011))
+    assert facets["year"] == [(2015, 1), (2012, 1)]
+    assert facets["author"] == [("Doe, A", 1), ("Smith, J", 1)]
+
+    facets = library.facets(filters=SearchFilters(journal="NATURE"), names=["author"])
+    assert facets == {"author": [("Smith, J", 2), ("Doe, A", 1)]}
+
+    assert library.facets("water", names=["keyword"], limit=1) == {"keyword": [("water", 3)]}
+    with pytest.raises(ValueError):
+        library.facets(names=["colour"])
+
+
+def test_counts_follow_changes(library):
+    library.remove_paper(1)
+    library.add_paper(make_entry("e", "Snow", "Lee, K"), "e.pdf", ["ice"])
+    facets = library.facets(names=["author", "keyword"])
+    assert facets["author"] == [("Lee, K", 2), ("Smith, J", 2), ("Doe, A", 1)]
+    assert facets["keyword"] == [("ice", 3), ("water", 2), ("md", 1)]
+    # The stored counts agree with counting the links
+    assert facets["author"] == library.facets(
+        filters=SearchFilters(year_from=0), names=["author"]
+    )["author"]
+
+
+def test_filtered_listing_and_search(library):
+    filters = SearchFilters(year_from=2011, year_to=2014)
+    assert [paper.title for paper in library.iter_papers(filters=filters)] == [
+        "Ice surfaces",
+        "Water dimers",
+    ]
+    journal = SearchFilters(journal="nature")
+    titles = {paper.title for paper in library.iter_search("water", filters=journal)}
+    assert titles == {"Water clusters", "Water dimers"}
+    assert [
+        paper.title for paper in library.iter_search("water", sort="year", filters=journal)
+    ] == ["Water clusters", "Water dimers"]
+    # Filtered and unfiltered results are cached apart
+    assert len(library.search_papers("water")) == 3
+
+
+def test_rebuild_recounts(library):
+    library.conn.execute("UPDATE authors SET paper_count = 0")
+    library.conn.commit()
+    assert library.facets(names=["author"]) == {"author": []}
+    library.rebuild_display_cache()
+    assert library.facets(names=["author"])["author"][0] == ("Smith, J", 3)
@@ -0,0 +1,82 @@
+import hashlib
+
+from conftest import make_entry
+
+
+def add(organiser, key, file_path, keywords=("water",)):
+    organiser.add_paper(make_entry(key, f"Paper {key}", f"Author {key}"), file_path, keywords)
+
+
+def test_clean_library(organiser, tmp_path):
+    pdf = tmp_path / "a.pdf"
+    pdf.write_bytes(b"%PDF-1.4")
+    add(organiser, "a", str(pdf))
+    check = organiser.check_library(hash_files=True)
+    assert check.ok
+    assert check.files == 1
+    assert set(check.orphans.values()) == {0}
+
+
+def test_missing_and_changed_files(organiser, tmp_path):
+    kept = tmp_path / "kept.pdf"
+    kept.write_bytes(b"%PDF-1.4 original")
+    add(organiser, "a", str(kept))
+    add(organiser, "b", str(tmp_path / "gone.pdf"))
+    add(organiser, "c", "")
+    add(organiser, "d", str(tmp_path))
+    # As recorded by index_pdfs
+    organiser.conn.execute(
+        "INSERT INTO pdf_files (paper_id, file_path, content_hash) VALUES (1, ?, ?)",
+        (str(kept), hashlib.sha256(b"%PDF-1.4 original").hexdigest()),
+    )
+    organiser.conn.commit()
+    kept.write_bytes(b"%PDF-1.4 edited")
+
+    check = organiser.check_library(threads=3)
+    assert check.files == 3
+    assert [(paper_id, message) for paper_id, _, message in check.missing] == [
+        (2, "not found"),
+        (4, "not found"),
+    ]
+    assert check.changed == []
+    assert organiser.check_library(hash_files=True).changed == [(1, str(kept))]
+    assert not check.ok
+
+
+def test_orphans_are_found_and_repaired(organiser, tmp_path):
+    add(organiser, "a", "")
+    add(organiser, "b", "")
+    # Rows a delete with foreign keys off leaves behind
+    organiser.conn.execute("PRAGMA foreign_keys = OFF")
+    organiser.conn.execute("DELETE FROM papers WHERE id = 2")
+    organiser.conn.execute("INSERT INTO paper_keywords VALUES (1, 99)")
+    organiser.conn.commit()
+    organiser.conn.execute("PRAGMA foreign_keys = ON")
+    organiser.conn.execute("INSERT INTO keywords (keyword) VALUES ('unused')")
+    organiser.conn.commit()
+
+    check = organiser.check_library()
+    found = {kind: count for kind, count in check.orphans.items() if count}
+    assert found == {
+        "paper_authors without a paper": 1,
+        "paper_keywords without a paper": 1,
+        "paper_keywords without a keyword": 1,
+        "bibtex_entries without a paper": 1,
+        "keywords without papers": 1,
+    }
+
+    deleted = organiser.repair_library(vacuum=True)
+    # The author of the deleted paper is an orphan once its link is gone
+    assert {kind: count for kind, count in deleted.items() if count} == dict(
+        found, **{"authors without papers": 1}
+    )
+    assert organiser.check_library().ok
+    assert [paper.title for paper in organiser.search_papers("water")] == ["Paper a"]
+
+
+def test_compacting_deletes_nothing(organiser):
+    add(organiser, "a", "")
+    organiser.conn.execute("INSERT INTO keywords (keyword) VALUES ('unused')")
+    organiser.conn.commit()
+    organiser.compact_library()
+    assert organiser.check_library().orphans["keywords without papers"] == 1
@@ -0,0 +1,68 @@
+import pytest
+
+from conftest import make_entry
+from rpo.fuzzy import fold, similarity
+
+
+@pytest.fixture
+def library(organiser):
+    for key, title, authors in (
+        ("a", "Wave mechanics", "Schrödinger, Erwin"),
+        ("b", "Lunar surface samples", "Armstrong, Neil and Aldrin, Buzz"),
+        ("c", "Strong coupling", "Armstead, Ray"),
+        ("d", "Protein folding", "Smith, John"),
+    ):
+        organiser.add_paper(make_entry(key, title, authors), f"{key}.pdf", [])
+    return organiser
+
+
+def titles(papers):
+    return [paper.title for paper in papers]
+
+
+def test_folding_and_similarity():
+    assert fold("Schrödinger Łukasz ØRSTED") == "schrodinger lukasz orsted"
+    assert similarity("armstrong", "Armstrong") == 1.0
+    assert similarity("armstong", "armstrong") > similarity("armstong", "armstead")
+    assert similarity("armstrong", "water") == 0.0
+
+
+def test_marked_terms_forgive_typos(library):
+    # Only the closest words stand in for a mistyped one
+    assert titles(library.iter_search("armstong~")) == ["Lunar surface samples"]
+    assert titles(library.iter_search("armste~")) == ["Strong coupling"]
+    assert titles(library.iter_search("author:schrodinger~")) == ["Wave mechanics"]
+    assert titles(library.iter_search("protien~ foldng~")) == ["Protein folding"]
+    # Unmarked terms still match exactly
+    assert titles(library.iter_search("armstong")) == []
+
+
+def test_fuzzy_search(library):
+    assert titles(library.iter_search("Schrodinger wave", fuzzy=True)) == ["Wave mechanics"]
+    assert titles(library.iter_search("title:protien", fuzzy=True)) == ["Protein folding"]
+    # Prefixes are still matched as typed
+    assert titles(library.iter_search("prot", fuzzy=True)) == ["Protein folding"]
+    # Only author and title words are corrected
+    assert titles(library.iter_search("journal:jurnal", fuzzy=True)) == []
+
+
+def test_similar_terms_ranked(library):
+    terms = library.similar_terms("armstong")
+    assert terms[0] == ("armstrong", pytest.approx(similarity("armstong", "armstrong")))
+    assert [term for term, _ in terms][:2] == ["armstrong", "armstead"]
+    assert all(a[1] >= b[1] for a, b in zip(terms, terms[1:]))
+    assert library.similar_terms("xyzzy") == []
+
+
+def test_vocabulary_follows_the_library(library):
+    library.add_paper(make_entry("e", "Quasicrystals", "Shechtman, Dan"), "e.pdf", [])
+    assert titles(library.iter_search("schechtman~")) == ["Quasicrystals"]
+    assert library.facets("quasicrystal~", names=["author"]) == {
+        "author": [("Shechtman, Dan", 1)]
+    }
+
+    library.conn.execute("DELETE FROM fuzzy_terms")
+    library.conn.commit()
+    assert library.similar_terms("armstrong") == []
+    library.rebuild_display_cache()
+    assert library.similar_terms("armstrong")[0][0] == "armstrong"
@@ -0,0 +1,180 @@
+import os
+import time
+
+import pytest
+
+from conftest import make_entry
+
+pytest.importorskip("PyQt6.QtWidgets")
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt6.QtCore import Qt  # noqa: E402
+from PyQt6.QtWidgets import QApplication  # noqa: E402
+
+from rpo.gui import MainWindow, PaperTableModel  # noqa: E402
+from rpo.worker import DatabaseClient  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QApplication.instance() or QApplication([])
+
+
+def wait_for(app, condition, timeout=10):
+    # Deliver the worker's queued signals until the condition holds
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting for the worker"
+        app.processEvents()
+        time.sleep(0.001)
+
+
+@pytest.fixture
+def library(organiser):
+    for number in range(25):
+        organiser.add_paper(
+            make_entry(f"k{number}", f"Paper {number:02}", year=2000 + number % 5),
+            f"{number}.pdf",
+            [],
+        )
+    return organiser
+
+
+@pytest.fixture
+def client(app, library):
+    client = DatabaseClient(library.config)
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def model(app, client, monkeypatch):
+    monkeypatch.setattr(PaperTableModel, "PAGE_SIZE", 10)
+    model = PaperTableModel(client)
+    model.set_query(
+        lambda organiser, sort, descending: organiser.iter_papers(
+            sort=sort, descending=descending
+        )
+    )
+    wait_for(app, lambda: model.rowCount() > 0)
+    return model
+
+
+def column(model, number):
+    return [model.index(row, number).data() for row in range(model.rowCount())]
+
+
+def test_fetches_in_pages(app, model):
+    assert model.rowCount() == 10
+    while model.canFetchMore():
+        model.fetchMore()
+        # One page in flight at a time
+        assert not model.canFetchMore()
+        wait_for(app, lambda: model.canFetchMore() or model.rowCount() == 25)
+    assert model.rowCount() == 25
+
+
+def test_sorts_in_sql(app, model):
+    model.sort(4, Qt.SortOrder.DescendingOrder)
+    wait_for(app, lambda: column(model, 4)[0] == "Paper 24")
+    assert column(model, 4) == [f"Paper {n:02}" for n in range(24, 14, -1)]
+    model.sort(-1)
+    wait_for(app, lambda: column(model, 2)[0] == "2004")
+
+
+def test_failed_query_keeps_rows(app, model):
+    errors = []
+    model.error.connect(errors.append)
+
+    def failing(organiser, sort, descending):
+        raise RuntimeError("no index")
+
+    model.set_query(failing)
+    wait_for(app, lambda: errors)
+    assert str(errors[0]) == "no index"
+    assert model.rowCount() == 10
+
+
+def test_runs_on_its_own_thread(app, client, library):
+    import threading
+
+    results = []
+    client.submit(
+        lambda organiser, progress: (threading.get_ident(), organiser is library),
+        results.append,
+    )
+    wait_for(app, lambda: results)
+    thread, same_organiser = results[0]
+    assert thread != threading.get_ident() and not same_organiser
+
+
+def test_cancel_interrupts_running_query(app, client):
+    started, results, errors = [], [], []
+
+    def slow(organiser, progress):
+        started.append(True)
+        # A query that runs until it is interrupted
+        return organiser.conn.execute(
+            "WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n) "
+            "SELECT COUNT(*) FROM n"
+        ).fetchone()
+
+    job = client.submit(slow, results.append, errors.append)
+    wait_for(app, lambda: started)
+    time.sleep(0.05)
+    client.cancel(job)
+    # The worker is free again and the cancelled job reports nothing
+    client.submit(lambda organiser, progress: "next", results.append)
+    wait_for(app, lambda: results)
+    assert results == ["next"] and errors == []
+
+
+def test_superseded_search_is_dropped(app, model):
+    model.set_query(lambda organiser, sort, descending: organiser.iter_search("paper 01"))
+    model.set_query(lambda organiser, sort, descending: organiser.iter_search("paper 02"))
+    wait_for(app, lambda: column(model, 4) == ["Paper 02"])
+    app.processEvents()
+    assert column(model, 4) == ["Paper 02"]
+
+
+def test_import_progress(app, client, tmp_path):
+    path = tmp_path / "library.bib"
+    path.write_text("\n".join(make_entry(f"i{n}", f"Imported {n}") for n in range(30)))
+    progress, reports = [], []
+    client.progress.connect(lambda done, total: progress.append((done, total)))
+    client.submit(
+        lambda organiser, report: organiser.import_bibtex_file(
+            str(path), chunk_size=10, progress=report
+        ),
+        reports.append,
+        report_progress=True,
+    )
+    wait_for(app, lambda: reports)
+    assert reports[0].added == 30
+    size = path.stat().st_size
+    assert progress[-1] == (size, size)
+    assert len(progress) >= 3
+
+
+def test_window_lists_and_searches(app, library):
+    window = MainWindow(library)
+    window.list_all_papers()
+    model = window.papers_list.model()
+    wait_for(app, lambda: model.rowCount() == 25)
+    window.search_input.setText("title:paper 1")
+    window.search_papers()
+    model = window.search_results.model()
+    wait_for(app, lambda: model.rowCount() == 10)
+    assert sorted(column(model, 4)) == [f"Paper {n}" for n in range(10, 20)]
+    window.close()
+
+
+def test_search_as_you_type(app, library):
+    window = MainWindow(library)
+    model = window.search_results.model()
+    for text in ("p", "pa", "paper 0"):
+        window.search_input.setText(text)
+    # Only the text left after the pause is searched
+    wait_for(app, lambda: model.rowCount() == 10)
+    assert sorted(column(model, 4)) == [f"Paper {n:02}" for n in range(10)]
+    window.close()
@@ -0,0 +1,131 @@
+from conftest import make_entry
+
+
+def write_bib(tmp_path, text):
+    path = tmp_path / "library.bib"
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_import_adds_papers_authors_and_keywords(organiser, tmp_path):
+    text = "\n\n".join(
+        make_entry(f"k{i}", f"Paper {i}", "Smith, John and Doe, Jane") for i in range(25)
+    )
+    report = organiser.import_bibtex_file(write_bib(tmp_path, text), ["md"], chunk_size=10)
+
+    assert report.added == 25
+    assert report.errors == []
+    cursor = organiser.cursor
+    assert cursor.execute("SELECT COUNT(*) FROM papers").fetchone()[0] == 25
+    assert cursor.execute("SELECT COUNT(*) FROM authors").fetchone()[0] == 2
+    assert cursor.execute("SELECT COUNT(*) FROM paper_authors").fetchone()[0] == 50
+    assert cursor.execute("SELECT COUNT(*) FROM paper_keywords").fetchone()[0] == 25
+
+
+def test_import_resolves_string_macros(organiser, tmp_path):
+    text = '@string{jcp = "J. Chem. Phys."}\n@article{a, title={T}, year={2001}, journal = jcp}'
+    report = organiser.import_bibtex_file(write_bib(tmp_path, text))
+
+    assert report.added == 1
+    journal = organiser.cursor.execute("SELECT journal FROM papers").fetchone()[0]
+    assert journal == "J. Chem. Phys."
+
+
+def test_import_reports_bad_and_duplicate_entries(organiser, tmp_path):
+    text = "\n".join(
+        [
+            make_entry("good", "Good paper"),
+            "@article{bad, title={Bad year}, year={20x}}",
+            make_entry("good", "Good paper"),
+            "@article{broken, title={never closed}\n",
+        ]
+    )
+    report = organiser.import_bibtex_file(write_bib(tmp_path, text))
+
+    assert report.added == 1
+    assert [(index, key) for index, key, _ in report.errors] == [
+        (2, "bad"),
+        (3, "good"),
+        (4, ""),
+    ]
+    assert "already exists" in report.errors[1][2]
+
+
+def test_import_and_add_detect_each_others_duplicates(organiser, tmp_path):
+    entry = make_entry("a", "Shared paper")
+    organiser.import_bibtex_file(write_bib(tmp_path, "\n\n" + entry + "\n\n"))
+
+    try:
+        organiser.add_paper("  " + entry + "\n", "a.pdf", ["x"])
+    except ValueError as e:
+        assert "already exists" in str(e)
+    else:
+        raise AssertionError("duplicate was not detected")
+
+    other = make_entry("b", "Other paper")
+    organiser.add_paper(other + "\n", "b.pdf", ["x"])
+    report = organiser.import_bibtex_file(write_bib(tmp_path, other))
+    assert report.added == 0
+    assert len(report.errors) == 1
+
+
+def test_failed_entry_retry_keeps_lookup_maps_valid(organiser, tmp_path):
+    # Make one entry fail at insert time so the chunk is retried entry by entry
+    organiser.cursor.execute(
+        """
+        CREATE TRIGGER reject_title BEFORE INSERT ON papers
+        WHEN new.title = 'Rejected'
+        BEGIN
+            SELECT RAISE(ABORT, 'rejected');
+        END
+        """
+    )
+    text = "\n".join(
+        [
+            make_entry("a", "Rejected", "Only, Rejected"),
+            make_entry("b", "Accepted", "Only, Rejected"),
+        ]
+    )
+    report = organiser.import_bibtex_file(write_bib(tmp_path, text))
+
+    assert report.added == 1
+    assert report.errors == [(1, "a", "rejected")]
+    dangling = organiser.cursor.execute(
+        """
+        SELECT COUNT(*) FROM paper_authors pa
+        LEFT JOIN authors a ON pa.author_id = a.id
+        WHERE a.id IS NULL
+        """
+    ).fetchone()[0]
+    assert dangling == 0
+
+
+def test_import_decodes_latex_and_author_lists(organiser, tmp_path):
+    text = (
+        "@article{a, title = {The {DNA} of Schr{\\\"o}dinger},\n"
+        "  author = {{Barnes and Noble} AND M{\\o}ller, C}, year = {2001}}"
+    )
+    organiser.import_bibtex_file(write_bib(tmp_path, text))
+    details = organiser.get_paper_details(1)
+    assert details.title == "The DNA of Schrödinger"
+    assert details.authors == ["Barnes & Noble", "Møller, C"]
+    assert organiser.list_all_papers()[0].authors == "Barnes & Noble & Møller, C"
+
+
+def test_reimport_does_not_parse_known_entries(organiser, tmp_path, monkeypatch):
+    path = write_bib(tmp_path, "\n".join(make_entry(f"k{i}", f"Paper {i}") for i in range(5)))
+    organiser.import_bibtex_file(path)
+
+    import rpo.rpo
+
+    parsed = []
+    parse_entry = rpo.rpo.parse_entry
+    monkeypatch.setattr(
+        rpo.rpo, "parse_entry", lambda *args: parsed.append(args) or parse_entry(*args)
+    )
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("\n" + make_entry("new", "New paper"))
+    report = organiser.import_bibtex_file(path)
+    assert report.added == 1
+    assert [key for _, key, _ in report.errors] == [f"k{i}" for i in range(5)]
+    assert len(parsed) == 1
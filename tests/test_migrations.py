@@ -0,0 +1,168 @@
+import sqlite3
+
+import pytest
+
+from rpo.bibtex import text_hash
+from rpo.config import Config
+from rpo.migrations import MIGRATIONS, SCHEMA_VERSION, migrate, schema_version
+from rpo.rpo import ResearchPaperOrganiser
+
+# Schema and data as written by the first releases: no journal column, no
+# unique names, and every add_paper inserted its authors again
+LEGACY_SCHEMA = """
+CREATE TABLE papers (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT,
+                     year INTEGER, file_path TEXT);
+CREATE TABLE authors (id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE paper_authors (paper_id INTEGER, author_id INTEGER,
+    FOREIGN KEY (paper_id) REFERENCES papers (id),
+    FOREIGN KEY (author_id) REFERENCES authors (id));
+CREATE TABLE keywords (id INTEGER PRIMARY KEY, keyword TEXT);
+CREATE TABLE paper_keywords (paper_id INTEGER, keyword_id INTEGER,
+    FOREIGN KEY (paper_id) REFERENCES papers (id),
+    FOREIGN KEY (keyword_id) REFERENCES keywords (id));
+CREATE TABLE bibtex_entries (paper_id INTEGER, bibtex TEXT,
+    FOREIGN KEY (paper_id) REFERENCES papers (id));
+INSERT INTO papers (title, year, file_path) VALUES ('One', 2001, '1.pdf'), ('Two', 2002, '2.pdf');
+INSERT INTO authors (name) VALUES ('Smith, J'), ('Doe, A'), ('Smith, J'), ('Smith, J');
+INSERT INTO paper_authors VALUES (1, 1), (1, 2), (2, 3), (2, 4);
+INSERT INTO keywords (keyword) VALUES ('md'), ('md');
+INSERT INTO paper_keywords VALUES (1, 1), (2, 2);
+INSERT INTO bibtex_entries VALUES (1, '@article{one}'), (2, '@article{two}');
+"""
+
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    path = tmp_path / "legacy.db"
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.close()
+    return path
+
+
+def test_new_database_is_at_current_version(organiser):
+    assert schema_version(organiser.conn) == SCHEMA_VERSION
+    assert migrate(organiser.conn) == []
+
+
+def test_legacy_database_is_upgraded(legacy_db):
+    conn = sqlite3.connect(legacy_db)
+    applied = migrate(conn)
+    assert applied == [migration.__name__ for migration in MIGRATIONS]
+    assert applied[:4] == [
+        "create_tables",
+        "cascade_paper_deletes",
+        "unique_names_and_link_indexes",
+        "bibtex_identity_columns",
+    ]
+    assert schema_version(conn) == SCHEMA_VERSION
+
+    assert conn.execute("SELECT id, name FROM authors ORDER BY id").fetchall() == [
+        (1, "Smith, J"),
+        (2, "Doe, A"),
+    ]
+    # Positions follow the order the links were written in
+    assert conn.execute("SELECT * FROM paper_authors ORDER BY 1, 2").fetchall() == [
+        (1, 1, 0),
+        (1, 2, 1),
+        (2, 1, 0),
+    ]
+    assert conn.execute("SELECT * FROM paper_keywords ORDER BY 1").fetchall() == [
+        (1, 1),
+        (2, 1),
+    ]
+    # Counted once the duplicate names are merged
+    assert conn.execute("SELECT name, paper_count FROM authors ORDER BY id").fetchall() == [
+        ("Smith, J", 2),
+        ("Doe, A", 1),
+    ]
+    # Names and titles already there can be corrected to
+    assert conn.execute("SELECT term FROM fuzzy_terms ORDER BY term").fetchall() == [
+        ("doe",),
+        ("one",),
+        ("smith",),
+        ("two",),
+    ]
+    # Entries already there are recognised unparsed when imported again
+    assert [
+        text_hash(bibtex) == written
+        for bibtex, written in conn.execute("SELECT bibtex, text_hash FROM bibtex_entries")
+    ] == [True, True]
+    assert "journal" in [row[1] for row in conn.execute("PRAGMA table_info(papers)")]
+
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("INSERT INTO authors (name) VALUES ('Doe, A')")
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM authors WHERE name = 'Doe, A'"
+    ).fetchall()
+    assert "idx_authors_name" in plan[0][3]
+    conn.close()
+
+
+def test_migrate_resumes_and_is_idempotent(legacy_db):
+    conn = sqlite3.connect(legacy_db)
+    # As left by an upgrade interrupted after the first migration
+    MIGRATIONS[0](conn.cursor())
+    conn.execute("PRAGMA user_version = 1")
+    conn.commit()
+    assert migrate(conn) == [migration.__name__ for migration in MIGRATIONS[1:]]
+    assert migrate(conn) == []
+    conn.close()
+
+
+def test_newer_schema_is_refused(tmp_path):
+    path = tmp_path / "future.db"
+    conn = sqlite3.connect(path)
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION + 1}")
+    conn.close()
+    with pytest.raises(RuntimeError, match="newer"):
+        ResearchPaperOrganiser(Config(db_str=str(path)))
+
+
+def test_upgraded_library_is_usable(legacy_db):
+    organiser = ResearchPaperOrganiser(Config(db_str=str(legacy_db)))
+    assert [p.title for p in organiser.search_papers("author:smith")] == ["Two", "One"]
+    organiser.add_paper(
+        "@article{three, title={Three}, author={Smith, J and Smith, J}, year={2003}}",
+        "3.pdf",
+        ["md", "md"],
+    )
+    assert organiser.cursor.execute("SELECT COUNT(*) FROM authors").fetchone() == (2,)
+    organiser.close()
+
+
+def test_stored_fields_are_decoded(tmp_path):
+    organiser = ResearchPaperOrganiser(Config(db_str=str(tmp_path / "papers.db")))
+    organiser.add_paper(
+        '@article{a, title={Schr{\\"o}dinger cats}, author={Schr{\\"o}dinger, Erwin AND Born, M},'
+        " journal={Ann. Phys.}, year={1926}}",
+        "a.pdf",
+        [],
+    )
+    organiser.add_paper('@article{b, title={Waves}, author={Schrödinger, Erwin}}', "b.pdf", [])
+    # As papers were stored before names were decoded
+    organiser.conn.executescript(
+        """
+        UPDATE papers SET title = 'Schr{\\"o}dinger cats' WHERE id = 1;
+        DELETE FROM paper_authors WHERE paper_id = 1 AND position = 1;
+        INSERT INTO authors (name) VALUES ('Schr{\\"o}dinger, Erwin AND Born, M');
+        UPDATE paper_authors SET author_id = last_insert_rowid() WHERE paper_id = 1;
+        DELETE FROM authors WHERE name = 'Born, M';
+        UPDATE papers_fts SET title = 'Schr{\\"o}dinger cats', author = 'Schr{\\"o}dinger'
+        WHERE rowid = 1;
+        """
+    )
+    names = [migration.__name__ for migration in MIGRATIONS]
+    organiser.conn.execute(f"PRAGMA user_version = {names.index('decoded_paper_fields')}")
+    assert organiser.get_paper_details(1).authors == ['Schr{\\"o}dinger, Erwin AND Born, M']
+
+    assert migrate(organiser.conn) == names[names.index("decoded_paper_fields") :]
+    assert organiser.get_paper_details(1).title == "Schrödinger cats"
+    assert organiser.conn.execute("SELECT name FROM authors ORDER BY name").fetchall() == [
+        ("Born, M",),
+        ("Schrödinger, Erwin",),
+    ]
+    assert organiser.facets(names=["author"])["author"][0] == ("Schrödinger, Erwin", 2)
+    assert [paper.id for paper in organiser.search_papers("schrodinger")] == [1, 2]
+    assert organiser.check_display_cache() == []
+    organiser.close()
@@ -0,0 +1,106 @@
+import subprocess
+import sys
+
+import pytest
+
+from conftest import make_entry
+from rpo import rpo as rpo_module
+
+
+@pytest.fixture
+def library(organiser):
+    # Two papers per year, so pages cut through runs of equal years
+    for number in range(10):
+        organiser.add_paper(
+            make_entry(f"k{number}", f"Paper {number}", year=2010 + number // 2),
+            f"{number}.pdf",
+            [],
+        )
+    return organiser
+
+
+def ids(papers):
+    return [paper.id for paper in papers]
+
+
+def test_iter_papers_matches_list(library):
+    papers = library.list_all_papers()
+    assert ids(library.iter_papers()) == ids(papers)
+    assert [paper.year for paper in papers] == sorted(
+        (paper.year for paper in papers), reverse=True
+    )
+
+
+def test_pages_cover_listing(library):
+    everything = ids(library.iter_papers())
+    pages = [ids(library.iter_papers(limit=3, page=page)) for page in range(1, 5)]
+    assert [len(page) for page in pages] == [3, 3, 3, 1]
+    assert sum(pages, []) == everything
+
+
+def test_after_continues_listing(library):
+    everything = ids(library.iter_papers())
+    collected = ids(library.iter_papers(limit=4))
+    while True:
+        page = ids(library.iter_papers(limit=4, after=collected[-1]))
+        if not page:
+            break
+        collected += page
+    assert collected == everything
+
+
+def test_after_unknown_id(library):
+    with pytest.raises(ValueError):
+        library.iter_papers(after=999)
+
+
+def test_streams_in_batches(library, monkeypatch):
+    monkeypatch.setattr(rpo_module, "FETCH_SIZE", 3)
+    papers = library.iter_papers()
+    first = next(papers)
+    # The organiser stays usable while a listing is being consumed
+    library.add_paper(make_entry("new", "Another"), "new.pdf", [])
+    assert first.id not in ids(papers)
+
+
+def test_search_pages(library):
+    results = ids(library.iter_search("paper"))
+    assert len(results) == 10
+    assert ids(library.iter_search("paper", limit=4, page=3)) == results[8:]
+
+
+def test_paper_without_authors(organiser):
+    organiser.add_paper("@misc{x, title = {Anonymous}, year = {2001}}", "x.pdf", [])
+    assert organiser.list_all_papers()[0].authors == ""
+
+
+def test_print_papers_counts(library, capsys):
+    assert library.print_papers(library.iter_papers(limit=2)) == 2
+    assert library.print_papers(iter([]), "Nothing.") == 0
+    assert capsys.readouterr().out.endswith("Nothing.\n")
+
+
+def test_cli_closed_pipe(tmp_path):
+    # `rpo list | head` must not end in a BrokenPipeError traceback
+    script = (
+        "import sys\n"
+        "from rpo.config import Config\n"
+        "from rpo.rpo import ResearchPaperOrganiser\n"
+        "from rpo import __main__ as cli\n"
+        f"db = {str(tmp_path / 'papers.db')!r}\n"
+        "organiser = ResearchPaperOrganiser(Config(db_str=db))\n"
+        "for n in range(2000):\n"
+        "    organiser.add_paper('@misc{k%d, title={T %d}, year={2000}}' % (n, n), '', [])\n"
+        "organiser.close()\n"
+        "cli.load_config = lambda: Config(db_str=db)\n"
+        "sys.argv = ['rpo', 'list']\n"
+        "cli.run()\n"
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-c", script], stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    process.stdout.readline()
+    process.stdout.close()
+    stderr = process.stderr.read()
+    process.wait()
+    assert b"Traceback" not in stderr
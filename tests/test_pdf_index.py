@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+from conftest import make_entry
+
+
+def read_text(path):
+    # Stands in for a PDF extractor; module level so worker processes can use it
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if text.startswith("%broken"):
+        raise ValueError("not a PDF")
+    return text
+
+
+@pytest.fixture
+def library(organiser, tmp_path):
+    for key, title, body in (
+        ("a", "Quantum dots", "photoluminescence of cadmium selenide"),
+        ("b", "Water models", "hydrogen bonds in liquid water"),
+    ):
+        path = tmp_path / f"{key}.pdf"
+        path.write_text(body)
+        organiser.add_paper(make_entry(key, title), str(path), [])
+    return organiser
+
+
+def titles(papers):
+    return sorted(paper.title for paper in papers)
+
+
+def test_index_and_search_text(library):
+    report = library.index_pdfs(extract=read_text)
+    assert (report.indexed, report.unchanged) == (2, 0)
+    assert titles(library.search_papers("text:selen")) == ["Quantum dots"]
+    assert titles(library.search_papers("pdf:hydrogen water")) == ["Water models"]
+    assert library.search_papers("text:hydrogen dots") == []
+
+
+def test_reindex_is_incremental(library, tmp_path):
+    library.index_pdfs(extract=read_text)
+    report = library.index_pdfs(extract=read_text)
+    assert (report.indexed, report.unchanged) == (0, 2)
+
+    # Touched but not changed: hashed again, not extracted again
+    path = tmp_path / "a.pdf"
+    os.utime(path, ns=(0, 0))
+    report = library.index_pdfs(extract=read_text)
+    assert (report.indexed, report.unchanged) == (0, 2)
+
+    path.write_text("gallium arsenide nanowires")
+    report = library.index_pdfs(extract=read_text)
+    assert (report.indexed, report.unchanged) == (1, 1)
+    assert library.search_papers("text:selenide") == []
+    assert titles(library.search_papers("text:arsenide")) == ["Quantum dots"]
+
+    assert library.index_pdfs(extract=read_text, force=True).indexed == 2
+
+
+def test_missing_and_unreadable_files(library, tmp_path):
+    (tmp_path / "a.pdf").write_text("%broken")
+    library.add_paper(make_entry("c", "Gone"), str(tmp_path / "c.pdf"), [])
+    report = library.index_pdfs(extract=read_text)
+    assert report.indexed == 1
+    assert [(id, message) for id, _, message in report.errors] == [(1, "not a PDF")]
+    assert report.missing == [(3, str(tmp_path / "c.pdf"))]
+    # Failures are retried on the next run
+    assert len(library.index_pdfs(extract=read_text).errors) == 1
+
+
+def test_parallel_extraction(library):
+    report = library.index_pdfs(jobs=2, extract=read_text)
+    assert report.indexed == 2
+    assert titles(library.search_papers("text:liquid")) == ["Water models"]
+
+
+def test_removed_paper_leaves_no_text(library):
+    library.index_pdfs(extract=read_text)
+    library.remove_paper(1)
+    assert library.conn.execute("SELECT COUNT(*) FROM pdf_fts").fetchone()[0] == 1
+    assert library.search_papers("text:selenide") == []
+    assert titles(library.search_papers("text:water")) == ["Water models"]
+
+
+def test_no_extractor(library, monkeypatch):
+    monkeypatch.setattr("rpo.rpo.find_extractor", lambda: None)
+    with pytest.raises(RuntimeError, match="pypdf"):
+        library.index_pdfs()
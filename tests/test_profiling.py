@@ -0,0 +1,69 @@
+import json
+import sqlite3
+
+import pytest
+
+from conftest import make_entry
+from rpo import profiling
+from rpo.config import Config
+from rpo.rpo import ResearchPaperOrganiser
+
+
+@pytest.fixture
+def profiler(monkeypatch):
+    # Active for this test only, without the report at exit
+    profiler = profiling.Profiler()
+    monkeypatch.setattr(profiling, "_active", profiler)
+    return profiler
+
+
+@pytest.fixture
+def profiled(tmp_path, profiler):
+    organiser = ResearchPaperOrganiser(Config(db_str=str(tmp_path / "papers.db")))
+    organiser.add_paper(make_entry("a", "Water clusters"), "a.pdf", ["water"])
+    organiser.add_paper(make_entry("b", "Ice surfaces"), "b.pdf", ["ice"])
+    yield organiser
+    organiser.close()
+
+
+def test_off_by_default(organiser):
+    assert profiling.active() is None
+    assert type(organiser.conn) is sqlite3.Connection
+    assert "search_papers" not in vars(organiser)
+
+
+def test_operations_and_statements(profiled, profiler):
+    assert [paper.title for paper in profiled.search_papers("water")] == ["Water clusters"]
+    search = profiler.operations["search_papers"]
+    assert search.calls == 1
+    assert 0 < search.self_time <= search.total
+    assert profiler.operations["add_paper"].calls == 2
+    assert profiler.operations[profiling.SQL_OPERATION].calls > 0
+
+    selects = [
+        stats for sql, stats in profiler.statements.items() if "papers_fts MATCH" in sql
+    ]
+    assert selects and all(stats.plan for stats in selects)
+    assert sum(stats.rows for stats in selects) >= 1
+    assert "search_papers" in profiler.summary()
+
+
+def test_generators_are_timed(profiled, profiler):
+    assert len(list(profiled.iter_papers())) == 2
+    listing = profiler.operations["iter_papers"]
+    assert listing.calls == 1
+    # Each step of the generator adds to the call
+    assert listing.total > 0
+    assert [event["name"] for event in profiler.events].count("iter_papers") == 1
+
+
+def test_trace(profiled, profiler, tmp_path):
+    with profiling.operation("print"):
+        profiled.get_paper_details(1)
+    path = tmp_path / "trace.json"
+    profiler.report(str(path))
+    trace = json.loads(path.read_text())
+    assert trace["operations"]["print"]["calls"] == 1
+    details = next(e for e in trace["events"] if e["name"] == "get_paper_details")
+    assert details["depth"] == 1
+    assert any(statement["plan"] for statement in trace["statements"])
@@ -0,0 +1,132 @@
+import sqlite3
+
+import argparse
+import pytest
+
+from conftest import make_entry
+from rpo.__main__ import parse_id_range
+from rpo.config import Config
+from rpo.rpo import ResearchPaperOrganiser
+
+
+def add_papers(organiser, count):
+    for i in range(1, count + 1):
+        organiser.add_paper(
+            make_entry(f"k{i}", f"Paper {i}", f"Author{i}, A"), f"{i}.pdf", [f"kw{i}"]
+        )
+
+
+def rows(organiser, sql):
+    return organiser.cursor.execute(sql).fetchall()
+
+
+def paper_map(organiser):
+    # id -> (title, author, keyword, bibtex key) through the link tables
+    return {
+        id: (title, author, keyword, "{" + f"k{title.split()[-1]}," in bibtex)
+        for id, title, author, keyword, bibtex in rows(
+            organiser,
+            """
+            SELECT p.id, p.title, a.name, k.keyword, b.bibtex FROM papers p
+            JOIN paper_authors pa ON pa.paper_id = p.id JOIN authors a ON a.id = pa.author_id
+            JOIN paper_keywords pk ON pk.paper_id = p.id JOIN keywords k ON k.id = pk.keyword_id
+            JOIN bibtex_entries b ON b.paper_id = p.id
+            """,
+        )
+    }
+
+
+@pytest.fixture
+def stable(tmp_path):
+    organiser = ResearchPaperOrganiser(
+        Config(db_str=str(tmp_path / "stable.db"), stable_ids=True)
+    )
+    yield organiser
+    organiser.close()
+
+
+def test_stable_ids_survive_removal(stable):
+    add_papers(stable, 5)
+    stable.remove_paper(2)
+
+    papers = paper_map(stable)
+    assert sorted(papers) == [1, 3, 4, 5]
+    assert papers[3] == ("Paper 3", "Author3, A", "kw3", True)
+    # Child rows cascade with the paper
+    for table in ("paper_authors", "paper_keywords", "bibtex_entries"):
+        assert rows(stable, f"SELECT COUNT(*) FROM {table} WHERE paper_id = 2") == [(0,)]
+
+
+def test_renumbering_mode_keeps_links(organiser):
+    add_papers(organiser, 6)
+    assert organiser.remove_papers([2, 4]) == [2, 4]
+
+    papers = paper_map(organiser)
+    assert sorted(papers) == [1, 2, 3, 4]
+    assert [papers[i][0] for i in range(1, 5)] == ["Paper 1", "Paper 3", "Paper 5", "Paper 6"]
+    assert all(author == "Author" + title.split()[-1] + ", A" for title, author, _, _ in papers.values())
+    assert rows(organiser, "SELECT seq FROM sqlite_sequence WHERE name = 'papers'") == [(4,)]
+    assert [p.id for p in organiser.search_papers("author6")] == [4]
+
+
+def test_remove_missing_paper(organiser):
+    add_papers(organiser, 1)
+    with pytest.raises(ValueError, match="No paper found with ID 7"):
+        organiser.remove_paper(7)
+    assert organiser.remove_papers([1, 7]) == [1]
+
+
+def test_renumber_command_compacts_stable_library(stable):
+    add_papers(stable, 5)
+    stable.remove_papers([1, 3])
+    assert stable.renumber_papers() == 3
+
+    papers = paper_map(stable)
+    assert [papers[i][0] for i in sorted(papers)] == ["Paper 2", "Paper 4", "Paper 5"]
+    assert sorted(papers) == [1, 2, 3]
+    assert stable.renumber_papers() == 0
+
+
+def test_legacy_tables_are_rebuilt_with_cascades(tmp_path):
+    db_path = tmp_path / "legacy.db"
+    conn = sqlite3.connect(db_path)
+    conn.executescript(
+        """
+        CREATE TABLE papers (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT,
+                             year INTEGER, file_path TEXT, journal TEXT);
+        CREATE TABLE authors (id INTEGER PRIMARY KEY, name TEXT);
+        CREATE TABLE paper_authors (paper_id INTEGER, author_id INTEGER,
+            FOREIGN KEY (paper_id) REFERENCES papers (id),
+            FOREIGN KEY (author_id) REFERENCES authors (id));
+        CREATE TABLE keywords (id INTEGER PRIMARY KEY, keyword TEXT);
+        CREATE TABLE paper_keywords (paper_id INTEGER, keyword_id INTEGER,
+            FOREIGN KEY (paper_id) REFERENCES papers (id),
+            FOREIGN KEY (keyword_id) REFERENCES keywords (id));
+        CREATE TABLE bibtex_entries (paper_id INTEGER, bibtex TEXT,
+            FOREIGN KEY (paper_id) REFERENCES papers (id));
+        INSERT INTO papers (title, year, file_path, journal) VALUES ('Old', 2000, 'a.pdf', 'J');
+        INSERT INTO authors (name) VALUES ('Old, Author');
+        INSERT INTO paper_authors VALUES (1, 1), (9, 1);
+        INSERT INTO bibtex_entries VALUES (1, '@article{old, title={Old}}'), (9, 'orphan');
+        """
+    )
+    conn.close()
+
+    organiser = ResearchPaperOrganiser(Config(db_str=str(db_path)))
+    cascades = rows(organiser, "PRAGMA foreign_key_list(bibtex_entries)")
+    assert cascades[0][5:7] == ("CASCADE", "CASCADE")
+    # Orphans from the old manual delete sequence are dropped
+    assert rows(organiser, "SELECT paper_id FROM paper_authors") == [(1,)]
+    assert rows(organiser, "SELECT paper_id FROM bibtex_entries") == [(1,)]
+
+    organiser.remove_paper(1)
+    assert rows(organiser, "SELECT COUNT(*) FROM bibtex_entries") == [(0,)]
+    organiser.close()
+
+
+def test_parse_id_range():
+    assert parse_id_range("7") == [7]
+    assert parse_id_range("12-15") == [12, 13, 14, 15]
+    for bad in ("x", "5-3", "1-"):
+        with pytest.raises(argparse.ArgumentTypeError):
+            parse_id_range(bad)
@@ -0,0 +1,163 @@
+import pytest
+
+from conftest import make_entry
+from rpo.config import Config
+from rpo import rpo as rpo_module
+from rpo.rpo import ResearchPaperOrganiser
+
+
+@pytest.fixture
+def library(organiser):
+    organiser.add_paper(make_entry("a", "Quantum dots in water", "Smith, John"), "a.pdf", ["qd"])
+    organiser.add_paper(make_entry("b", "Water models", "Jones, Ann", 2019), "b.pdf", ["md"])
+    organiser.add_paper(make_entry("c", "Dots and lines", "Brown, Tim"), "c.pdf", ["qd"])
+    return organiser
+
+
+def titles(papers):
+    return sorted(paper.title for paper in papers)
+
+
+def test_prefix_query(library):
+    assert titles(library.search_papers("wat")) == ["Quantum dots in water", "Water models"]
+    assert titles(library.search_papers("quant wat")) == ["Quantum dots in water"]
+
+
+def test_field_qualified_query(library):
+    assert titles(library.search_papers("author:smith")) == ["Quantum dots in water"]
+    assert titles(library.search_papers("author:jon year:2019")) == ["Water models"]
+    assert titles(library.search_papers("keyword:qd")) == [
+        "Dots and lines",
+        "Quantum dots in water",
+    ]
+    assert library.search_papers("author:water") == []
+
+
+def test_title_matches_rank_first(library):
+    library.add_paper(make_entry("d", "Unrelated", "Water, Walter"), "d.pdf", [])
+    assert library.search_papers("water")[0].title in ("Water models", "Quantum dots in water")
+
+
+def test_empty_query_lists_everything(library):
+    assert len(library.search_papers("  ")) == 3
+
+
+def test_search_after_removal(library):
+    library.remove_paper(1)
+    assert titles(library.search_papers("dots")) == ["Dots and lines"]
+    # Renumbered papers keep their index rows
+    (paper,) = library.search_papers("lines")
+    assert paper.id == 2
+
+
+def test_backfill_existing_database(tmp_path):
+    db_path = tmp_path / "legacy.db"
+    organiser = ResearchPaperOrganiser(Config(db_str=str(db_path)))
+    organiser.add_paper(make_entry("a", "Legacy paper", "Old, Author"), "a.pdf", ["old"])
+    organiser.cursor.execute("DROP TABLE papers_fts")
+    organiser.cursor.execute("DROP TRIGGER papers_fts_delete")
+    organiser.cursor.execute("DROP TRIGGER papers_fts_renumber")
+    organiser.close()
+
+    organiser = ResearchPaperOrganiser(Config(db_str=str(db_path)))
+    assert titles(organiser.search_papers("author:old")) == ["Legacy paper"]
+    assert titles(organiser.search_papers("keyword:old")) == ["Legacy paper"]
+    organiser.close()
+
+
+def test_rank_uses_column_weights(organiser):
+    config = organiser.cursor.execute(
+        "SELECT v FROM papers_fts_config WHERE k = 'rank'"
+    ).fetchone()
+    assert config[0].startswith("bm25(10.0")
+
+
+def test_missing_fts5_only_breaks_search(organiser):
+    organiser.has_search_index = False
+    organiser.add_paper(make_entry("a", "Still added"), "a.pdf", [])
+    assert len(organiser.list_all_papers()) == 1
+    with pytest.raises(RuntimeError, match="FTS5"):
+        organiser.search_papers("still")
+
+
+def test_rebuilds_index_without_prefix_indexes(tmp_path):
+    db_path = tmp_path / "old.db"
+    organiser = ResearchPaperOrganiser(Config(db_str=str(db_path)))
+    organiser.add_paper(make_entry("a", "Quantum dots", "Old, Author"), "a.pdf", [])
+    organiser.cursor.execute("DROP TABLE papers_fts")
+    organiser.cursor.execute(
+        "CREATE VIRTUAL TABLE papers_fts USING fts5 (title, author, keyword, journal, "
+        "year, bibtex, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    organiser.close()
+
+    organiser = ResearchPaperOrganiser(Config(db_str=str(db_path)))
+    sql = organiser.cursor.execute(
+        "SELECT sql FROM sqlite_master WHERE name = 'papers_fts'"
+    ).fetchone()[0]
+    assert "prefix" in sql
+    assert titles(organiser.search_papers("q")) == ["Quantum dots"]
+    organiser.close()
+
+
+def test_ranked_order_matches_sql(library):
+    # Ties on rank fall back to list order, exactly as an ORDER BY would
+    for number in range(6):
+        library.add_paper(
+            make_entry(f"t{number}", f"Water {number % 2}", year=2000 + number % 3),
+            f"t{number}.pdf",
+            [],
+        )
+    match = library.build_search_query("water")
+    expected = [
+        id
+        for (id,) in library.conn.execute(
+            """
+            SELECT p.id FROM papers_fts f JOIN papers p ON p.id = f.rowid
+            WHERE papers_fts MATCH ? ORDER BY f.rank, p.year DESC, p.title, p.id
+            """,
+            (match,),
+        )
+    ]
+    assert list(library.ranked_search(library.search_plan("water"))) == expected
+    assert [paper.id for paper in library.iter_search("water")] == expected
+
+
+def test_large_results_keep_list_order(library, monkeypatch):
+    monkeypatch.setattr(rpo_module, "RANK_LIMIT", 1)
+    listed = [paper.id for paper in library.list_all_papers()]
+    found = [paper.id for paper in library.iter_search("dots")]
+    assert len(found) == 2
+    assert found == [id for id in listed if id in found]
+    assert library.ranked_search(library.search_plan("dots")) is None
+    assert [p.id for p in library.iter_search("dots", limit=1, page=2)] == found[1:]
+
+
+def test_cache_invalidated_by_changes(library):
+    assert titles(library.search_papers("dots")) == ["Dots and lines", "Quantum dots in water"]
+    library.add_paper(make_entry("d", "More dots"), "d.pdf", [])
+    assert len(library.search_papers("dots")) == 3
+    library.remove_paper(1)
+    assert len(library.search_papers("dots")) == 2
+
+
+def test_cache_invalidated_by_other_connections(library):
+    assert len(library.search_papers("dots")) == 2
+    other = ResearchPaperOrganiser(library.config)
+    other.add_paper(make_entry("d", "More dots"), "d.pdf", [])
+    other.close()
+    assert len(library.search_papers("dots")) == 3
+
+
+def test_cached_results(library):
+    plan = library.search_plan("dots")
+    first = library.ranked_search(plan)
+    assert library.ranked_search(plan) is first
+    library.add_paper(make_entry("d", "Unrelated"), "d.pdf", [])
+    assert library.ranked_search(plan) is not first
+
+
+def test_paged_search_uses_cached_ids(library):
+    everything = [paper.id for paper in library.iter_search("d")]
+    pages = [[p.id for p in library.iter_search("d", limit=1, page=n)] for n in (1, 2, 3)]
+    assert sum(pages, []) == everything
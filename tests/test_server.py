@@ -0,0 +1,103 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from conftest import make_entry
+from rpo.config import Config
+from rpo.server import Server
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="needs Unix sockets")
+
+
+@pytest.fixture
+def home(tmp_path):
+    (tmp_path / ".rpo.json").write_text(json.dumps({"db_str": str(tmp_path / "papers.db")}))
+    return tmp_path
+
+
+@pytest.fixture
+def server(home):
+    started = threading.Event()
+    servers = []
+
+    def run():
+        # The organiser must live on the thread that serves
+        servers.append(Server(Config(db_str=str(home / "papers.db")), home / ".rpo.sock"))
+        started.set()
+        servers[0].serve_forever(poll_interval=0.05)
+        servers[0].server_close()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    started.wait(5)
+    yield servers[0]
+    servers[0].shutdown()
+    thread.join()
+
+
+def rpo(home, *args, direct=False):
+    env = dict(os.environ, HOME=str(home), USERPROFILE=str(home))
+    env.pop("RPO_NO_SERVER", None)
+    if direct:
+        env["RPO_NO_SERVER"] = "1"
+    result = subprocess.run(
+        [sys.executable, "-m", "rpo", *args], env=env, cwd=home, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+def add(home, key, title):
+    return rpo(
+        home, "add", "--bibtex", make_entry(key, title), "--file", f"{key}.pdf", "--keywords", "x"
+    )
+
+
+def test_commands_are_served(home, server):
+    add(home, "a", "Quantum dots")
+    add(home, "b", "Water models")
+    assert server.requests == 2
+    # Relative to the client's working directory, not the server's
+    with sqlite3.connect(home / "papers.db") as conn:
+        paths = [path for (path,) in conn.execute("SELECT file_path FROM papers ORDER BY id")]
+    assert paths == [str(home / "a.pdf"), str(home / "b.pdf")]
+    assert "already exists" in add(home, "a", "Quantum dots")
+
+    for args in (
+        ["list"],
+        ["list", "--limit", "1", "--after", "1"],
+        ["list", "--after", "99"],
+        ["list", "--year-from", "2021"],
+        ["search", "water"],
+        ["search", "nothing"],
+        ["search", "water", "--journal", "j. chem. phys.", "--facets"],
+        ["search", "quantm", "--fuzzy"],
+        ["details", "1"],
+        ["details", "99"],
+    ):
+        served = rpo(home, *args)
+        assert served == rpo(home, *args, direct=True)
+    assert server.requests == 13
+
+
+def test_fallback_without_server(home):
+    # A socket file left behind with no server listening on it
+    (home / ".rpo.sock").write_text("")
+    add(home, "a", "Quantum dots")
+    assert "Quantum dots" in rpo(home, "search", "quantum")
+
+
+def test_other_database_is_not_served(home, server):
+    (home / ".rpo.json").write_text(json.dumps({"db_str": str(home / "other.db")}))
+    assert "No papers found." in rpo(home, "list")
+    assert server.requests == 0
+
+
+def test_second_server_is_refused(home, server):
+    with pytest.raises(RuntimeError, match="already listening"):
+        Server(Config(db_str=str(home / "papers.db")), home / ".rpo.sock")
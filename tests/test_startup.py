@@ -0,0 +1,39 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+CHECK = """
+import sys
+from rpo.__main__ import main
+sys.argv = ["rpo"] + sys.argv[2:]
+main()
+heavy = [m for m in sys.argv[1].split(",") if m in sys.modules]
+sys.stderr.write(",".join(heavy))
+"""
+
+
+def imported(tmp_path, command, modules, **environment):
+    # Which of modules running the command imported
+    (tmp_path / ".rpo.json").write_text(json.dumps({"db_str": str(tmp_path / "p.db")}))
+    env = dict(os.environ, HOME=str(tmp_path), USERPROFILE=str(tmp_path), **environment)
+    result = subprocess.run(
+        [sys.executable, "-c", CHECK, ",".join(modules), *command],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stderr
+
+
+@pytest.mark.parametrize("command", [["list"], ["search", "x"], ["details", "1"]])
+def test_read_commands_skip_heavy_imports(tmp_path, command):
+    heavy = ["PyQt6", "bibtexparser", "rpo.profiling", "rpo.store"]
+    assert imported(tmp_path, command, heavy) == ""
+
+
+def test_no_server_skips_server_module(tmp_path):
+    assert imported(tmp_path, ["list"], ["rpo.server"], RPO_NO_SERVER="1") == ""
@@ -0,0 +1,113 @@
+import hashlib
+import os
+
+import pytest
+
+from conftest import make_entry
+from rpo.config import Config
+from rpo.rpo import ResearchPaperOrganiser
+from rpo.store import PdfStore
+
+
+@pytest.fixture
+def make_organiser(tmp_path):
+    organisers = []
+
+    def make(mode="copy", store=True):
+        config = Config(
+            db_str=str(tmp_path / "papers.db"),
+            pdf_store=str(tmp_path / "store") if store else None,
+            store_mode=mode,
+        )
+        organisers.append(ResearchPaperOrganiser(config))
+        return organisers[-1]
+
+    yield make
+    for organiser in organisers:
+        organiser.close()
+
+
+def pdf(tmp_path, name, content):
+    path = tmp_path / "incoming" / name
+    path.parent.mkdir(exist_ok=True)
+    path.write_bytes(content)
+    return str(path)
+
+
+def digest(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+def test_added_pdfs_are_stored_once(make_organiser, tmp_path, monkeypatch):
+    organiser = make_organiser()
+    organiser.add_paper(make_entry("a", "One"), pdf(tmp_path, "a.pdf", b"same"), [])
+    pdf(tmp_path, "copy of a.pdf", b"same")
+    monkeypatch.chdir(tmp_path / "incoming")
+    organiser.add_paper(make_entry("b", "Two"), "copy of a.pdf", [])
+    with pytest.raises(OSError, match="nowhere.pdf"):
+        organiser.add_paper(make_entry("c", "Three"), "nowhere.pdf", [])
+
+    stored = organiser.store.path_for(digest(b"same"))
+    assert [organiser.get_paper_file_path(i) for i in (1, 2)] == [stored, stored]
+    assert organiser.get_paper_file_path(3) is None
+    assert open(stored, "rb").read() == b"same"
+    assert not os.access(stored, os.W_OK) or os.geteuid() == 0
+    assert organiser.papers_with_pdf(digest(b"same")) == [1, 2]
+    # The originals are left alone
+    assert os.path.exists(tmp_path / "incoming" / "a.pdf")
+
+
+def test_imports_are_stored(make_organiser, tmp_path):
+    paths = [pdf(tmp_path, f"{i}.pdf", f"paper {i % 2}".encode()) for i in range(4)]
+    bib = tmp_path / "library.bib"
+    bib.write_text(
+        "".join(
+            make_entry(f"k{i}", f"Paper {i}")[:-1] + f",\n  file = {{:{path}:PDF}}\n}}\n"
+            for i, path in enumerate(paths)
+        )
+    )
+    os.unlink(paths[3])
+    organiser = make_organiser()
+    report = organiser.import_bibtex_file(str(bib))
+    assert report.added == 4
+    assert [(index, key) for index, key, _ in report.unstored] == [(4, "k3")]
+    assert len({organiser.get_paper_file_path(i) for i in range(1, 4)}) == 2
+    assert organiser.get_paper_file_path(4) == paths[3]
+    assert organiser.papers_with_pdf(digest(b"paper 1")) == [2]
+
+
+def test_links_share_the_file(tmp_path):
+    source = pdf(tmp_path, "a.pdf", b"linked")
+    store = PdfStore(str(tmp_path / "store"), "link")
+    stored, grown = store.put(source)
+    assert grown == 0
+    assert os.path.samefile(stored, source)
+    with pytest.raises(ValueError):
+        PdfStore(str(tmp_path), "move")
+
+
+def test_existing_library_is_moved(make_organiser, tmp_path):
+    organiser = make_organiser(store=False)
+    for key, name, content in (
+        ("a", "a.pdf", b"x" * 1000),
+        ("b", "b.pdf", b"x" * 1000),
+        ("c", "c.pdf", b"y" * 10),
+    ):
+        organiser.add_paper(make_entry(key, key), pdf(tmp_path, name, content), [])
+    organiser.add_paper(make_entry("d", "d"), str(tmp_path / "gone.pdf"), [])
+    # Papers sharing one file
+    organiser.add_paper(make_entry("e", "e"), str(tmp_path / "incoming" / "c.pdf"), [])
+
+    organiser = make_organiser()
+    with pytest.raises(RuntimeError):
+        make_organiser(store=False).move_to_store()
+    report = organiser.move_to_store(threads=2, remove_originals=True)
+    assert (report.files, report.duplicates, len(report.errors)) == (3, 1, 1)
+    assert (report.bytes_total, report.bytes_unique, report.bytes_saved) == (2010, 1010, 1000)
+    assert report.bytes_stored == 1010
+    assert organiser.papers_with_pdf(digest(b"x" * 1000)) == [1, 2]
+    assert organiser.papers_with_pdf(digest(b"y" * 10)) == [3, 5]
+    assert os.listdir(tmp_path / "incoming") == []
+    assert organiser.get_paper_file_path(4) == str(tmp_path / "gone.pdf")
+    # Nothing is left to move
+    assert organiser.move_to_store().files == 0
@@ -0,0 +1,108 @@
+import os
+
+import pytest
+
+from conftest import make_entry
+
+
+def entry(key, title, doi=None, file=None):
+    text = make_entry(key, title)[:-1]
+    if doi:
+        text += f",\n  doi = {{{doi}}}"
+    if file:
+        text += f",\n  file = {{:{file}:PDF}}"
+    return text + "\n}\n"
+
+
+def write(path, text="%PDF-1.4"):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return str(path)
+
+
+def files(organiser):
+    return dict(organiser.conn.execute("SELECT title, file_path FROM papers"))
+
+
+@pytest.fixture
+def folder(tmp_path):
+    return tmp_path / "inbox"
+
+
+def test_entries_are_matched_to_pdfs(organiser, folder):
+    by_key = write(folder / "pdfs" / "smith2020.pdf")
+    by_doi = write(folder / "10.1103_PhysRevB.1.pdf")
+    named = write(folder / "papers" / "third.pdf")
+    write(
+        folder / "library.bib",
+        entry("smith2020", "By key")
+        + entry("other", "By DOI", doi="https://doi.org/10.1103/PhysRevB.1")
+        + entry("named", "By file field", file="papers/third.pdf")
+        + entry("lonely", "Without a PDF"),
+    )
+    report = organiser.scan_folder(str(folder))
+    assert (report.added, report.unmatched, report.errors) == (4, 0, [])
+    assert files(organiser) == {
+        "By key": by_key,
+        "By DOI": by_doi,
+        "By file field": named,
+        "Without a PDF": "",
+    }
+
+
+def test_rescans_read_only_changes(organiser, folder, monkeypatch):
+    bib = write(folder / "a.bib", entry("a", "First"))
+    organiser.scan_folder(str(folder))
+
+    parsed = []
+    parse = type(organiser)._parse_entries
+    monkeypatch.setattr(
+        type(organiser),
+        "_parse_entries",
+        lambda self, f, *args: parsed.append(f.name) or parse(self, f, *args),
+    )
+    report = organiser.scan_folder(str(folder))
+    assert (report.added, report.unchanged, parsed) == (0, 1, [])
+
+    # A changed file is read again, and only its new entries are added
+    write(folder / "a.bib", entry("a", "First") + entry("b", "Second"))
+    report = organiser.scan_folder(str(folder))
+    assert (report.added, report.known, parsed) == (1, 1, [bib])
+    assert sorted(files(organiser)) == ["First", "Second"]
+
+
+def test_late_pdfs_and_entries(organiser, folder):
+    # A PDF whose entry arrives later
+    write(folder / "early.pdf")
+    report = organiser.scan_folder(str(folder))
+    assert (report.added, report.unmatched) == (0, 1)
+    write(folder / "refs.bib", entry("early", "Early PDF"))
+    assert organiser.scan_folder(str(folder)).unmatched == 0
+
+    # A paper whose PDF arrives later
+    organiser.add_paper(entry("late", "Late PDF"), "", [])
+    late = write(folder / "late.pdf")
+    report = organiser.scan_folder(str(folder))
+    assert (report.linked, report.unmatched) == (1, 0)
+    assert files(organiser) == {
+        "Early PDF": str(folder / "early.pdf"),
+        "Late PDF": late,
+    }
+
+
+def test_errors_and_deleted_files(organiser, folder):
+    write(folder / "bad.bib", entry("ok", "Fine") + "@article{broken, year = {soon}}\n")
+    write(folder / ".hidden" / "skipped.bib", entry("hidden", "Hidden"))
+    report = organiser.scan_folder(str(folder), keywords=["inbox"])
+    assert report.added == 1
+    assert [(os.path.basename(path), key) for path, key, _ in report.errors] == [
+        ("bad.bib", "broken")
+    ]
+    assert organiser.get_paper_details(1).keywords == ["inbox"]
+
+    os.remove(folder / "bad.bib")
+    organiser.scan_folder(str(folder))
+    assert organiser.conn.execute("SELECT COUNT(*) FROM watched_files").fetchone() == (0,)
+
+    with pytest.raises(NotADirectoryError):
+        organiser.scan_folder(str(folder / "missing"))